@@ -4,20 +4,86 @@ api_server.py
 简述：
 - 提供压测用的简单 API 服务，包含一个 `POST /chat` 对话接口。
 - 依赖 `FastAPI` 与项目内的 `llm_client.py`，可选择模拟回复以避免外部调用。
+- `/chat` 为异步实现，使用异步 OpenAI 客户端，不占用线程池线程；
+  全局与单用户并发由 `CHAT_MAX_CONCURRENCY` / `CHAT_MAX_CONCURRENCY_PER_USER` 控制，超限快速返回 429。
+- `GET /metrics` 以 Prometheus 文本格式导出各阶段耗时直方图（`MEMLANG_METRICS=0` 可关闭埋点）。
+- `POST /chat?stream=true` 以 SSE（text/event-stream）逐 token 返回：每条 `data: {"delta": ...}`，
+  结束时发送 `event: done`，附带首 token 耗时 `ttft_ms` 与总耗时 `latency_ms`。
+- `COMPLETION_CACHE=1` 时开启补全缓存（见 completion_cache.py）：相同的模型、消息与采样参数直接返回缓存结果，
+  不占并发名额；请求体 `cache: false` 可逐次绕过。响应（或 `done` 事件）带 `cached` 与 `cache_lookup_ms`。
+  配置了 SQLite 磁盘层时读写在线程中执行，不阻塞事件循环；服务关闭时关闭数据库连接。
+- 非流式 `/chat` 上同时进行中的相同请求（模型、消息与采样参数一致）只调用一次模型，其余请求共享结果或同一个模型错误，
+  响应中 `coalesced: true`；`CHAT_COALESCE=false` 可关闭。每个请求仍各自占用并发名额，
+  单用户上限按各自的 `user_id` 计算，一个用户超限的 429 不会波及合并在一起的其他用户。
+- 缓存与合并都只针对显式 `temperature: 0` 的请求：未设置 temperature 时模型按默认值随机采样，不同调用方不应共享同一次采样。
+- `POST /memory/add`、`POST /memory/search` 为任意用户读写 MemOS 记忆（请求体带 `user_id`），
+  全部用户共用一个多租户客户端与有界连接池（`MEMOS_POOL_SIZE`），进程内存不随用户数增长。
+  `MEMOS_LOCAL_INDEX=1` 时检索先查本地混合索引（见 local_index.py），把握足够时不访问 MemOS。
+  MemOS 持续失败时熔断：检索返回空记忆（`source: "degraded"`），写入返回 503。
+- `POST /plan/batch` 批量规划多个 (user_id, 当日指令) 条目（见 batch_planner.py）：并发检索记忆、
+  有界并发调用模型（`BATCH_PLAN_CONCURRENCY`），以 NDJSON 按完成顺序逐条返回结果，最后一行为 `{"event": "done", ...}` 汇总；
+  请求体 `batch_api: true`（或 `BATCH_PLAN_API=1`）改走 OpenAI Batch 接口；`PLAN_STORE=1` 时计划写入本地计划库。
 
 运行：
 - uvicorn api_server:app --host 0.0.0.0 --port 8000
 """
 
+import asyncio
+import json
+import os
 import time
+from contextlib import AsyncExitStack, asynccontextmanager
 from typing import List, Optional, Dict, Any
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 
-from llm_client import get_openai_client, get_openai_model
+import instrumentation
+from batch_planner import BatchPlanner
+from completion_cache import CompletionCache, completion_key, is_deterministic
+from concurrency import ConcurrencyLimiter, ConcurrencyRejected
+from instrumentation import incr, observe, span
+from local_index import LocalMemoryIndex
+from memos_client import AsyncMemOSTenantClient
+from llm_client import (
+    aclose_openai_clients,
+    astream_chat_completion,
+    get_async_openai_client,
+    get_openai_model,
+)
+from plan_store import PlanStore
+from resilience import CircuitOpenError
+from singleflight import AsyncSingleFlight
 
 
-app = FastAPI(title="MemLang Demo API", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # 关闭共享的模型客户端与记忆客户端，释放连接池
+    await aclose_openai_clients()
+    await memos.aclose()
+    if plan_store is not None:
+        plan_store.close()
+    if completion_cache is not None:
+        completion_cache.close()
+
+
+app = FastAPI(title="MemLang Demo API", version="0.1.0", lifespan=lifespan)
+
+# 服务端默认开启埋点，供 /metrics 抓取
+instrumentation.configure(default=True)
+
+limiter = ConcurrencyLimiter.from_env("CHAT")
+# 未开启时为 None
+completion_cache = CompletionCache.from_env()
+# 相同的进行中请求合并为一次模型调用
+chat_flights = AsyncSingleFlight() if os.getenv("CHAT_COALESCE", "true").strip().lower() in ("1", "true", "yes", "on") else None
+# 所有用户共用的记忆客户端（user_id 逐次传入）
+memos = AsyncMemOSTenantClient(local_index=LocalMemoryIndex.from_env())
+# 批量规划的计划库（未开启时为 None）与规划器；未配置 MEMOS_BASE_URL 时不检索记忆
+plan_store = PlanStore.from_env()
+batch_planner = BatchPlanner.from_env(memos=memos if memos.base_url else None, store=plan_store)
 
 
 class ChatMessage(BaseModel):
@@ -30,6 +96,34 @@ class ChatRequest(BaseModel):
     prompt: Optional[str] = None
     system: Optional[str] = "你是一名可靠的日程与任务助理，回答应简洁、结构化并可执行。"
     mock: bool = False
+    user_id: Optional[str] = None
+    temperature: Optional[float] = None
+    # None 使用服务端默认（开启缓存时即读写缓存），False 绕过缓存
+    cache: Optional[bool] = None
+
+
+class MemoryAddRequest(BaseModel):
+    user_id: str
+    messages: List[ChatMessage]
+
+
+class MemorySearchRequest(BaseModel):
+    user_id: str
+    query: str
+
+
+class PlanBatchItem(BaseModel):
+    user_id: str
+    instruction: str
+    day: Optional[str] = None
+    id: Optional[str] = None
+
+
+class PlanBatchRequest(BaseModel):
+    items: List[PlanBatchItem]
+    goal: Optional[str] = None
+    # None 使用服务端默认（BATCH_PLAN_API）
+    batch_api: Optional[bool] = None
 
 
 @app.get("/health")
@@ -37,11 +131,13 @@ def health() -> Dict[str, Any]:
     return {"status": "ok"}
 
 
-@app.post("/chat")
-def chat(req: ChatRequest) -> Dict[str, Any]:
-    start = time.time()
+@app.get("/metrics")
+def metrics() -> PlainTextResponse:
+    return PlainTextResponse(instrumentation.render_prometheus(), media_type="text/plain; version=0.0.4")
 
-    # 构造消息列表
+
+def _build_messages(req: ChatRequest) -> List[Dict[str, str]]:
+    """构造消息列表"""
     messages: List[Dict[str, str]] = []
     if req.system:
         messages.append({"role": "system", "content": req.system})
@@ -53,32 +149,291 @@ def chat(req: ChatRequest) -> Dict[str, Any]:
         messages.append({"role": "user", "content": req.prompt})
     else:
         raise HTTPException(status_code=400, detail="缺少 messages 或 prompt")
+    return messages
 
-    # 可选：模拟回复，便于本地压测不依赖外部服务
-    if req.mock:
+
+def _mock_reply(messages: List[Dict[str, str]]) -> str:
+    # 简单模拟：返回最后一条用户内容的缩略回复
+    last_user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    return f"收到：{last_user[:64]}..."
+
+
+def _reject(e: ConcurrencyRejected) -> HTTPException:
+    instrumentation.incr(f"chat.rejected.{e.reason}")
+    scope = "当前用户" if e.reason == "user" else "服务"
+    return HTTPException(status_code=429, detail=f"{scope}并发请求过多，请稍后重试")
+
+
+def _sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    head = f"event: {event}\n" if event else ""
+    return f"{head}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _sampling(req: ChatRequest) -> Dict[str, Any]:
+    """请求携带的采样参数（同时参与缓存键计算）。"""
+    return {k: v for k, v in {"temperature": req.temperature}.items() if v is not None}
+
+
+def _deterministic(req: ChatRequest) -> bool:
+    """显式要求确定性采样（temperature=0）；未设置 temperature 按模型默认的随机采样处理。"""
+    return is_deterministic(_sampling(req))
+
+
+async def _off_loop(fn, *args):
+    """磁盘层的 SQLite 读写放到线程里，避免阻塞事件循环；纯内存缓存直接调用。"""
+    if completion_cache.persistent:
+        return await asyncio.to_thread(fn, *args)
+    return fn(*args)
+
+
+async def _cache_lookup(req: ChatRequest, model: str, messages: List[Dict[str, str]]):
+    """返回 (缓存结果或 None, 查找耗时毫秒)；缓存未开启、被绕过、非确定性采样或模拟回复时返回 (None, None)。"""
+    if completion_cache is None or req.cache is False or req.mock or not _deterministic(req):
+        return None, None
+    lookup_start = time.perf_counter()
+    hit = await _off_loop(completion_cache.get, model, messages, _sampling(req))
+    lookup_s = time.perf_counter() - lookup_start
+    observe("chat.cache_lookup", lookup_s)
+    incr("chat.cache_hit" if hit is not None else "chat.cache_miss")
+    return hit, round(lookup_s * 1000, 3)
+
+
+async def _cache_store(req: ChatRequest, model: str, messages: List[Dict[str, str]], value: Dict[str, Any]):
+    if completion_cache is not None and req.cache is not False and not req.mock and _deterministic(req):
+        await _off_loop(completion_cache.put, model, messages, value, _sampling(req))
+
+
+@app.post("/chat")
+async def chat(req: ChatRequest, stream: bool = False):
+    start = time.time()
+    messages = _build_messages(req)
+    model = "mock" if req.mock else get_openai_model()
+    # 缓存命中不占用并发名额，也不调用模型
+    hit, cache_lookup_ms = await _cache_lookup(req, model, messages)
+
+    if stream:
+        return await _chat_stream(req, messages, start, model, hit, cache_lookup_ms)
+
+    if hit is not None:
         latency_ms = int((time.time() - start) * 1000)
-        # 简单模拟：返回最后一条用户内容的缩略回复
-        last_user = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+        observe("chat.total", latency_ms / 1000)
         return {
-            "model": "mock",
-            "content": f"收到：{last_user[:64]}...",
-            "usage": None,
+            "model": model,
+            "content": hit["content"],
+            "usage": hit.get("usage"),
             "latency_ms": latency_ms,
+            "queue_wait_ms": 0,
+            "model_latency_ms": 0,
+            "cached": True,
+            "cache_lookup_ms": cache_lookup_ms,
         }
 
-    try:
-        client = get_openai_client()
-        model = get_openai_model()
-        resp = client.chat.completions.create(model=model, messages=messages)
-        content = resp.choices[0].message.content
-        usage = getattr(resp, "usage", None)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"模型调用失败：{e}")
+    result, coalesced = await _complete(req, model, messages)
 
     latency_ms = int((time.time() - start) * 1000)
+    observe("chat.total", latency_ms / 1000)
     return {
         "model": model,
-        "content": content,
-        "usage": usage.dict() if hasattr(usage, "dict") else usage,
+        **result,
         "latency_ms": latency_ms,
-    }
\ No newline at end of file
+        "cached": False,
+        "cache_lookup_ms": cache_lookup_ms,
+        "coalesced": coalesced,
+    }
+
+
+def _coalescable(req: ChatRequest) -> bool:
+    """只合并结果应当一致的请求：非模拟、未要求绕过缓存、显式 temperature=0。"""
+    return chat_flights is not None and not req.mock and req.cache is not False and _deterministic(req)
+
+
+async def _complete(req: ChatRequest, model: str, messages: List[Dict[str, str]]):
+    """在本请求自己的并发名额内取得回复（可与相同的进行中请求合并），返回 (内容、用量与耗时, 是否合并)。"""
+    try:
+        async with limiter.acquire(req.user_id) as queue_wait_ms:
+            observe("chat.queue_wait", queue_wait_ms / 1000)
+            model_start = time.time()
+            if _coalescable(req):
+                # 只共享模型调用本身：名额已按各自的 user_id 取得，领头请求的 429 不会传给跟随者
+                key = completion_key(model, messages, _sampling(req))
+                (content, usage), coalesced = await chat_flights.do(key, _generate, req, model, messages)
+                if coalesced:
+                    instrumentation.incr("chat.coalesced")
+            else:
+                (content, usage), coalesced = await _generate(req, model, messages), False
+            model_latency_ms = int((time.time() - model_start) * 1000)
+    except ConcurrencyRejected as e:
+        raise _reject(e)
+
+    if not coalesced:
+        await _cache_store(req, model, messages, {"content": content, "usage": usage})
+    return {
+        "content": content,
+        "usage": usage,
+        "queue_wait_ms": int(queue_wait_ms),
+        "model_latency_ms": model_latency_ms,
+    }, coalesced
+
+
+async def _generate(req: ChatRequest, model: str, messages: List[Dict[str, str]]):
+    """调用模型（或生成模拟回复），返回 (内容, 用量)；模型出错时抛出 500。"""
+    # 可选：模拟回复，便于本地压测不依赖外部服务
+    if req.mock:
+        return _mock_reply(messages), None
+    try:
+        client = get_async_openai_client(model=model)
+        with span("llm.completion"):
+            resp = await client.chat.completions.create(model=model, messages=messages, **_sampling(req))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"模型调用失败：{e}")
+    usage = getattr(resp, "usage", None)
+    return resp.choices[0].message.content, usage.dict() if hasattr(usage, "dict") else usage
+
+
+async def _chat_stream(
+    req: ChatRequest,
+    messages: List[Dict[str, str]],
+    start: float,
+    model: str,
+    hit: Optional[Dict[str, Any]] = None,
+    cache_lookup_ms: Optional[float] = None,
+) -> StreamingResponse:
+    """SSE 流式回复：并发名额在开始推流前获取（超限直接 429），推流结束后释放；缓存命中时直接回放。"""
+    if hit is not None:
+        async def replay():
+            yield _sse({"delta": hit["content"]})
+            now = time.time()
+            observe("chat.total", now - start)
+            yield _sse({
+                "model": model,
+                "ttft_ms": 0,
+                "latency_ms": int((now - start) * 1000),
+                "queue_wait_ms": 0,
+                "model_latency_ms": 0,
+                "cached": True,
+                "cache_lookup_ms": cache_lookup_ms,
+            }, event="done")
+
+        return StreamingResponse(replay(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+    stack = AsyncExitStack()
+    try:
+        queue_wait_ms = await stack.enter_async_context(limiter.acquire(req.user_id))
+    except ConcurrencyRejected as e:
+        raise _reject(e)
+    observe("chat.queue_wait", queue_wait_ms / 1000)
+
+    async def tokens():
+        if req.mock:
+            for ch in _mock_reply(messages):
+                yield ch
+            return
+        client = get_async_openai_client(model=model)
+        async for delta in astream_chat_completion(client, model, messages, **_sampling(req)):
+            yield delta
+
+    async def events():
+        model_start = time.time()
+        ttft_ms = None
+        parts = []
+        try:
+            async for delta in tokens():
+                if ttft_ms is None:
+                    ttft_ms = int((time.time() - model_start) * 1000)
+                parts.append(delta)
+                yield _sse({"delta": delta})
+        except Exception as e:
+            yield _sse({"detail": f"模型调用失败：{e}"}, event="error")
+            return
+        finally:
+            await stack.aclose()
+        now = time.time()
+        if ttft_ms is not None:
+            observe("llm.ttft", ttft_ms / 1000)
+        observe("llm.stream", now - model_start)
+        observe("chat.total", now - start)
+        # 只缓存完整生成的回复
+        await _cache_store(req, model, messages, {"content": "".join(parts), "usage": None})
+        yield _sse({
+            "model": model,
+            "ttft_ms": ttft_ms,
+            "latency_ms": int((now - start) * 1000),
+            "queue_wait_ms": int(queue_wait_ms),
+            "model_latency_ms": int((now - model_start) * 1000),
+            "cached": False,
+            "cache_lookup_ms": cache_lookup_ms,
+        }, event="done")
+
+    # 客户端提前断开时生成器可能不会执行到 finally，由后台任务兜底释放（重复释放无副作用）
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+        background=BackgroundTask(stack.aclose),
+    )
+
+
+def _require_memos():
+    if not memos.base_url:
+        raise HTTPException(status_code=503, detail="未配置 MEMOS_BASE_URL，记忆接口不可用")
+
+
+@app.post("/memory/add")
+async def memory_add(req: MemoryAddRequest) -> Dict[str, Any]:
+    _require_memos()
+    start = time.time()
+    try:
+        result = await memos.add_conversation(req.user_id, [{"role": m.role, "content": m.content} for m in req.messages])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except CircuitOpenError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    latency_ms = int((time.time() - start) * 1000)
+    observe("memory.add", latency_ms / 1000)
+    return {"user_id": req.user_id, "result": result, "latency_ms": latency_ms}
+
+
+@app.post("/memory/search")
+async def memory_search(req: MemorySearchRequest) -> Dict[str, Any]:
+    _require_memos()
+    start = time.time()
+    try:
+        result = await memos.search_memory(req.user_id, req.query)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=str(e))
+    latency_ms = int((time.time() - start) * 1000)
+    observe("memory.search", latency_ms / 1000)
+    if isinstance(result, dict) and result.get("degraded"):
+        source = "degraded"
+    else:
+        source = result.get("source", "memos") if isinstance(result, dict) else "memos"
+    return {"user_id": req.user_id, "result": result, "latency_ms": latency_ms, "source": source}
+
+
+@app.post("/plan/batch")
+async def plan_batch(req: PlanBatchRequest) -> StreamingResponse:
+    if not req.items:
+        raise HTTPException(status_code=400, detail="items 不能为空")
+    try:
+        get_async_openai_client(model=get_openai_model())
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    start = time.time()
+
+    async def lines():
+        counts = {"items": 0, "ok": 0, "failed": 0}
+        async for result in batch_planner.run(
+            (item.model_dump() for item in req.items), goal_text=req.goal, use_batch_api=req.batch_api,
+        ):
+            counts["items"] += 1
+            counts["ok" if result["ok"] else "failed"] += 1
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+        latency_ms = int((time.time() - start) * 1000)
+        observe("plan.batch", latency_ms / 1000)
+        yield json.dumps({"event": "done", **counts, "latency_ms": latency_ms}, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
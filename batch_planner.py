@@ -0,0 +1,463 @@
+"""
+batch_planner.py
+
+通俗说明：
+- 批量规划：一次处理多个 (user_id, 当日指令) 条目，适合夜间为全部用户预先生成计划。
+- 每个条目：检索该用户记忆 → 按 token 预算组装记忆上下文 → `build_unified_demo_prompt` 组装提示词 →
+  调用模型 → 解析计划、冲突检测、本地修复（与 demo.py 的单日流程口径一致，但不带历史对话）。
+- 记忆检索与模型调用分别限流（`memory_concurrency` / `concurrency`），由固定数量的协程从输入中依次取条目，
+  输入可以是很长的生成器，内存占用只与并发数有关；结果按完成顺序逐条产出，不等整批结束。
+- `use_batch_api=True` 时改走 OpenAI Batch 接口：检索与组装照常并发进行，提示词每攒满 `chunk_size` 条
+  提交一个批任务并轮询，批任务完成后该批结果一起产出（成本更低，但延迟以批任务为单位）。
+- 单个条目失败（检索、模型或解析出错）只影响该条，结果中 `ok: false` 并给出 `error`；
+  记忆服务熔断时以空记忆继续规划，结果标记 `memory_degraded: true`。
+- 传入 `store`（`PlanStore`）时修复后的计划写入本地计划库，结果带 `plan_id`。
+- 环境变量：`BATCH_PLAN_CONCURRENCY`（默认 16）、`BATCH_PLAN_MEMORY_CONCURRENCY`（默认 32）、
+  `BATCH_PLAN_API=1` 使用 Batch 接口、`BATCH_PLAN_CHUNK`（默认 1000）、`BATCH_PLAN_POLL_S`（默认 10）。
+
+示例：
+- python batch_planner.py --offline --users 200
+- python batch_planner.py items.jsonl --output plans.ndjson   # 每行 {"user_id": ..., "day": ..., "instruction": ...}
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+
+from conflicts import PLAN, COMMITMENT, find_conflicts, plan_tasks, slots_from_plan, weekday_of
+from context_builder import ContextAssembler
+from instrumentation import incr, observe
+from llm_client import get_async_openai_client, get_openai_model
+from plan_stream import parse_plan_update
+from prompts import GOAL_TEXT, SYSTEM_PROMPT_UNIFIED, build_unified_demo_prompt
+from scheduler import ScheduleRepairer, commitments_from_plan, extract_commitments
+
+_BATCH_DONE = ("completed", "failed", "expired", "cancelled")
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(slots=True)
+class PlanItem:
+    """一个待规划条目；`day` 为星期或日期（可省略），`id` 原样回传，便于调用方对应结果。"""
+    user_id: str
+    instruction: str
+    day: str | None = None
+    id: str | None = None
+
+    @classmethod
+    def from_obj(cls, obj) -> "PlanItem":
+        """接受 PlanItem、dict（user_id / instruction / day / id）或 (user_id, day, instruction) 元组。"""
+        if isinstance(obj, cls):
+            return obj
+        if isinstance(obj, dict):
+            item = cls(obj.get("user_id") or "", obj.get("instruction") or "", obj.get("day"), obj.get("id"))
+        else:
+            user_id, day, instruction = obj
+            item = cls(user_id, instruction, day)
+        if not item.user_id or not item.instruction:
+            raise ValueError("条目需要 user_id 与 instruction")
+        return item
+
+
+@dataclass(slots=True)
+class _Prepared:
+    index: int
+    item: PlanItem
+    messages: list
+    memories: list
+    degraded: bool
+    memory_ms: float
+    start: float
+
+
+class BatchPlanner:
+    """批量规划器：持有限流与规划配置，`run(items)` 为异步生成器，逐条产出结果 dict。"""
+
+    def __init__(
+        self,
+        memos=None,
+        client=None,
+        model: str | None = None,
+        concurrency: int = 16,
+        memory_concurrency: int = 32,
+        use_batch_api: bool = False,
+        chunk_size: int = 1000,
+        poll_interval: float = 10.0,
+        goal_text: str = GOAL_TEXT,
+        assembler: ContextAssembler | None = None,
+        scheduler: ScheduleRepairer | None = None,
+        store=None,
+    ):
+        # 异步多租户记忆客户端（AsyncMemOSTenantClient）；None 时不检索记忆
+        self.memos = memos
+        # None 时首次使用从 llm_client 的共享注册表获取
+        self.client = client
+        self.model = model
+        self.concurrency = max(1, concurrency)
+        self.memory_concurrency = max(1, memory_concurrency)
+        self.use_batch_api = use_batch_api
+        self.chunk_size = max(1, chunk_size)
+        self.poll_interval = poll_interval
+        self.goal_text = goal_text
+        self.assembler = assembler or ContextAssembler()
+        self.scheduler = scheduler or ScheduleRepairer()
+        self.store = store
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "BatchPlanner":
+        """并发、批任务等配置读环境变量，其余参数原样传入构造函数。"""
+        options = {
+            "concurrency": int(os.getenv("BATCH_PLAN_CONCURRENCY", "16")),
+            "memory_concurrency": int(os.getenv("BATCH_PLAN_MEMORY_CONCURRENCY", "32")),
+            "use_batch_api": _env_flag("BATCH_PLAN_API"),
+            "chunk_size": int(os.getenv("BATCH_PLAN_CHUNK", "1000")),
+            "poll_interval": float(os.getenv("BATCH_PLAN_POLL_S", "10")),
+        }
+        options.update(kwargs)
+        return cls(**options)
+
+    def _model(self) -> str:
+        return self.model or get_openai_model()
+
+    def _client(self):
+        if self.client is None:
+            self.client = get_async_openai_client(model=self._model())
+        return self.client
+
+    async def run(self, items, goal_text: str | None = None, use_batch_api: bool | None = None):
+        """逐条产出规划结果（按完成顺序）；`items` 可为任意可迭代对象，按需读取。"""
+        use_batch_api = self.use_batch_api if use_batch_api is None else use_batch_api
+        goal_text = goal_text or self.goal_text
+        self._client()
+        # 直连模式多出的协程用于提前检索后续条目的记忆；批任务模式只需检索并发
+        workers = self.memory_concurrency + (0 if use_batch_api else self.concurrency)
+        # 有界队列：调用方消费变慢（如 HTTP 客户端读得慢）时，上游随之放缓
+        queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+        source = enumerate(items)
+        memory_slots = asyncio.Semaphore(self.memory_concurrency)
+        llm_slots = asyncio.Semaphore(self.concurrency)
+        chunk: list[_Prepared] = []
+        submits: set[asyncio.Task] = set()
+
+        def submit(prepared: list[_Prepared]):
+            task = asyncio.ensure_future(self._complete_chunk(prepared, queue))
+            submits.add(task)
+            task.add_done_callback(submits.discard)
+
+        async def worker():
+            # 各协程共用同一个迭代器：取下一个条目是同步操作，不会被并发打断
+            for index, raw in source:
+                prepared = await self._prepare(index, raw, goal_text, memory_slots, queue)
+                if prepared is None:
+                    continue
+                if not use_batch_api:
+                    # 模型名额只在调用期间占用：解析、写库与等待结果队列有空位都在名额之外
+                    result = await self._complete_one(prepared, llm_slots)
+                    await queue.put(result)
+                    continue
+                chunk.append(prepared)
+                if len(chunk) >= self.chunk_size:
+                    submit(chunk[:])
+                    chunk.clear()
+
+        tasks = [asyncio.ensure_future(worker()) for _ in range(workers)]
+        producer = asyncio.ensure_future(self._drain(tasks, chunk, submit, submits, queue))
+        try:
+            while True:
+                result = await queue.get()
+                if result is None:
+                    break
+                yield result
+            await producer
+        finally:
+            for task in [*tasks, *submits, producer]:
+                if not task.done():
+                    task.cancel()
+
+    async def _drain(self, tasks, chunk, submit, submits, queue):
+        """等全部条目处理完（批任务模式下提交最后不足一批的部分并等其完成），再放入结束标记。"""
+        try:
+            await asyncio.gather(*tasks)
+            if chunk:
+                submit(chunk[:])
+                chunk.clear()
+            while submits:
+                await asyncio.gather(*list(submits))
+        except asyncio.CancelledError:
+            # 调用方已停止消费（提前关闭了 run()）：队列可能已满，不再等着放入结束标记
+            raise
+        except BaseException:
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
+    async def _prepare(self, index: int, raw, goal_text: str, memory_slots, queue) -> _Prepared | None:
+        """检索记忆并组装提示词；失败时直接放入失败结果并返回 None。"""
+        start = time.perf_counter()
+        item = None
+        try:
+            item = PlanItem.from_obj(raw)
+            data, degraded = {}, False
+            mem_start = time.perf_counter()
+            if self.memos is not None:
+                async with memory_slots:
+                    mem_obj = await self.memos.search_memory(item.user_id, item.instruction)
+                data = (mem_obj or {}).get("data") or {}
+                degraded = bool((mem_obj or {}).get("degraded"))
+            memory_ms = (time.perf_counter() - mem_start) * 1000
+            observe("batch.memory", memory_ms / 1000)
+            memory_context, _ = self.assembler.assemble_memory(data.get("memory_detail_list") or [])
+            # 固定安排从记忆与事实中抽取，供本地修复使用
+            memories = (data.get("memory_detail_list") or []) + (data.get("fact_detail_list") or [])
+            messages = [
+                {"role": "system", "content": SYSTEM_PROMPT_UNIFIED},
+                {"role": "user", "content": build_unified_demo_prompt(goal_text, memory_context)},
+                {"role": "user", "content": item.instruction},
+            ]
+            return _Prepared(index, item, messages, memories, degraded, memory_ms, start)
+        except Exception as e:
+            await queue.put(self._failure(index, item, raw, f"记忆检索或提示词组装失败：{e}", start))
+            return None
+
+    async def _complete_one(self, prepared: _Prepared, llm_slots: asyncio.Semaphore) -> dict:
+        """单条调用模型（持有 `llm_slots` 名额）后解析出结果。"""
+        try:
+            async with llm_slots:
+                llm_start = time.perf_counter()
+                resp = await self._client().chat.completions.create(model=self._model(), messages=prepared.messages)
+            content = resp.choices[0].message.content
+        except Exception as e:
+            return self._failure(prepared.index, prepared.item, None, f"模型调用失败：{e}", prepared.start)
+        llm_ms = (time.perf_counter() - llm_start) * 1000
+        observe("batch.llm", llm_ms / 1000)
+        return await self._finish(prepared, content, llm_ms)
+
+    async def _complete_chunk(self, chunk: list[_Prepared], queue):
+        """通过 Batch 接口提交一批提示词，轮询到结束后逐条放入结果。"""
+        llm_start = time.perf_counter()
+        try:
+            outputs = await self._run_openai_batch(chunk)
+        except Exception as e:
+            outputs = {p.index: (None, f"批任务失败：{e}") for p in chunk}
+        llm_ms = (time.perf_counter() - llm_start) * 1000
+        observe("batch.llm", llm_ms / 1000)
+        for p in chunk:
+            content, error = outputs.get(p.index, (None, "批任务未返回该条结果"))
+            if error:
+                await queue.put(self._failure(p.index, p.item, None, error, p.start))
+            else:
+                await queue.put(await self._finish(p, content, llm_ms))
+
+    async def _run_openai_batch(self, chunk: list[_Prepared]) -> dict:
+        """返回 {index: (content, error)}。"""
+        client, model = self._client(), self._model()
+        lines = [
+            json.dumps({
+                "custom_id": str(p.index),
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {"model": model, "messages": p.messages},
+            }, ensure_ascii=False)
+            for p in chunk
+        ]
+        upload = await client.files.create(
+            file=("plan_batch.jsonl", io.BytesIO("\n".join(lines).encode("utf-8"))), purpose="batch",
+        )
+        batch = await client.batches.create(
+            input_file_id=upload.id, endpoint="/v1/chat/completions", completion_window="24h",
+        )
+        incr("batch.openai_submitted")
+        while batch.status not in _BATCH_DONE:
+            await asyncio.sleep(self.poll_interval)
+            batch = await client.batches.retrieve(batch.id)
+        if batch.status != "completed":
+            raise RuntimeError(f"批任务 {batch.id} 状态为 {batch.status}")
+        outputs = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            text = (await client.files.content(file_id)).text
+            for line in text.splitlines():
+                if not line.strip():
+                    continue
+                rec = json.loads(line)
+                response = rec.get("response") or {}
+                if rec.get("error") or response.get("status_code") != 200:
+                    outputs[int(rec["custom_id"])] = (None, f"模型调用失败：{rec.get('error') or response.get('body')}")
+                else:
+                    outputs[int(rec["custom_id"])] = (response["body"]["choices"][0]["message"]["content"], None)
+        return outputs
+
+    async def _finish(self, prepared: _Prepared, content: str, llm_ms: float) -> dict:
+        """解析、冲突检测与本地修复，按需写入计划库，返回成功结果。"""
+        item = prepared.item
+        try:
+            plan_json, analysis, parser = parse_plan_update(content)
+            pj = plan_json or {}
+            slots = slots_from_plan(pj, plan_text=analysis, user_id=item.user_id)
+            conflicts = []
+            if any(s.kind == PLAN for s in slots) and any(s.kind == COMMITMENT for s in slots):
+                conflicts = find_conflicts(slots, plan_vs_plan=False)
+            commitments = extract_commitments(prepared.memories) + commitments_from_plan(pj)
+            repair = self.scheduler.repair(plan_tasks(pj), commitments, weekday_of(item.day))
+            if repair.changed:
+                if isinstance(pj.get("today"), dict):
+                    pj["today"]["tasks"] = repair.tasks
+                else:
+                    pj["tasks"] = repair.tasks
+            plan_id = None
+            if self.store is not None and plan_json:
+                # SQLite 写入放到线程里，不阻塞事件循环
+                plan_id = await asyncio.to_thread(self.store.save_plan, item.user_id, item.day, pj, analysis)
+        except Exception as e:
+            return self._failure(prepared.index, item, None, f"计划解析失败：{e}", prepared.start)
+        latency_ms = (time.perf_counter() - prepared.start) * 1000
+        observe("batch.item", latency_ms / 1000)
+        incr("batch.items_ok")
+        return {
+            "index": prepared.index,
+            "id": item.id,
+            "user_id": item.user_id,
+            "day": item.day,
+            "ok": True,
+            "parsed": bool(plan_json),
+            "parse_error": parser.error,
+            "tasks": len(plan_tasks(pj)),
+            "conflicts": len(conflicts),
+            "repaired": len(repair.moves),
+            "unplaced": len(repair.unplaced),
+            "plan_id": plan_id,
+            "memory_degraded": prepared.degraded,
+            "memory_ms": round(prepared.memory_ms, 2),
+            "llm_ms": round(llm_ms, 2),
+            "latency_ms": round(latency_ms, 2),
+            "plan": pj,
+        }
+
+    @staticmethod
+    def _failure(index: int, item: PlanItem | None, raw, error: str, start: float) -> dict:
+        incr("batch.items_failed")
+        if item is None and isinstance(raw, dict):
+            item = PlanItem(raw.get("user_id") or "", raw.get("instruction") or "", raw.get("day"), raw.get("id"))
+        return {
+            "index": index,
+            "id": item.id if item else None,
+            "user_id": item.user_id if item else None,
+            "day": item.day if item else None,
+            "ok": False,
+            "error": error,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 2),
+        }
+
+
+async def plan_batch(items, **kwargs):
+    """便捷入口：`BatchPlanner.from_env(**kwargs).run(items)`，逐条产出结果。"""
+    async for result in BatchPlanner.from_env(**kwargs).run(items):
+        yield result
+
+
+# ----------------------------
+# 命令行：夜间预规划 / 离线压测
+# ----------------------------
+
+def _read_items(path: str):
+    """逐行读取 JSONL 条目（`-` 为标准输入）。"""
+    f = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    try:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def _synthetic_items(users: int, prefix: str):
+    from demo import WEEKDAYS
+
+    for i in range(users):
+        for day, instruction in WEEKDAYS:
+            yield {"user_id": f"{prefix}_{i}", "day": day, "instruction": instruction}
+
+
+async def _run_cli(args, items) -> dict:
+    from memos_client import AsyncMemOSTenantClient
+    from plan_store import PlanStore
+
+    memos = AsyncMemOSTenantClient() if os.getenv("MEMOS_BASE_URL") else None
+    store = PlanStore.from_env()
+    overrides = {"use_batch_api": True} if args.batch_api else {}
+    if args.concurrency:
+        overrides["concurrency"] = args.concurrency
+    planner = BatchPlanner.from_env(memos=memos, store=store, **overrides)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    summary = {"items": 0, "ok": 0, "failed": 0, "tasks": 0, "conflicts": 0, "repaired": 0}
+    start = time.perf_counter()
+    try:
+        async for result in planner.run(items):
+            summary["items"] += 1
+            summary["ok" if result["ok"] else "failed"] += 1
+            for key in ("tasks", "conflicts", "repaired"):
+                summary[key] += result.get(key, 0)
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if memos is not None:
+            await memos.aclose()
+        if store is not None:
+            store.close()
+    elapsed = time.perf_counter() - start
+    summary["elapsed_s"] = round(elapsed, 2)
+    summary["items_per_s"] = round(summary["items"] / elapsed, 2) if elapsed else None
+    return summary
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="批量生成多用户、多天的计划")
+    parser.add_argument("items", nargs="?", default=None, help="JSONL 条目文件，`-` 为标准输入；省略时按 --users 生成一周条目")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--user-prefix", default="batch_user")
+    parser.add_argument("--concurrency", type=int, default=None, help="模型调用并发，默认读 BATCH_PLAN_CONCURRENCY")
+    parser.add_argument("--batch-api", action="store_true", help="使用 OpenAI Batch 接口")
+    parser.add_argument("--offline", action="store_true", help="启动本地假 MemOS 与桩模型服务")
+    parser.add_argument("--llm-latency-ms", type=float, default=500.0, help="离线模式下桩模型的延迟")
+    parser.add_argument("--output", default=None, help="NDJSON 结果输出路径，默认写到标准输出")
+    args = parser.parse_args(argv)
+
+    items = _read_items(args.items) if args.items else _synthetic_items(args.users, args.user_prefix)
+    if not args.offline:
+        summary = asyncio.run(_run_cli(args, items))
+    else:
+        from contextlib import ExitStack
+        from benchmarks.servers import running_server
+
+        with ExitStack() as stack:
+            memos_url = stack.enter_context(running_server("fake_memos:create_app", factory=True))
+            llm_url = stack.enter_context(running_server(
+                "benchmarks.servers:create_fake_openai_app",
+                env={"FAKE_OPENAI_LATENCY_MS": str(args.llm_latency_ms), "FAKE_OPENAI_REPLY": "plan"},
+                factory=True,
+            ))
+            os.environ.update({
+                "MEMOS_BASE_URL": memos_url,
+                "OPENAI_API_BASE": f"{llm_url}/v1",
+                "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY") or "offline",
+            })
+            # 桩服务的批任务在一个模型延迟后即完成，轮询不必等太久
+            os.environ.setdefault("BATCH_PLAN_POLL_S", "0.2")
+            summary = asyncio.run(_run_cli(args, items))
+    print(json.dumps(summary, ensure_ascii=False), file=sys.stderr)
+    return 0 if not summary["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,7 @@
+"""
+benchmarks
+
+通俗说明：
+- 本地压测与基准测试工具集，均可离线运行（依赖进程内的假 OpenAI / 假 MemOS 服务）。
+- 入口：`python -m benchmarks.loadtest --help`。
+"""
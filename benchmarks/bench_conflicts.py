@@ -0,0 +1,94 @@
+"""
+benchmarks/bench_conflicts.py
+
+通俗说明：
+- 冲突检测的规模测试：随机生成多用户、多周的计划与固定安排时段，对比扫描线引擎
+  （`conflicts.find_conflicts`）与逐对比较的耗时，输出 JSON。
+- 逐对比较是 O(n²)，只在 `--naive-max` 以内的规模上运行；两者结果数量应一致。
+
+示例：
+- python -m benchmarks.bench_conflicts
+- python -m benchmarks.bench_conflicts --sizes 1000,10000,100000 --users 500 --weeks 4
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+
+from conflicts import COMMITMENT, PLAN, Slot, find_conflicts
+
+
+def generate_slots(n: int, users: int, days: int, seed: int = 42) -> list[Slot]:
+    """生成 n 个时段：约 1/4 为固定安排，其余为计划任务，均落在 07:00-22:00。"""
+    rng = random.Random(seed)
+    slots = []
+    for i in range(n):
+        user = f"user_{rng.randrange(users)}"
+        day = rng.randrange(days)
+        start = rng.randrange(7 * 60, 21 * 60, 15)
+        length = rng.choice((15, 30, 45, 60, 90, 120))
+        kind = COMMITMENT if rng.random() < 0.25 else PLAN
+        base = day * 24 * 60
+        slots.append(Slot(base + start, base + start + length, f"task_{i}", kind, user, str(day)))
+    return slots
+
+
+def naive_conflicts(slots: list[Slot]) -> int:
+    """逐对比较的参考实现，规则与 find_conflicts 一致，只返回冲突数。"""
+    count = 0
+    for i, a in enumerate(slots):
+        for b in slots[i + 1:]:
+            if a.user_id != b.user_id or not (a.start < b.end and b.start < a.end):
+                continue
+            if a.kind == b.kind == COMMITMENT:
+                continue
+            if a.kind != b.kind and a.start == b.start and a.end == b.end and a.title == b.title:
+                continue
+            count += 1
+    return count
+
+
+def bench(size: int, users: int, days: int, naive_max: int, seed: int) -> dict:
+    slots = generate_slots(size, users, days, seed)
+    start = time.perf_counter()
+    conflicts = find_conflicts(slots)
+    sweep_ms = (time.perf_counter() - start) * 1000
+    out = {
+        "slots": size,
+        "conflicts": len(conflicts),
+        "sweep_ms": round(sweep_ms, 2),
+        "sweep_us_per_slot": round(sweep_ms * 1000 / size, 3),
+    }
+    if size <= naive_max:
+        start = time.perf_counter()
+        naive = naive_conflicts(slots)
+        naive_ms = (time.perf_counter() - start) * 1000
+        out.update({
+            "naive_ms": round(naive_ms, 2),
+            "speedup": round(naive_ms / sweep_ms, 1) if sweep_ms else None,
+            "match": naive == len(conflicts),
+        })
+    return out
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="冲突检测规模测试")
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--weeks", type=int, default=4)
+    parser.add_argument("--naive-max", type=int, default=10000, help="超过该规模不再运行逐对比较")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    results = [
+        bench(int(size), args.users, args.weeks * 7, args.naive_max, args.seed)
+        for size in args.sizes.split(",") if size.strip()
+    ]
+    print(json.dumps({"users": args.users, "weeks": args.weeks, "results": results}, ensure_ascii=False, indent=2))
+    return 0 if all(r.get("match", True) for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
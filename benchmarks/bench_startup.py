@@ -0,0 +1,80 @@
+"""
+benchmarks/bench_startup.py
+
+通俗说明：
+- 启动耗时测试：在全新的子进程里导入各入口模块（`main`、`api_server`、`langgraph_agent`），取多次运行的中位数，
+  对应 CLI 冷启动与 uvicorn worker 启动时的导入开销；同时给出 langgraph + openai 本身的导入耗时作参照
+  （即被推迟到首次构建代理时的那部分）。
+- 代理构建：同一进程内首次 `build_agent_noninteractive()`（含导入与编译）与之后重复构建的耗时。
+- 不访问网络，也不需要 OPENAI_API_KEY；输出 JSON。
+
+示例：
+- python -m benchmarks.bench_startup
+- python -m benchmarks.bench_startup --runs 10 --modules main,api_server
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 子进程内计时：只统计导入本身，不含解释器启动
+_IMPORT_SNIPPET = "import time; t = time.perf_counter(); import {stmt}; print((time.perf_counter() - t) * 1000)"
+
+_BUILD_SNIPPET = """
+import time
+t = time.perf_counter()
+from langgraph_agent import build_agent_noninteractive
+build_agent_noninteractive()
+first = (time.perf_counter() - t) * 1000
+t = time.perf_counter()
+for _ in range({repeat}):
+    build_agent_noninteractive()
+print(first, (time.perf_counter() - t) * 1000 / {repeat})
+"""
+
+
+def _run(code: str) -> list[float]:
+    env = {**os.environ, "PYTHONPATH": ROOT + os.pathsep + os.environ.get("PYTHONPATH", "")}
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return [float(v) for v in out.stdout.split()]
+
+
+def bench_import(stmt: str, runs: int) -> dict:
+    """在 runs 个全新进程中导入，返回耗时中位数与最小值（毫秒）。"""
+    samples = [_run(_IMPORT_SNIPPET.format(stmt=stmt))[0] for _ in range(runs)]
+    return {"median_ms": round(statistics.median(samples), 1), "min_ms": round(min(samples), 1)}
+
+
+def bench_build(repeat: int) -> dict:
+    first, again = _run(_BUILD_SNIPPET.format(repeat=repeat))
+    return {"first_ms": round(first, 1), "repeat_us": round(again * 1000, 2)}
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="入口模块导入与代理构建耗时")
+    parser.add_argument("--modules", default="main,api_server,langgraph_agent")
+    parser.add_argument("--runs", type=int, default=5, help="每个模块的子进程次数")
+    parser.add_argument("--repeat", type=int, default=1000, help="重复构建代理的次数")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    report = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "imports": {m: bench_import(m, args.runs) for m in args.modules.split(",") if m.strip()},
+        "deferred": {"langgraph.graph, openai": bench_import("langgraph.graph, openai", args.runs)},
+        "agent_build": bench_build(args.repeat),
+    }
+    report["elapsed_s"] = round(time.perf_counter() - start, 2)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
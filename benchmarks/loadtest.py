@@ -0,0 +1,333 @@
+"""
+benchmarks/loadtest.py
+
+通俗说明：
+- api_server 与 MemOSClient 的压测工具，输出 JSON 报告（p50/p95/p99 延迟、RPS、错误率）。
+- 场景：
+  - `chat-mock`：驱动 `/chat`，请求带 `mock=true`，只测服务端自身开销；
+  - `chat-stub`：驱动 `/chat` 真实调用路径，模型由本地 OpenAI 兼容桩服务代替；
+  - `memos`：用一个多租户 `AsyncMemOSTenantClient`（所有虚拟用户共用连接池）驱动本地假 MemOS 服务（fake_memos.py）的写入与检索，
+    可通过 `--memos-latency-ms` / `--memos-error-rate` 注入延迟与错误。
+- 请求配比通过 `--mix` 指定，如 `chat=9,stream=1`（chat 场景）或 `search=8,add=2`（memos 场景）。
+- `--baseline` 与基线文件比较，RPS 下降或 p95/p99 上升超过容忍度即以非零状态退出；
+  `--update-baseline` 用本次结果刷新基线。
+
+示例：
+- python -m benchmarks.loadtest --scenario chat-mock --concurrency 50 --duration 10
+- python -m benchmarks.loadtest --scenario all --baseline benchmarks/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from contextlib import ExitStack
+
+import httpx
+
+from benchmarks.servers import running_server
+
+
+SCENARIOS = ("chat-mock", "chat-stub", "memos")
+DEFAULT_MIX = {
+    "chat-mock": "chat=9,stream=1",
+    "chat-stub": "chat=9,stream=1",
+    "memos": "search=8,add=2",
+}
+_PROMPTS = [
+    "帮我安排明天上午的学习计划",
+    "本周还有哪些待办没有完成？",
+    "周四下午要去看牙医，其他任务怎么调整？",
+    "给我这周的总结",
+]
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """最近秩法求百分位（输入需已排序）。"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize_latencies(values: list[float]) -> dict:
+    values = sorted(values)
+    return {
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2),
+        "mean": round(sum(values) / len(values), 2) if values else 0.0,
+        "max": round(values[-1], 2) if values else 0.0,
+    }
+
+
+def parse_mix(text: str) -> list[tuple[str, float]]:
+    mix = []
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip():
+            mix.append((name.strip(), float(weight or 1)))
+    if not mix:
+        raise ValueError(f"无效的请求配比：{text!r}")
+    return mix
+
+
+class Recorder:
+    """按操作名收集延迟、首 token 耗时、状态码与错误数。"""
+
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.ttfts: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.statuses: dict[str, int] = {}
+
+    def record(self, op: str, latency_ms: float, ok: bool, status: str, ttft_ms: float | None = None):
+        self.latencies.setdefault(op, []).append(latency_ms)
+        if ttft_ms is not None:
+            self.ttfts.setdefault(op, []).append(ttft_ms)
+        if not ok:
+            self.errors[op] = self.errors.get(op, 0) + 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def report(self, elapsed: float) -> dict:
+        all_latencies = [v for vs in self.latencies.values() for v in vs]
+        total = len(all_latencies)
+        errors = sum(self.errors.values())
+        ops = {}
+        for op, values in self.latencies.items():
+            ops[op] = {
+                "requests": len(values),
+                "errors": self.errors.get(op, 0),
+                "latency_ms": summarize_latencies(values),
+            }
+            if op in self.ttfts:
+                ops[op]["ttft_ms"] = summarize_latencies(self.ttfts[op])
+        return {
+            "duration_s": round(elapsed, 3),
+            "requests": total,
+            "errors": errors,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "rps": round(total / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": summarize_latencies(all_latencies),
+            "status": self.statuses,
+            "ops": ops,
+        }
+
+
+async def drive(ops: dict, mix: list[tuple[str, float]], concurrency: int, duration: float, seed: int) -> dict:
+    """以固定并发持续 `duration` 秒随机发起操作，返回汇总报告。"""
+    recorder = Recorder()
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    unknown = set(names) - set(ops)
+    if unknown:
+        raise ValueError(f"未知操作：{sorted(unknown)}，可选：{sorted(ops)}")
+
+    start = time.perf_counter()
+    stop_at = start + duration
+
+    async def worker(index: int):
+        rng = random.Random(seed + index)
+        while time.perf_counter() < stop_at:
+            op = rng.choices(names, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                status, ttft_ms = await ops[op](rng)
+                ok = status == "200"
+            except Exception as e:
+                status, ttft_ms, ok = type(e).__name__, None, False
+            recorder.record(op, (time.perf_counter() - t0) * 1000, ok, status, ttft_ms)
+
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    return recorder.report(time.perf_counter() - start)
+
+
+def _chat_ops(http: httpx.AsyncClient, mock: bool, users: int) -> dict:
+    def payload(rng: random.Random) -> dict:
+        return {
+            "prompt": rng.choice(_PROMPTS),
+            "user_id": f"bench_user_{rng.randrange(users)}",
+            "mock": mock,
+        }
+
+    async def chat(rng):
+        res = await http.post("/chat", json=payload(rng))
+        return str(res.status_code), None
+
+    async def stream(rng):
+        t0 = time.perf_counter()
+        ttft_ms = None
+        async with http.stream("POST", "/chat", params={"stream": "true"}, json=payload(rng)) as res:
+            async for line in res.aiter_lines():
+                if ttft_ms is None and line.startswith("data:"):
+                    ttft_ms = (time.perf_counter() - t0) * 1000
+        return str(res.status_code), ttft_ms
+
+    return {"chat": chat, "stream": stream}
+
+
+async def run_chat(args, mock: bool) -> dict:
+    with ExitStack() as stack:
+        base_url = args.url
+        if not base_url:
+            env = {}
+            if not mock:
+                llm_url = stack.enter_context(running_server(
+                    "benchmarks.servers:create_fake_openai_app",
+                    env={"FAKE_OPENAI_LATENCY_MS": str(args.llm_latency_ms)},
+                    factory=True,
+                ))
+                env = {"OPENAI_API_BASE": f"{llm_url}/v1", "OPENAI_API_KEY": "bench"}
+            base_url = stack.enter_context(running_server("api_server:app", env=env))
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=args.timeout) as http:
+            ops = _chat_ops(http, mock, args.users)
+            return await drive(ops, parse_mix(args.mix or DEFAULT_MIX[args.scenario]), args.concurrency, args.duration, args.seed)
+
+
+async def run_memos(args) -> dict:
+    from memos_client import AsyncMemOSTenantClient
+
+    with ExitStack() as stack:
+        base_url = args.url or stack.enter_context(running_server(
+            "fake_memos:create_app",
+            env={
+                "FAKE_MEMOS_LATENCY_MS": str(args.memos_latency_ms),
+                "FAKE_MEMOS_ERROR_RATE": str(args.memos_error_rate),
+                "FAKE_MEMOS_SEED": str(args.seed),
+            },
+            factory=True,
+        ))
+        os.environ["MEMOS_BASE_URL"] = base_url
+        # 全部虚拟用户共用一个多租户客户端（一个连接池）
+        memos = AsyncMemOSTenantClient(pool_size=args.concurrency)
+        users = [f"bench_user_{i}" for i in range(args.users)]
+        try:
+            async def search(rng):
+                result = await memos.search_memory(rng.choice(users), rng.choice(_PROMPTS))
+                # 熔断期间返回的降级空记忆不算成功，否则 MemOS 宕机时错误率反而下降
+                if isinstance(result, dict) and result.get("degraded"):
+                    return "degraded", None
+                return "200", None
+
+            async def add(rng):
+                await memos.add_conversation(rng.choice(users), [{"role": "user", "content": rng.choice(_PROMPTS)}])
+                return "200", None
+
+            ops = {"search": search, "add": add}
+            return await drive(ops, parse_mix(args.mix or DEFAULT_MIX["memos"]), args.concurrency, args.duration, args.seed)
+        finally:
+            await memos.aclose()
+
+
+def run_scenario(args) -> dict:
+    if args.scenario == "memos":
+        result = asyncio.run(run_memos(args))
+    else:
+        result = asyncio.run(run_chat(args, mock=args.scenario == "chat-mock"))
+    result["scenario"] = args.scenario
+    result["config"] = {
+        "concurrency": args.concurrency,
+        "duration_s": args.duration,
+        "mix": args.mix or DEFAULT_MIX[args.scenario],
+        "users": args.users,
+        "external_url": bool(args.url),
+    }
+    if args.scenario == "memos":
+        result["config"]["memos_latency_ms"] = args.memos_latency_ms
+        result["config"]["memos_error_rate"] = args.memos_error_rate
+    return result
+
+
+def compare_to_baseline(result: dict, baseline: dict, tolerance: float) -> list[str]:
+    """与基线比较，返回回归描述列表（为空表示通过）。"""
+    problems = []
+    name = result["scenario"]
+    if result["rps"] < baseline["rps"] * (1 - tolerance):
+        problems.append(f"{name}: RPS {result['rps']} 低于基线 {baseline['rps']}")
+    for key in ("p95", "p99"):
+        now, base = result["latency_ms"][key], baseline["latency_ms"][key]
+        if now > base * (1 + tolerance):
+            problems.append(f"{name}: {key} {now}ms 高于基线 {base}ms")
+    if result["error_rate"] > baseline["error_rate"] + 0.01:
+        problems.append(f"{name}: 错误率 {result['error_rate']} 高于基线 {baseline['error_rate']}")
+    return problems
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="MemLang Demo 压测工具")
+    parser.add_argument("--scenario", default="chat-mock", choices=SCENARIOS + ("all",))
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="每个场景的持续秒数")
+    parser.add_argument("--mix", default=None, help="请求配比，如 chat=9,stream=1")
+    parser.add_argument("--users", type=int, default=100, help="模拟的 user_id 数量")
+    parser.add_argument("--url", default=None, help="压测已启动的服务；不填则在进程内启动")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="chat-stub 模式下桩模型的延迟")
+    parser.add_argument("--memos-latency-ms", type=float, default=0.0, help="memos 场景下假服务注入的延迟")
+    parser.add_argument("--memos-error-rate", type=float, default=0.0, help="memos 场景下假服务注入的错误率")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="JSON 报告输出路径，默认打印到标准输出")
+    parser.add_argument("--baseline", default=None, help="基线文件路径")
+    parser.add_argument("--tolerance", type=float, default=None, help="允许的相对退化比例，默认取基线文件中的值")
+    parser.add_argument("--update-baseline", action="store_true", help="用本次结果覆盖基线中对应场景")
+    args = parser.parse_args(argv)
+
+    scenarios = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    results = []
+    for scenario in scenarios:
+        args.scenario = scenario
+        results.append(run_scenario(args))
+
+    report = results[0] if len(results) == 1 else {"results": results}
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if not args.baseline:
+        return 0
+
+    baseline = {"tolerance": 0.25, "scenarios": {}}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    if args.update_baseline:
+        for result in results:
+            baseline["scenarios"][result["scenario"]] = {
+                "config": result["config"],
+                "rps": result["rps"],
+                "latency_ms": result["latency_ms"],
+                "error_rate": result["error_rate"],
+            }
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            f.write(json.dumps(baseline, ensure_ascii=False, indent=2) + "\n")
+        print(f"已更新基线：{args.baseline}", file=sys.stderr)
+        return 0
+
+    tolerance = args.tolerance if args.tolerance is not None else baseline.get("tolerance", 0.25)
+    problems = []
+    for result in results:
+        base = baseline["scenarios"].get(result["scenario"])
+        if base is None:
+            print(f"基线中没有场景 {result['scenario']}，跳过比较", file=sys.stderr)
+            continue
+        if base.get("config") != result["config"]:
+            print(f"⚠️ {result['scenario']} 的压测配置与基线不同，比较结果仅供参考", file=sys.stderr)
+        problems.extend(compare_to_baseline(result, base, tolerance))
+
+    for problem in problems:
+        print(f"❌ {problem}", file=sys.stderr)
+    if not problems:
+        print("✅ 未发现性能回归", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
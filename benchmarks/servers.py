@@ -0,0 +1,226 @@
+"""
+benchmarks/servers.py
+
+通俗说明：
+- 压测用的本地服务：`running_server("模块:对象")` 以 uvicorn 子进程启动应用，退出时自动关闭；
+  服务端与压测客户端分属不同进程，避免争抢同一个 GIL 而放大延迟。
+- `create_fake_openai_app()`：OpenAI 兼容的 `/v1/chat/completions` 桩服务（支持 stream），
+  延迟由 `FAKE_OPENAI_LATENCY_MS` 注入，用于"桩模型"模式压测 api_server，不产生真实模型调用；
+  `FAKE_OPENAI_REPLY=plan` 时返回带 BEGIN_PLAN_UPDATE 区块的日程回复，供多用户模拟等场景走完整解析流程。
+  另有最小化的 Batch 接口（`/v1/files`、`/v1/batches`）：上传的请求在 `latency_ms` 后一次性完成，供批量规划离线验证。
+- 假 MemOS 服务见仓库根目录的 fake_memos.py。
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from contextlib import contextmanager
+
+from email.parser import BytesParser
+from email.policy import HTTP
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port: int, proc: subprocess.Popen, timeout: float = 15.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"本地服务启动失败（端口 {port}，退出码 {proc.returncode}）")
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"本地服务启动超时（端口 {port}）")
+
+
+@contextmanager
+def running_server(app_path: str, env: dict | None = None, factory: bool = False):
+    """以子进程运行 uvicorn 应用（如 "api_server:app"），产出其 base_url。"""
+    port = _free_port()
+    cmd = [
+        sys.executable, "-m", "uvicorn", app_path,
+        "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning",
+    ]
+    if factory:
+        cmd.append("--factory")
+    proc = subprocess.Popen(cmd, env={**os.environ, **(env or {})})
+    try:
+        _wait_for_port(port, proc)
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def fake_plan_reply(seed_text: str) -> str:
+    """按输入文本确定性地生成一份日程回复（约三分之一的输入会带一个与晨会重叠的时段）。"""
+    h = int(hashlib.md5(seed_text.encode("utf-8")).hexdigest(), 16)
+    review = "09:45-10:30" if h % 3 == 0 else "10:30-11:30"
+    tasks = [
+        {"time": "07:00-07:30", "activity": "晨练", "priority": "中", "source": "偏好"},
+        {"time": "08:00-09:00", "activity": "学习政治", "priority": "高", "source": "学习目标"},
+        {"time": "09:30-10:00", "activity": "晨会", "priority": "高", "source": "固定承诺"},
+        {"time": review, "activity": "项目代码评审", "priority": "中", "source": "待办"},
+        {"time": "12:00-12:30", "activity": "客户电话沟通", "priority": "高", "source": "固定承诺"},
+        {"time": "14:00-15:00", "activity": "学习英语", "priority": "中", "source": "学习目标"},
+        {"time": "20:00-21:00", "activity": "家庭聚餐", "priority": "高", "source": "固定承诺"},
+    ]
+    analysis = "\n".join(f"{t['time']} {t['activity']}" for t in tasks)
+    plan = {
+        "date": "2025-11-07",
+        "today": {"summary": "今日学习与工作安排，已避开固定会议与家庭聚餐。", "tasks": tasks},
+        "commitments": [
+            {"title": "晨会", "time_range": "2025-11-07T09:30-10:00"},
+            {"title": "客户电话沟通", "time_range": "2025-11-07T12:00-12:30"},
+        ],
+    }
+    return (
+        f"今日安排分析：\n{analysis}\n\n"
+        f"BEGIN_PLAN_UPDATE\n{json.dumps(plan, ensure_ascii=False, indent=2)}\nEND_PLAN_UPDATE"
+    )
+
+
+def _multipart_file(body: bytes, content_type: str) -> tuple[str | None, bytes]:
+    """取 multipart/form-data 中名为 file 的部分（桩服务不依赖 python-multipart）。"""
+    message = BytesParser(policy=HTTP).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode() + body)
+    for part in message.iter_parts():
+        if part.get_param("name", header="content-disposition") == "file":
+            return part.get_filename(), part.get_payload(decode=True)
+    raise HTTPException(status_code=400, detail="missing file part")
+
+
+def create_fake_openai_app(latency_ms: float | None = None, tokens: int = 32, reply: str | None = None) -> FastAPI:
+    """OpenAI 兼容的补全桩服务：等待 `latency_ms` 后返回固定长度的回复（或日程回复）。"""
+    if latency_ms is None:
+        latency_ms = float(os.getenv("FAKE_OPENAI_LATENCY_MS", "200"))
+    if reply is None:
+        reply = os.getenv("FAKE_OPENAI_REPLY", "text")
+    app = FastAPI()
+    files: dict[str, str] = {}
+    batches: dict[str, dict] = {}
+
+    def reply_words(body: dict) -> list[str]:
+        if reply == "plan":
+            last = body.get("messages", [{}])[-1].get("content", "")
+            content = fake_plan_reply(last)
+            # 按约 8 个字符切成一个流式片段
+            return [content[i:i + 8] for i in range(0, len(content), 8)]
+        return ["计划"] * tokens
+
+    def completion(body: dict, words: list[str]) -> dict:
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(words)},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 16, "completion_tokens": len(words), "total_tokens": 16 + len(words)},
+        }
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "stub")
+        created = int(time.time())
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        words = reply_words(body)
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency_ms / 1000)
+            return completion(body, words)
+
+        async def chunks():
+            # 首 token 前等待一半延迟，其余平均分摊到各 token
+            await asyncio.sleep(latency_ms / 2000)
+            per_token = latency_ms / 2000 / max(1, len(words))
+            for word in words:
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                await asyncio.sleep(per_token)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    @app.post("/v1/files")
+    async def upload(request: Request):
+        filename, content = _multipart_file(await request.body(), request.headers.get("content-type", ""))
+        file_id = f"file-{uuid.uuid4().hex[:12]}"
+        files[file_id] = content.decode("utf-8")
+        return {"id": file_id, "object": "file", "bytes": len(content), "purpose": "batch",
+                "filename": filename, "created_at": int(time.time()), "status": "processed"}
+
+    @app.get("/v1/files/{file_id}/content")
+    async def file_content(file_id: str):
+        if file_id not in files:
+            raise HTTPException(status_code=404, detail="file not found")
+        return PlainTextResponse(files[file_id])
+
+    def batch_view(batch_id: str) -> dict:
+        batch = batches[batch_id]
+        if batch["status"] == "in_progress" and time.time() >= batch["ready_at"]:
+            lines = []
+            for line in files[batch["input_file_id"]].splitlines():
+                if line.strip():
+                    req = json.loads(line)
+                    lines.append(json.dumps({
+                        "id": f"batch_req_{uuid.uuid4().hex[:12]}",
+                        "custom_id": req["custom_id"],
+                        "response": {"status_code": 200, "body": completion(req["body"], reply_words(req["body"]))},
+                        "error": None,
+                    }, ensure_ascii=False))
+            output_id = f"file-{uuid.uuid4().hex[:12]}"
+            files[output_id] = "\n".join(lines) + "\n"
+            batch.update(status="completed", output_file_id=output_id, completed_at=int(time.time()),
+                         request_counts={"total": len(lines), "completed": len(lines), "failed": 0})
+        return {k: v for k, v in batch.items() if k != "ready_at"}
+
+    @app.post("/v1/batches")
+    async def create_batch(request: Request):
+        body = await request.json()
+        if body.get("input_file_id") not in files:
+            raise HTTPException(status_code=400, detail="unknown input_file_id")
+        batch_id = f"batch_{uuid.uuid4().hex[:12]}"
+        batches[batch_id] = {
+            "id": batch_id, "object": "batch", "endpoint": body.get("endpoint"),
+            "input_file_id": body["input_file_id"], "completion_window": body.get("completion_window", "24h"),
+            "status": "in_progress", "created_at": int(time.time()), "output_file_id": None, "error_file_id": None,
+            "ready_at": time.time() + latency_ms / 1000,
+        }
+        return batch_view(batch_id)
+
+    @app.get("/v1/batches/{batch_id}")
+    async def get_batch(batch_id: str):
+        if batch_id not in batches:
+            raise HTTPException(status_code=404, detail="batch not found")
+        return batch_view(batch_id)
+
+    return app
+
@@ -0,0 +1,200 @@
+"""
+completion_cache.py
+
+通俗说明：
+- 模型补全结果的缓存（默认关闭，按需开启）：键为 (model, messages, 采样参数) 的 SHA-256 哈希，
+  模板化的规划请求与压测流量中完全相同的请求不再重复调用模型。
+- 两级存储：进程内 LRU（TTL + 条数上限 + 字节上限），可选的 SQLite 磁盘层（进程重启后仍可命中，
+  同样有 TTL 与条数上限）；磁盘命中会回填内存层。
+- 调用方可逐次绕过（`use_cache=False` / 请求体 `cache: false`）：既不读也不写缓存。
+- 只缓存确定性采样的请求：采样参数必须显式带 `temperature=0`。未设置 temperature 时模型按默认值（1.0）随机采样，
+  把一次采样结果缓存起来复用给其他调用方并不正确，这类请求 get 总是未命中、put 不写入（计入 `skipped`）。
+- 环境变量：`COMPLETION_CACHE=1` 开启；`COMPLETION_CACHE_TTL`（秒，默认 3600）、`COMPLETION_CACHE_MAX_ENTRIES`、
+  `COMPLETION_CACHE_MAX_BYTES`、`COMPLETION_CACHE_PATH`（SQLite 文件路径，不设则只用内存）。
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+DETERMINISTIC = {"temperature": 0}
+
+
+def is_deterministic(params: dict | None) -> bool:
+    """采样参数是否显式要求确定性输出（temperature=0）；未设置视为模型默认的随机采样。"""
+    temperature = (params or {}).get("temperature")
+    return temperature is not None and temperature == 0
+
+
+def completion_key(model: str, messages: list, params: dict | None = None) -> str:
+    """计算请求的缓存键；值为 None 的采样参数不参与计算。"""
+    body = {
+        "model": model,
+        "messages": [{"role": m.get("role"), "content": m.get("content")} for m in messages],
+        "params": {k: v for k, v in sorted((params or {}).items()) if v is not None},
+    }
+    raw = json.dumps(body, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """补全结果缓存：内存 LRU + 可选 SQLite 层（线程安全）。"""
+
+    def __init__(
+        self,
+        ttl: float = 3600.0,
+        max_entries: int = 1024,
+        max_bytes: int = 16 * 1024 * 1024,
+        path: str | None = None,
+        disk_max_entries: int = 100_000,
+    ):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+        self.disk_max_entries = max(1, disk_max_entries)
+
+        self._lock = threading.Lock()
+        # key -> (expires_at, payload_bytes)，顺序即 LRU 顺序（末尾最新）
+        self._entries: OrderedDict = OrderedDict()
+        self._bytes = 0
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "expired": 0, "evictions": 0, "oversize": 0, "skipped": 0}
+
+        self._db = None
+        self._disk_writes = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, payload BLOB NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS idx_completions_accessed ON completions(accessed_at)")
+
+    @classmethod
+    def from_env(cls, prefix: str = "COMPLETION_CACHE") -> "CompletionCache | None":
+        """按环境变量创建；`<prefix>` 未开启时返回 None。"""
+        if os.getenv(prefix, "").strip().lower() not in ("1", "true", "yes", "on"):
+            return None
+        return cls(
+            ttl=float(os.getenv(f"{prefix}_TTL", "3600")),
+            max_entries=int(os.getenv(f"{prefix}_MAX_ENTRIES", "1024")),
+            max_bytes=int(os.getenv(f"{prefix}_MAX_BYTES", str(16 * 1024 * 1024))),
+            path=os.getenv(f"{prefix}_PATH") or None,
+        )
+
+    @property
+    def persistent(self) -> bool:
+        """是否启用了 SQLite 磁盘层（读写会有磁盘 I/O，异步调用方应放到线程里执行）。"""
+        return self._db is not None
+
+    def get(self, model: str, messages: list, params: dict | None = None):
+        """命中且未过期时返回缓存的结果（dict 副本），否则返回 None；非确定性采样的请求总是返回 None。"""
+        if not is_deterministic(params):
+            with self._lock:
+                self._stats["skipped"] += 1
+            return None
+        key = completion_key(model, messages, params)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, payload = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats["hits"] += 1
+                    return json.loads(payload)
+                self._remove(key)
+                self._stats["expired"] += 1
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT payload, expires_at FROM completions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] > now:
+                    self._db.execute("UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key))
+                    self._insert(key, row[1], bytes(row[0]))
+                    self._stats["hits"] += 1
+                    self._stats["disk_hits"] += 1
+                    return json.loads(row[0])
+                if row is not None:
+                    self._db.execute("DELETE FROM completions WHERE key = ?", (key,))
+                    self._stats["expired"] += 1
+            self._stats["misses"] += 1
+        return None
+
+    def put(self, model: str, messages: list, value: dict, params: dict | None = None) -> bool:
+        """写入一条补全结果；非确定性采样或单条超过字节上限时不缓存并返回 False。"""
+        if not is_deterministic(params):
+            return False
+        try:
+            payload = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        except (TypeError, ValueError):
+            return False
+        key = completion_key(model, messages, params)
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            if len(payload) > self.max_bytes:
+                self._stats["oversize"] += 1
+                return False
+            self._insert(key, expires_at, payload)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO completions (key, payload, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, payload, expires_at, now),
+                )
+                self._disk_writes += 1
+                # 每写入一定次数清理一次过期与超出上限的旧条目
+                if self._disk_writes % 256 == 0:
+                    self._prune_disk(now)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM completions")
+
+    def stats(self) -> dict:
+        """返回计数快照：hits / disk_hits / misses / hit_rate / entries / bytes 等。"""
+        with self._lock:
+            out = dict(self._stats)
+            out["entries"] = len(self._entries)
+            out["bytes"] = self._bytes
+            if self._db is not None:
+                out["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+        return out
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _insert(self, key: str, expires_at: float, payload: bytes):
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (expires_at, payload)
+        self._bytes += len(payload)
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+
+    def _remove(self, key: str):
+        _, payload = self._entries.pop(key)
+        self._bytes -= len(payload)
+
+    def _prune_disk(self, now: float):
+        self._db.execute("DELETE FROM completions WHERE expires_at <= ?", (now,))
+        self._db.execute(
+            "DELETE FROM completions WHERE key IN ("
+            "SELECT key FROM completions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_max_entries,),
+        )
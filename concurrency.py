@@ -0,0 +1,115 @@
+"""
+concurrency.py
+
+通俗说明：
+- 异步接口的并发闸门：一个全局信号量 + 每个 user_id 一个并发上限。
+- 单个用户超过自身并发上限时立即拒绝；全局并发占满时最多排队等待 `queue_timeout` 秒，
+  排队人数超过 `max_queue` 或等待超时同样立即拒绝，调用方据此返回 429。
+- `acquire()` 是异步上下文管理器，产出本次排队等待的毫秒数，便于与模型耗时分开统计。
+"""
+
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+
+
+class ConcurrencyRejected(Exception):
+    """并发超限被拒绝；`reason` 说明是用户级还是全局级限制。"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int((os.getenv(name, str(default)) or str(default)).strip())
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float((os.getenv(name, str(default)) or str(default)).strip())
+    except ValueError:
+        return default
+
+
+class ConcurrencyLimiter:
+    """全局 + 按用户的异步并发限制器（仅在单个事件循环内使用）。"""
+
+    def __init__(
+        self,
+        max_concurrency: int = 64,
+        per_user: int = 4,
+        queue_timeout: float = 1.0,
+        max_queue: int = 256,
+    ):
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_user = max(1, per_user)
+        self.queue_timeout = queue_timeout
+        self.max_queue = max(0, max_queue)
+
+        self._global = asyncio.Semaphore(self.max_concurrency)
+        self._user_active: dict[str, int] = {}
+        self._waiting = 0
+        self.rejected = {"user": 0, "global": 0}
+
+    @classmethod
+    def from_env(cls, prefix: str = "CHAT") -> "ConcurrencyLimiter":
+        """从环境变量读取配置，如 `CHAT_MAX_CONCURRENCY`、`CHAT_MAX_CONCURRENCY_PER_USER`。"""
+        return cls(
+            max_concurrency=_env_int(f"{prefix}_MAX_CONCURRENCY", 64),
+            per_user=_env_int(f"{prefix}_MAX_CONCURRENCY_PER_USER", 4),
+            queue_timeout=_env_float(f"{prefix}_QUEUE_TIMEOUT", 1.0),
+            max_queue=_env_int(f"{prefix}_MAX_QUEUE", 256),
+        )
+
+    @asynccontextmanager
+    async def acquire(self, user_id: str | None = None):
+        """占用一个并发名额，产出排队等待的毫秒数；超限时抛出 `ConcurrencyRejected`。"""
+        start = time.perf_counter()
+        if user_id is not None:
+            if self._user_active.get(user_id, 0) >= self.per_user:
+                self.rejected["user"] += 1
+                raise ConcurrencyRejected("user")
+            self._user_active[user_id] = self._user_active.get(user_id, 0) + 1
+        try:
+            await self._acquire_global()
+            try:
+                yield (time.perf_counter() - start) * 1000
+            finally:
+                self._global.release()
+        finally:
+            if user_id is not None:
+                left = self._user_active[user_id] - 1
+                if left:
+                    self._user_active[user_id] = left
+                else:
+                    del self._user_active[user_id]
+
+    async def _acquire_global(self):
+        if not self._global.locked():
+            await self._global.acquire()
+            return
+        if self._waiting >= self.max_queue or self.queue_timeout <= 0:
+            self.rejected["global"] += 1
+            raise ConcurrencyRejected("global")
+        self._waiting += 1
+        try:
+            await asyncio.wait_for(self._global.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected["global"] += 1
+            raise ConcurrencyRejected("global")
+        finally:
+            self._waiting -= 1
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "per_user": self.per_user,
+            "active_users": len(self._user_active),
+            "waiting": self._waiting,
+            "rejected": dict(self.rejected),
+        }
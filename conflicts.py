@@ -0,0 +1,309 @@
+"""
+conflicts.py
+
+通俗说明：
+- 日程时间冲突检测引擎：把计划任务与固定安排统一成 `Slot`（用户、日期、起止分钟、标题、类型），
+  按用户排序后一次扫描线求出全部重叠，复杂度 O(n log n + 冲突数)，取代逐对比较。
+- 时间轴按"天序号 × 1440 + 当天分钟"展开：跨午夜的时段（如 23:00-01:00）会与次日的时段比较，
+  多周、多用户的计划可以一次性批量校验。
+- 支持计划 vs 固定安排、计划 vs 计划两类冲突；固定安排之间不算冲突。计划里原样照抄的固定安排
+  （起止时间与标题都相同）视为同一件事，不重复报告。
+- `slots_from_plan()` 从模型输出的计划 JSON（及可选的分析文本）中抽取时段；结果是 `Conflict` 列表，
+  可用 `to_dict()` 转成 JSON。
+- `ConflictTracker` 是在线版本：时段逐个加入（例如边流式解析边加入），每次立即返回新出现的冲突。
+"""
+
+import bisect
+import heapq
+import re
+from dataclasses import asdict, dataclass
+from datetime import date
+
+PLAN = "plan"
+COMMITMENT = "commitment"
+
+_DAY_MINUTES = 24 * 60
+_HM_RE = re.compile(r"(\d{1,2})[:：](\d{2})")
+_RANGE_RE = re.compile(r"(\d{1,2}[:：]\d{2})\s*[-–—~至到]\s*(\d{1,2}[:：]\d{2})")
+_DATE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})")
+_WEEKDAYS = {name: i for i, names in enumerate((
+    ("周一", "星期一", "mon", "monday"),
+    ("周二", "星期二", "tue", "tuesday"),
+    ("周三", "星期三", "wed", "wednesday"),
+    ("周四", "星期四", "thu", "thursday"),
+    ("周五", "星期五", "fri", "friday"),
+    ("周六", "星期六", "sat", "saturday"),
+    ("周日", "星期日", "周天", "sun", "sunday"),
+)) for name in names}
+
+
+def parse_hm(text: str) -> int | None:
+    """'09:30' → 570；无法解析时返回 None。"""
+    m = _HM_RE.search(text or "")
+    if not m:
+        return None
+    h, mi = int(m.group(1)), int(m.group(2))
+    if h > 24 or mi > 59:
+        return None
+    return h * 60 + mi
+
+
+def day_index(day) -> int:
+    """把日期（'2025-11-07' / date）、星期名（'周一'）或整数统一成天序号。"""
+    if day is None or day == "":
+        return 0
+    if isinstance(day, int):
+        return day
+    if isinstance(day, date):
+        return day.toordinal()
+    text = str(day).strip()
+    m = _DATE_RE.search(text)
+    if m:
+        return date.fromisoformat(m.group(1)).toordinal()
+    if text.lower() in _WEEKDAYS:
+        return _WEEKDAYS[text.lower()]
+    try:
+        return int(text)
+    except ValueError:
+        raise ValueError(f"无法识别的日期：{day!r}") from None
+
+
+def weekday_of(day) -> int | None:
+    """星期几（周一为 0）；无法判断时返回 None。"""
+    if isinstance(day, date):
+        return day.weekday()
+    text = str(day or "").strip()
+    m = _DATE_RE.search(text)
+    if m:
+        return date.fromisoformat(m.group(1)).weekday()
+    return _WEEKDAYS.get(text.lower())
+
+
+@dataclass(frozen=True, slots=True)
+class Slot:
+    """时间轴上的一个时段；`start`/`end` 为绝对分钟数（天序号 × 1440 + 当天分钟）。"""
+    start: int
+    end: int
+    title: str
+    kind: str = PLAN
+    user_id: str = ""
+    day: str = ""
+
+    @classmethod
+    def on(cls, day, start: str, end: str, title: str, kind: str = PLAN, user_id: str = "") -> "Slot":
+        """按"某天 + 起止时刻"构造时段；结束早于开始时视为跨过午夜。"""
+        s, e = parse_hm(start), parse_hm(end)
+        if s is None or e is None:
+            raise ValueError(f"无法解析时段：{start}-{end}")
+        base = day_index(day) * _DAY_MINUTES
+        if e <= s:
+            e += _DAY_MINUTES
+        return cls(base + s, base + e, title, kind, user_id, str(day or ""))
+
+    def label(self) -> str:
+        s, e = self.start % _DAY_MINUTES, self.end % _DAY_MINUTES
+        return f"{s // 60:02d}:{s % 60:02d}-{e // 60:02d}:{e % 60:02d}"
+
+
+@dataclass(frozen=True, slots=True)
+class Conflict:
+    """两个重叠的时段；`a` 总是较早开始的一个。"""
+    a: Slot
+    b: Slot
+
+    @property
+    def kind(self) -> str:
+        return "plan_vs_plan" if self.a.kind == self.b.kind == PLAN else "plan_vs_commitment"
+
+    @property
+    def overlap_minutes(self) -> int:
+        return min(self.a.end, self.b.end) - max(self.a.start, self.b.start)
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": self.kind,
+            "user_id": self.a.user_id,
+            "overlap_minutes": self.overlap_minutes,
+            "a": {**asdict(self.a), "time": self.a.label()},
+            "b": {**asdict(self.b), "time": self.b.label()},
+        }
+
+
+def _same_event(x: Slot, y: Slot) -> bool:
+    return x.start == y.start and x.end == y.end and x.title.strip() == y.title.strip()
+
+
+def _reportable(x: Slot, y: Slot, plan_vs_plan: bool) -> bool:
+    """两个已知重叠的时段是否需要报告为冲突。"""
+    if x.kind == COMMITMENT and y.kind == COMMITMENT:
+        return False
+    if x.kind != y.kind and _same_event(x, y):
+        return False
+    if not plan_vs_plan and x.kind == y.kind == PLAN:
+        return False
+    return True
+
+
+def find_conflicts(slots, plan_vs_plan: bool = True) -> list[Conflict]:
+    """扫描线求出所有重叠的时段对（按用户隔离），按开始时间排序返回。
+
+    - 首尾相接（一个结束时刻等于另一个开始时刻）不算冲突；
+    - 固定安排之间、以及计划照抄的同一条固定安排不算冲突；
+    - `plan_vs_plan=False` 时只报告计划与固定安排之间的冲突。
+    """
+    ordered = sorted(slots, key=lambda s: (s.user_id, s.start, s.end))
+    conflicts: list[Conflict] = []
+    active: list[tuple[int, int, Slot]] = []  # (结束时间, 序号, 时段) 的最小堆
+    user = None
+    for seq, slot in enumerate(ordered):
+        if slot.end <= slot.start:
+            continue
+        if slot.user_id != user:
+            user = slot.user_id
+            active.clear()
+        # 弹出已经结束的时段，堆里剩下的都与当前时段重叠
+        while active and active[0][0] <= slot.start:
+            heapq.heappop(active)
+        for _, _, other in active:
+            if _reportable(other, slot, plan_vs_plan):
+                conflicts.append(Conflict(other, slot))
+        heapq.heappush(active, (slot.end, seq, slot))
+    return conflicts
+
+
+class ConflictTracker:
+    """在线冲突检测：按用户维护按开始时间排序的时段表，加入新时段时只查看可能重叠的邻近区间。"""
+
+    def __init__(self, plan_vs_plan: bool = True):
+        self.plan_vs_plan = plan_vs_plan
+        self.conflicts: list[Conflict] = []
+        self._slots: dict[str, list] = {}     # user_id -> [(开始, 序号, 时段), ...]
+        self._max_len: dict[str, int] = {}    # user_id -> 已加入时段的最大长度
+        self._seq = 0
+
+    def add(self, slot: Slot) -> list[Conflict]:
+        """加入一个时段，返回它与此前时段之间新出现的冲突。"""
+        if slot.end <= slot.start:
+            return []
+        entries = self._slots.setdefault(slot.user_id, [])
+        max_len = self._max_len.get(slot.user_id, 0)
+        found = []
+        # 只有开始时间落在 [start - 最大长度, end) 内的时段才可能与之重叠
+        i = bisect.bisect_left(entries, (slot.start - max_len,))
+        while i < len(entries) and entries[i][0] < slot.end:
+            other = entries[i][2]
+            if other.end > slot.start and _reportable(other, slot, self.plan_vs_plan):
+                first, second = (other, slot) if (other.start, other.end) <= (slot.start, slot.end) else (slot, other)
+                found.append(Conflict(first, second))
+            i += 1
+        self._seq += 1
+        bisect.insort(entries, (slot.start, self._seq, slot))
+        self._max_len[slot.user_id] = max(max_len, slot.end - slot.start)
+        self.conflicts.extend(found)
+        return found
+
+    def extend(self, slots) -> list[Conflict]:
+        found = []
+        for slot in slots:
+            found.extend(self.add(slot))
+        return found
+
+
+def plan_tasks(plan_json: dict) -> list:
+    """计划 JSON 中的任务列表，兼容 {"today": {"tasks": [...]}}、{"tasks": [...]}、{"schedule": [...]}。"""
+    today = plan_json.get("today")
+    if isinstance(today, dict) and isinstance(today.get("tasks"), list):
+        return today["tasks"]
+    for key in ("tasks", "schedule"):
+        if isinstance(plan_json.get(key), list):
+            return plan_json[key]
+    return []
+
+
+def _parse_range(text: str):
+    m = _RANGE_RE.search(text or "")
+    return (m.group(1), m.group(2), m) if m else None
+
+
+def slots_from_text(text: str, day=None, user_id: str = "", kind: str = PLAN) -> list[Slot]:
+    """从自由文本中逐行抽取 "HH:MM-HH:MM 标题" 形式的时段。"""
+    slots = []
+    for line in (text or "").splitlines():
+        parsed = _parse_range(line)
+        if not parsed:
+            continue
+        start, end, m = parsed
+        title = line[m.end():].strip(" ：:|-") or "未命名任务"
+        try:
+            slots.append(Slot.on(day, start, end, title, kind, user_id))
+        except ValueError:
+            continue
+    return slots
+
+
+def task_slot(task: dict, day=None, user_id: str = "") -> Slot | None:
+    """计划 JSON 中的一条任务（`time` 形如 "08:00-09:00"）→ 计划时段；无法解析时返回 None。"""
+    if not isinstance(task, dict):
+        return None
+    parsed = _parse_range(str(task.get("time", "")))
+    if not parsed:
+        return None
+    title = task.get("activity") or task.get("title") or "未命名任务"
+    try:
+        return Slot.on(day, parsed[0], parsed[1], title, PLAN, user_id)
+    except ValueError:
+        return None
+
+
+def commitment_slot(commitment: dict, day=None, user_id: str = "", use_date: bool = True) -> Slot | None:
+    """一条固定安排（`time_range` 形如 "2025-11-07T09:30-10:00" 或 "09:30-10:00"）→ 固定安排时段。
+
+    `use_date=False` 时忽略其中的日期，统一落在 `day` 上（只校验单日计划时使用）。
+    """
+    if not isinstance(commitment, dict):
+        return None
+    tr = str(commitment.get("time_range", ""))
+    parsed = _parse_range(tr.split("T", 1)[-1])
+    if not parsed:
+        return None
+    m = _DATE_RE.search(tr) if use_date else None
+    try:
+        return Slot.on(m.group(1) if m else day, parsed[0], parsed[1],
+                       commitment.get("title") or "固定安排", COMMITMENT, user_id)
+    except ValueError:
+        return None
+
+
+def slots_from_plan(plan_json: dict, plan_text: str | None = None, user_id: str = "", day=None) -> list[Slot]:
+    """从计划 JSON 抽取计划任务与固定安排；给出 `plan_text` 时计划时段改从文本抽取。
+
+    计划日期依次取 `day` 参数、JSON 的 `date` 字段、首条带日期的固定安排；固定安排自带日期时以其为准。
+    """
+    plan_json = plan_json if isinstance(plan_json, dict) else {}
+    commitments = [c for c in plan_json.get("commitments", []) or [] if isinstance(c, dict)]
+    if day is None:
+        day = plan_json.get("date")
+    if day is None:
+        for c in commitments:
+            m = _DATE_RE.search(str(c.get("time_range", "")))
+            if m:
+                day = m.group(1)
+                break
+
+    slots: list[Slot] = []
+    if plan_text is not None:
+        slots.extend(slots_from_text(plan_text, day, user_id))
+    else:
+        slots.extend(s for s in (task_slot(t, day, user_id) for t in plan_tasks(plan_json)) if s)
+    slots.extend(s for s in (commitment_slot(c, day, user_id) for c in commitments) if s)
+    return slots
+
+
+def summarize(conflicts: list[Conflict]) -> dict:
+    """按冲突类型与用户计数。"""
+    by_kind: dict[str, int] = {}
+    users = set()
+    for c in conflicts:
+        by_kind[c.kind] = by_kind.get(c.kind, 0) + 1
+        users.add(c.a.user_id)
+    return {"total": len(conflicts), "by_kind": by_kind, "users": len(users)}
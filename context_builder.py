@@ -0,0 +1,198 @@
+"""
+context_builder.py
+
+通俗说明：
+- 按 token 预算拼装提示词上下文，避免记忆与历史对话随一周推进线性膨胀。
+- 记忆条目：按"相关度 + 新近度"综合排序，去掉近似重复的条目，再按预算从高到低装入。
+- 历史对话：从最近的一轮往前按"用户 + 助理"成对保留，超出历史预算的早期轮次被丢弃；
+  最近一轮总会保留（单轮超出预算时截断到预算内），更早的某一轮过长时只跳过该轮，继续保留装得下的更早轮次。
+- token 计数优先使用本地 `tiktoken`（可选依赖），未安装时按中文逐字、英文约 4 字符一个 token 估算。
+- 每次拼装都会返回保留/丢弃的 token 数，便于观察压缩效果。
+"""
+
+import math
+import re
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from text_features import lexical_features
+
+
+_ESTIMATE_RE = re.compile(r"[㐀-鿿豈-﫿]|[A-Za-z0-9]+|\S")
+_encoder = None
+
+
+def count_tokens(text: str) -> int:
+    """统计文本 token 数；有 tiktoken 时精确计数，否则估算。"""
+    global _encoder
+    if not text:
+        return 0
+    if _encoder is None:
+        try:
+            import tiktoken
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoder = False
+    if _encoder:
+        return len(_encoder.encode(text))
+    total = 0
+    for piece in _ESTIMATE_RE.findall(text):
+        total += math.ceil(len(piece) / 4) if piece.isascii() and piece.isalnum() else 1
+    return total
+
+
+def truncate_tokens(text: str, limit: int) -> str:
+    """截取文本开头，使其不超过 `limit` 个 token（二分查找前缀长度）。"""
+    if limit <= 0:
+        return ""
+    if count_tokens(text) <= limit:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid]) <= limit:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo]
+
+
+def _shingles(text: str) -> set:
+    return set(lexical_features(text))
+
+
+def _parse_time(value) -> float | None:
+    if not value:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+@dataclass
+class AssembledContext:
+    """拼装结果：记忆上下文文本、裁剪后的历史消息与预算报告。"""
+    memory_context: str
+    history: list
+    report: dict = field(default_factory=dict)
+
+
+class ContextAssembler:
+    """在 token 预算内挑选记忆条目与历史消息。"""
+
+    def __init__(
+        self,
+        memory_budget: int = 1200,
+        history_budget: int = 2000,
+        max_item_chars: int = 300,
+        recency_weight: float = 0.3,
+        dedupe_threshold: float = 0.8,
+    ):
+        self.memory_budget = memory_budget
+        self.history_budget = history_budget
+        self.max_item_chars = max_item_chars
+        self.recency_weight = recency_weight
+        self.dedupe_threshold = dedupe_threshold
+
+    def _rank(self, items: list) -> list:
+        """返回按综合分从高到低排列的 (分数, 文本) 列表。"""
+        texts, relevance, times = [], [], []
+        for order, item in enumerate(items):
+            text = (item.get("memory_value") or "").replace("\n", "").strip()[:self.max_item_chars]
+            if not text:
+                continue
+            texts.append(text)
+            rel = item.get("relativity", item.get("score"))
+            relevance.append(float(rel) if isinstance(rel, (int, float)) else None)
+            ts = _parse_time(item.get("create_time") or item.get("update_time"))
+            # 没有时间戳时以服务端返回顺序近似新近度（越靠前越新）
+            times.append(ts if ts is not None else -order)
+        if not texts:
+            return []
+
+        n = len(texts)
+        # 缺少相关度分数时，以服务端排序位置近似
+        rel_scores = [r if r is not None else 1 - i / n for i, r in enumerate(relevance)]
+        lo, hi = min(rel_scores), max(rel_scores)
+        rel_norm = [(r - lo) / (hi - lo) if hi > lo else 1.0 for r in rel_scores]
+        t_lo, t_hi = min(times), max(times)
+        rec_norm = [(t - t_lo) / (t_hi - t_lo) if t_hi > t_lo else 1.0 for t in times]
+
+        w = self.recency_weight
+        scored = [((1 - w) * rel_norm[i] + w * rec_norm[i], texts[i]) for i in range(n)]
+        scored.sort(key=lambda s: s[0], reverse=True)
+        return scored
+
+    def assemble_memory(self, items: list) -> tuple[str, dict]:
+        """挑选记忆条目并编号拼接，返回 (上下文文本, 报告)。"""
+        kept_lines, kept_shingles = [], []
+        report = {"memory_items": 0, "memory_kept": 0, "memory_duplicates": 0,
+                  "memory_tokens_kept": 0, "memory_tokens_dropped": 0}
+        for _, text in self._rank(items):
+            report["memory_items"] += 1
+            tokens = count_tokens(text)
+            shingles = _shingles(text)
+            if any(len(shingles & s) / (len(shingles | s) or 1) >= self.dedupe_threshold for s in kept_shingles):
+                report["memory_duplicates"] += 1
+                report["memory_tokens_dropped"] += tokens
+                continue
+            if report["memory_tokens_kept"] + tokens > self.memory_budget:
+                report["memory_tokens_dropped"] += tokens
+                continue
+            kept_shingles.append(shingles)
+            kept_lines.append(f"{len(kept_lines) + 1}: {text}")
+            report["memory_kept"] += 1
+            report["memory_tokens_kept"] += tokens
+        context = "\n".join(kept_lines) + ("\n" if kept_lines else "")
+        return context, report
+
+    def _fit_turn(self, group: list, budget: int) -> list:
+        """把一轮消息按顺序截断到预算内（用户消息在前，通常完整保留，助理回复截断）。"""
+        fitted = []
+        for m in group:
+            content = truncate_tokens(m.get("content") or "", budget)
+            if not content:
+                break
+            fitted.append({**m, "content": content})
+            budget -= count_tokens(content)
+        return fitted
+
+    def trim_history(self, history: list) -> tuple[list, dict]:
+        """从最近往前成对保留历史消息，返回 (保留的消息, 报告)。"""
+        kept: list = []
+        used = dropped = 0
+        i = len(history)
+        while i > 0:
+            # 一轮通常是 user + assistant 两条；落单的消息单独成轮
+            start = i - 2 if i >= 2 and history[i - 2].get("role") == "user" else i - 1
+            group = history[start:i]
+            i = start
+            tokens = sum(count_tokens(m.get("content") or "") for m in group)
+            if used + tokens <= self.history_budget:
+                kept[:0] = group
+                used += tokens
+            elif not kept:
+                # 最近一轮单独就超出预算：截断后保留，而不是整段历史都不带
+                fitted = self._fit_turn(group, self.history_budget)
+                fitted_tokens = sum(count_tokens(m["content"]) for m in fitted)
+                kept[:0] = fitted
+                used += fitted_tokens
+                dropped += tokens - fitted_tokens
+            else:
+                # 更早的超长轮次跳过，继续尝试装得下的更早轮次
+                dropped += tokens
+        return kept, {
+            "history_messages": len(history),
+            "history_kept": len(kept),
+            "history_tokens_kept": used,
+            "history_tokens_dropped": dropped,
+        }
+
+    def assemble(self, memory_items: list, history: list) -> AssembledContext:
+        memory_context, report = self.assemble_memory(memory_items)
+        trimmed, history_report = self.trim_history(history)
+        report.update(history_report)
+        return AssembledContext(memory_context=memory_context, history=trimmed, report=report)
@@ -2,11 +2,24 @@ import os
 import sys
 import json
 import re
+import time
 from datetime import datetime
 
+from conflicts import (
+    COMMITMENT, PLAN, ConflictTracker, commitment_slot, find_conflicts, slots_from_plan, slots_from_text, weekday_of,
+)
+from context_builder import ContextAssembler
+from history_manager import HistoryManager
+from instrumentation import span, turn
+from local_index import LocalMemoryIndex
 from memos_client import MemOSClient
-from llm_client import get_openai_client, get_openai_model
-from prompts import SYSTEM_PROMPT_UNIFIED, build_unified_demo_prompt
+from memory_writer import MemoryWriteBehind
+from prefetch import MemoryPrefetcher
+from llm_client import get_openai_client, get_openai_model, stream_chat_completion
+from plan_store import PlanStore
+from plan_stream import PlanUpdateStreamParser, parse_plan_update
+from prompts import GOAL_TEXT, SYSTEM_PROMPT_UNIFIED, build_unified_demo_prompt
+from scheduler import ScheduleRepairer, commitments_from_plan, extract_commitments
 
 
 # ----------------------------
@@ -14,19 +27,9 @@ from prompts import SYSTEM_PROMPT_UNIFIED, build_unified_demo_prompt
 # ----------------------------
 
 def _parse_plan_update_json_from_content(content: str):
-    """从模型输出中提取 BEGIN_PLAN_UPDATE 到 END_PLAN_UPDATE 之间的 JSON"""
-    try:
-        tag_start = content.find('BEGIN_PLAN_UPDATE')
-        tag_end = content.find('END_PLAN_UPDATE')
-        if tag_start != -1 and tag_end != -1 and tag_end > tag_start:
-            block = content[tag_start + len('BEGIN_PLAN_UPDATE'):tag_end]
-            return json.loads(block.strip())
-        start = content.rfind('{')
-        end = content.rfind('}')
-        if start != -1 and end != -1 and end > start:
-            return json.loads(content[start:end + 1])
-    except Exception:
-        return None
+    """从模型输出中提取 BEGIN_PLAN_UPDATE 到 END_PLAN_UPDATE 之间的 JSON（失败返回 None）"""
+    plan, _, _ = parse_plan_update(content)
+    return plan
 
 
 def _extract_analysis_text(content: str) -> str:
@@ -35,68 +38,25 @@ def _extract_analysis_text(content: str) -> str:
     return content[:idx] if idx != -1 else content
 
 
-def _print_conflict_check(plan_text: str, plan_json: dict):
-    """检测时间冲突"""
-    def _to_minutes(hm: str) -> int:
-        try:
-            h, m = hm.split(":")
-            return int(h) * 60 + int(m)
-        except Exception:
-            return -1
-
-    def _parse_slots(text: str):
-        pattern = re.compile(r"(\d{2}:\d{2})\s*[-–—]\s*(\d{2}:\d{2}).*")
-        slots = []
-        for line in text.splitlines():
-            m = pattern.search(line)
-            if m:
-                start, end = m.groups()
-                slots.append({
-                    "start": _to_minutes(start),
-                    "end": _to_minutes(end),
-                    "title": line[m.end():].strip() or "未命名任务"
-                })
-        return slots
-
-    def _parse_commitments(pj: dict):
-        out = []
-        for cm in pj.get("commitments", []):
-            tr = cm.get("time_range", "")
-            if "T" in tr:
-                try:
-                    _, hm = tr.split("T", 1)
-                    start, end = hm.split("-")
-                    out.append({
-                        "start": _to_minutes(start),
-                        "end": _to_minutes(end),
-                        "title": cm.get("title") or "固定安排"
-                    })
-                except Exception:
-                    pass
-        return out
-
-    plan_slots = _parse_slots(plan_text)
-    commitments = _parse_commitments(plan_json)
-    print("🧪 校验：时间冲突检测")
-    if not plan_slots or not commitments:
-        print("ℹ️ 无完整时段信息，跳过检测。")
-        return
-
-    def overlaps(a, b):
-        return a["start"] < b["end"] and b["start"] < a["end"]
-
-    conflicts = []
-    for s in plan_slots:
-        for c in commitments:
-            if overlaps(s, c):
-                conflicts.append((s, c))
+def _print_conflict_check(plan_text: str, plan_json: dict, verbose: bool = True, user_id: str = ""):
+    """检测计划时段与固定安排的时间冲突，打印结果并返回 `conflicts.Conflict` 列表。"""
+    log = print if verbose else (lambda *a, **k: None)
+
+    slots = slots_from_plan(plan_json, plan_text=plan_text, user_id=user_id)
+    log("🧪 校验：时间冲突检测")
+    if not any(s.kind == PLAN for s in slots) or not any(s.kind == COMMITMENT for s in slots):
+        log("ℹ️ 无完整时段信息，跳过检测。")
+        return []
 
+    conflicts = find_conflicts(slots, plan_vs_plan=False)
     if conflicts:
-        print(f"⚠️ 检测到 {len(conflicts)} 个冲突：")
-        for s, c in conflicts:
-            print(f"  ·『{s['title']}』与固定安排『{c['title']}』重叠。")
+        log(f"⚠️ 检测到 {len(conflicts)} 个冲突：")
+        for c in conflicts:
+            plan, commitment = (c.a, c.b) if c.a.kind == PLAN else (c.b, c.a)
+            log(f"  ·『{plan.title}』与固定安排『{commitment.title}』重叠。")
     else:
-        print("✅ 未发现时间重叠，一切安排合理。")
+        log("✅ 未发现时间重叠，一切安排合理。")
+    return conflicts
 
 
 def _extract_tasks_from_text(text: str):
@@ -125,11 +85,11 @@ def _extract_tasks_from_text(text: str):
 # 初始化用户先验记忆
 # ----------------------------
 
-def seed_unified_scenario(memos: MemOSClient):
+def seed_unified_scenario(memos: MemOSClient, verbose: bool = True):
     """初始化用户长期记忆（纯自然语言形式，系统自动抽取结构化信息）"""
     seed_msgs = [
         # 🎯 长期目标
-        {"role": "user", "content": "我的长期目标是每天学习2小时，准备政治和英语。"},
+        {"role": "user", "content": f"我的长期目标是{GOAL_TEXT}。"},
 
         # 💡 明确偏好
         {"role": "user", "content": "我更喜欢早上学习政治，周末集中学习英语。"},
@@ -150,149 +110,341 @@ def seed_unified_scenario(memos: MemOSClient):
         # 🧠 待办事项
         {"role": "user", "content": "我的待办任务包括：项目代码评审、准备客户汇报PPT、撰写本周工作周报。"},
     ]
-    print("🧠 初始用户记忆：")
-    for msg in seed_msgs:
-        print(msg)
+    if verbose:
+        print("🧠 初始用户记忆：")
+        for msg in seed_msgs:
+            print(msg)
     memos.add_conversation(seed_msgs)
-    print("✅ 已写入长期记忆（自然语言形式）：包含目标、偏好、会议与任务。\n")
+    if verbose:
+        print("✅ 已写入长期记忆（自然语言形式）：包含目标、偏好、会议与任务。\n")
 
 
 # ----------------------------
-# 主执行逻辑
+# 一周场景
 # ----------------------------
 
-def run():
-    memos = MemOSClient()
-    client = get_openai_client()
-    model = get_openai_model()
-
-    print("🚀 启动一周日程规划模拟")
-    print(f"👤 user_id: {memos.user_id}")
-    seed_unified_scenario(memos)
-
-    goal_text = "每天学习2小时，准备政治和英语"
-    history_messages, mem_ctx = [], ""
-
-    # 一周输入模拟（含具体上下文）
-    weekdays = [
-        (
-            "周一",
-            "📅 今天是周一。\n"
-            "状态一般，可能需要一点时间进入学习节奏。早上还是老习惯，晨练后做点轻学习就好。"
-            "政治那本笔记有些地方想复查，但不一定非今天。"
-            "这周打算重新整理一下英语听力素材，估计周三前能开始试试。"
-        ),
-        (
-            "周二",
-            "📅 今天是周二。\n"
-            "昨晚睡得晚，上午注意力可能分散一点。"
-            "汇报资料进度不错，不过细节部分还没打磨完，可能得提前留时间。"
-            "最近发现午饭后容易犯困，也许适合做点轻内容。"
-            "周四的那件事要记得，不想那天太赶。"
-        ),
-        (
-            "周三",
-            "📅 今天是周三。\n"
-            "早上健身完感觉状态比昨天好很多，应该能处理一些需要专注的内容。"
-            "昨天提到的汇报细节今天可以推进一部分。"
-            "另外，那份英语材料好像也可以开始动手听一听。"
-            "晚上别太紧凑，想留出一点时间看看新闻。"
-        ),
-        (
-            "周四",
-            "📅 今天是周四。\n"
-            "下午的事别忘了，可能要提前一点出门。"
-            "上午比较清闲，可以处理一些平时没空做的事情。"
-            "昨天的复盘笔记还没补完，有时间可以接着写。"
-            "听力那部分感觉还得多练几次，也许午饭后试试看。"
-        ),
-        (
-            "周五",
-            "📅 今天是周五。\n"
-            "今天比较关键，那份汇报终于到了。"
-            "早上尽量保持轻松的节奏，别太压自己。"
-            "如果这周有没收尾的事，别忘了留点时间整理。"
-            "周末可能会想多练英语，到时候再看看整体安排。"
-        )
-    ]
-
+# 一周输入模拟（含具体上下文）
+WEEKDAYS = [
+    (
+        "周一",
+        "📅 今天是周一。\n"
+        "状态一般，可能需要一点时间进入学习节奏。早上还是老习惯，晨练后做点轻学习就好。"
+        "政治那本笔记有些地方想复查，但不一定非今天。"
+        "这周打算重新整理一下英语听力素材，估计周三前能开始试试。"
+    ),
+    (
+        "周二",
+        "📅 今天是周二。\n"
+        "昨晚睡得晚，上午注意力可能分散一点。"
+        "汇报资料进度不错，不过细节部分还没打磨完，可能得提前留时间。"
+        "最近发现午饭后容易犯困，也许适合做点轻内容。"
+        "周四的那件事要记得，不想那天太赶。"
+    ),
+    (
+        "周三",
+        "📅 今天是周三。\n"
+        "早上健身完感觉状态比昨天好很多，应该能处理一些需要专注的内容。"
+        "昨天提到的汇报细节今天可以推进一部分。"
+        "另外，那份英语材料好像也可以开始动手听一听。"
+        "晚上别太紧凑，想留出一点时间看看新闻。"
+    ),
+    (
+        "周四",
+        "📅 今天是周四。\n"
+        "下午的事别忘了，可能要提前一点出门。"
+        "上午比较清闲，可以处理一些平时没空做的事情。"
+        "昨天的复盘笔记还没补完，有时间可以接着写。"
+        "听力那部分感觉还得多练几次，也许午饭后试试看。"
+    ),
+    (
+        "周五",
+        "📅 今天是周五。\n"
+        "今天比较关键，那份汇报终于到了。"
+        "早上尽量保持轻松的节奏，别太压自己。"
+        "如果这周有没收尾的事，别忘了留点时间整理。"
+        "周末可能会想多练英语，到时候再看看整体安排。"
+    )
+]
+
+
+def _format_task(t: dict) -> str:
+    time_range = t.get("time", "未指定时间")
+    activity = t.get("activity", t.get("title", "未命名任务"))
+    priority = t.get("priority", "中")
+    source = t.get("source", "")
+    return f"  ⏰ {time_range:<15} | {activity:<20} | 优先级：{priority:<2} | 来源：{source}"
+
+
+def _tasks_from_plan(plan_json) -> list:
+    """从计划 JSON 中取任务列表，兼容几种常见结构。"""
+    tasks = []
+    try:
+        if isinstance(plan_json, dict):
+            # 优先匹配标准格式 {"today": {"tasks": [...]}}
+            if "today" in plan_json and isinstance(plan_json["today"], dict):
+                tasks = plan_json["today"].get("tasks", [])
+            # 兼容 fallback 格式 {"tasks": [...]}
+            elif "tasks" in plan_json and isinstance(plan_json["tasks"], list):
+                tasks = plan_json["tasks"]
+            # 兼容异常格式 {"schedule": [...]}
+            elif "schedule" in plan_json and isinstance(plan_json["schedule"], list):
+                tasks = plan_json["schedule"]
+    except Exception as e:
+        print(f"⚠️ 解析 JSON 出错：{e}")
+    return tasks
 
 
+# ----------------------------
+# 主执行逻辑
+# ----------------------------
 
-    def run_day(day_name: str, user_instruction: str):
-        nonlocal mem_ctx
-        print(f"\n📅 {day_name} 日程规划中...")
-        mem_obj = memos.search_memory(user_instruction)
+class WeekPlanner:
+    """单个用户的逐日规划流程：检索记忆 → 组装提示词 → 调用模型 → 解析校验 → 写回记忆。
+
+    每个实例持有自己的历史对话，多用户并行时互不干扰；`verbose=False` 时不打印过程输出。
+    传入 `prefetcher` 时，模型回复一到就提交当日记忆写入并预取次日检索，与当日的解析、校验并行。
+    `stream=True` 时边生成边解析：任务一完整就打印，固定安排一出现就做冲突检测，不等整段回复结束。
+    模型给出的计划若与固定安排冲突或违反规则，由 `scheduler`（默认 `ScheduleRepairer`）在本地修复，不再重新请求模型。
+    传入 `store`（`PlanStore`）时，修复后的计划与任务写入本地计划库，供之后按日期、时段、活动查询。
+    """
+
+    def __init__(
+        self,
+        memos: MemOSClient,
+        client,
+        model: str,
+        writer: MemoryWriteBehind,
+        assembler: ContextAssembler | None = None,
+        goal_text: str = GOAL_TEXT,
+        verbose: bool = True,
+        prefetcher: MemoryPrefetcher | None = None,
+        stream: bool = False,
+        scheduler: ScheduleRepairer | None = None,
+        store: PlanStore | None = None,
+    ):
+        self.memos = memos
+        self.client = client
+        self.model = model
+        self.writer = writer
+        # 记忆与历史按 token 预算装入提示词，避免随天数线性增长
+        self.assembler = assembler or ContextAssembler()
+        self.goal_text = goal_text
+        self.verbose = verbose
+        self.prefetcher = prefetcher
+        self.stream = stream
+        self.scheduler = scheduler or ScheduleRepairer()
+        self.store = store
+        # 最近两天原样保留，更早的天数在后台压缩为计划摘要
+        self.history = HistoryManager(keep_last_turns=2)
+
+    def _log(self, *args, **kwargs):
+        if self.verbose:
+            print(*args, **kwargs)
+
+    def _search(self, query: str) -> dict:
+        if self.prefetcher is not None:
+            return self.prefetcher.get(self.memos, query)
+        return self.memos.search_memory(query)
+
+    def prefetch(self, query: str | None):
+        """提前发起某条指令的记忆检索（需配置 prefetcher）。"""
+        if query and self.prefetcher is not None:
+            self.prefetcher.prefetch(self.memos, query)
+
+    def run_day(self, day_name: str, user_instruction: str, next_instruction: str | None = None) -> dict:
+        """规划一天，返回该天的耗时、任务数与冲突数等结果；`next_instruction` 为次日指令，用于预取。"""
+        start = time.perf_counter()
+        with turn(day_name) as stages:
+            result = self._run_day(day_name, user_instruction, next_instruction)
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        result["stages"] = {k: round(v * 1000, 2) for k, v in stages.items()}
+        return result
+
+    def _run_day(self, day_name: str, user_instruction: str, next_instruction: str | None = None) -> dict:
+        self._log(f"\n📅 {day_name} 日程规划中...")
+        mem_obj = self._search(user_instruction)
         # mem_ctx = json.dumps(mem_obj, ensure_ascii=False)
-        print("👤 用户指令：", user_instruction)
-        mem_ctx = ""
-        count = 1
-        for detail in mem_obj["data"]["memory_detail_list"]:
-            if detail["memory_value"].strip():
-                mem_ctx += str(count) + ": " + detail["memory_value"].replace("\n", "")[:300] + "\n"
-                count += 1
-
-        print("🧠 记忆上下文：\n", mem_ctx)
-        user_prompt = build_unified_demo_prompt(goal_text, mem_ctx)
-
-        messages = [
-            {"role": "system", "content": SYSTEM_PROMPT_UNIFIED},
-            *history_messages,
-            {"role": "user", "content": user_prompt},
-            {"role": "user", "content": user_instruction},
-        ]
-        response = client.chat.completions.create(model=model, messages=messages)
-        content = response.choices[0].message.content
+        self._log("👤 用户指令：", user_instruction)
+        with span("prompt.build"):
+            ctx = self.assembler.assemble(mem_obj["data"]["memory_detail_list"], self.history.messages())
+            mem_ctx = ctx.memory_context
+            user_prompt = build_unified_demo_prompt(self.goal_text, mem_ctx)
+
+            messages = [
+                {"role": "system", "content": SYSTEM_PROMPT_UNIFIED},
+                *ctx.history,
+                {"role": "user", "content": user_prompt},
+                {"role": "user", "content": user_instruction},
+            ]
+
+        self._log("🧠 记忆上下文：\n", mem_ctx)
+        r = ctx.report
+        self._log(
+            f"🧮 上下文预算：记忆 {r['memory_kept']}/{r['memory_items']} 条"
+            f"（保留 {r['memory_tokens_kept']} tokens，丢弃 {r['memory_tokens_dropped']}，去重 {r['memory_duplicates']}）；"
+            f"历史 {r['history_kept']}/{r['history_messages']} 条"
+            f"（保留 {r['history_tokens_kept']} tokens，丢弃 {r['history_tokens_dropped']}）"
+        )
+        timing = {}
+        if self.stream:
+            parser, conflicts, timing = self._complete_streaming(messages)
+            content = parser.content
+        else:
+            with span("llm.completion"):
+                response = self.client.chat.completions.create(model=self.model, messages=messages)
+            content = response.choices[0].message.content
+            parser = PlanUpdateStreamParser()
+            parser.feed(content)
 
         # print("\n🤖 系统输出：")
         # print(content)
 
-        plan_json = _parse_plan_update_json_from_content(content) or {}
-        pj = plan_json or {}
-        analysis = _extract_analysis_text(content)
-
-        _print_conflict_check(analysis, pj)
-
+        # 先提交写入并预取次日检索：两者在后台进行，与下面的解析、冲突检测并行；
+        # 预取会等当日写入落盘后再检索，保证次日读到今天的对话
         write_messages = [
             {"role": "user", "content": user_instruction},
             {"role": "assistant", "content": content},
         ]
-        memos.add_conversation(write_messages)
-        history_messages.extend(write_messages)
-
-        print("\n📘 今日计划简表：")
-
-        tasks = []
-
-        # --- 新版 JSON 结构解析 ---
-        try:
-            if isinstance(plan_json, dict):
-                # 优先匹配标准格式 {"today": {"tasks": [...]}}
-                if "today" in plan_json and isinstance(plan_json["today"], dict):
-                    tasks = plan_json["today"].get("tasks", [])
-                # 兼容 fallback 格式 {"tasks": [...]}
-                elif "tasks" in plan_json and isinstance(plan_json["tasks"], list):
-                    tasks = plan_json["tasks"]
-                # 兼容异常格式 {"schedule": [...]}
-                elif "schedule" in plan_json and isinstance(plan_json["schedule"], list):
-                    tasks = plan_json["schedule"]
-        except Exception as e:
-            print(f"⚠️ 解析 JSON 出错：{e}")
-
-        # --- 打印输出 ---
-        if tasks:
+        with span("memos.add_submit"):
+            self.writer.submit(self.memos, write_messages)
+        self.prefetch(next_instruction)
+
+        with span("plan.parse"):
+            plan_json = parser.close() or {}
+            pj = plan_json or {}
+            analysis = parser.analysis or ""
+        if parser.error:
+            self._log(f"⚠️ 计划解析：{parser.error}")
+
+        if not self.stream:
+            with span("plan.conflict_check"):
+                conflicts = _print_conflict_check(analysis, pj, verbose=self.verbose, user_id=self.memos.user_id)
+
+        # 本地修复：固定安排取自检索到的记忆与计划 JSON，冲突任务挪到最近的可行时段
+        with span("plan.repair"):
+            data = mem_obj.get("data") or {}
+            commitments = extract_commitments(
+                (data.get("memory_detail_list") or []) + (data.get("fact_detail_list") or [])
+            ) + commitments_from_plan(pj)
+            repair = self.scheduler.repair(_tasks_from_plan(plan_json), commitments, weekday_of(day_name))
+        if repair.changed:
+            self._log("\n🛠️ 本地修复（无需重新请求模型）：")
+            for m in repair.moves:
+                self._log(f"  · 『{m['activity']}』{m['from']} → {m['to']}（{m['reason']}）")
+            for u in repair.unplaced:
+                self._log(f"  · 『{u['activity']}』找不到可行时段（{u['reason']}），已移出今日计划")
+            if isinstance(pj.get("today"), dict):
+                pj["today"]["tasks"] = repair.tasks
+            else:
+                pj["tasks"] = repair.tasks
+
+        self.history.add_turn(user_instruction, content, plan_json)
+
+        plan_id = None
+        if self.store is not None and plan_json:
+            with span("plan.store"):
+                plan_id = self.store.save_plan(self.memos.user_id, day_name, pj, analysis=analysis)
+
+        tasks = _tasks_from_plan(plan_json)
+
+        # --- 打印输出（流式模式下任务已在生成过程中逐条打印，修复后再打印一次） ---
+        if not self.stream or repair.changed:
+            self._log("\n📘 今日计划简表：")
             for t in tasks:
-                time = t.get("time", "未指定时间")
-                activity = t.get("activity", t.get("title", "未命名任务"))
-                priority = t.get("priority", "中")
-                source = t.get("source", "")
-                print(f"  ⏰ {time:<15} | {activity:<20} | 优先级：{priority:<2} | 来源：{source}")
-        else:
-            print("⚠️ 未检测到任务时间安排，请检查模型输出。")
+                self._log(_format_task(t))
+        if not tasks:
+            self._log("⚠️ 未检测到任务时间安排，请检查模型输出。")
+
+        return {
+            **timing,
+            "day": day_name,
+            "parsed": bool(plan_json),
+            "tasks": len(tasks),
+            "conflicts": len(conflicts),
+            "repaired": len(repair.moves),
+            "unplaced": len(repair.unplaced),
+            "plan_id": plan_id,
+            "prompt_tokens_kept": r["memory_tokens_kept"] + r["history_tokens_kept"],
+            # 按星期落到时间轴上的计划时段，供多天、多用户批量校验
+            "slots": [s for s in slots_from_plan(pj, user_id=self.memos.user_id, day=day_name) if s.kind == PLAN],
+        }
+
+    def _complete_streaming(self, messages: list):
+        """流式调用模型并增量解析，返回 (解析器, 冲突列表, 首 token / 首个任务耗时)。"""
+        parser = PlanUpdateStreamParser()
+        # 计划时段取自分析文本、固定安排取自 JSON，与非流式的冲突检测口径一致
+        tracker = ConflictTracker(plan_vs_plan=False)
+        user_id = self.memos.user_id
+        timing = {}
+        start = time.perf_counter()
+        with span("llm.completion"):
+            for token in stream_chat_completion(self.client, self.model, messages):
+                if "ttft_ms" not in timing:
+                    timing["ttft_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                for kind, item in parser.feed(token):
+                    if kind == "analysis":
+                        self._log("🧪 校验：时间冲突检测（边生成边检查）")
+                        tracker.extend(slots_from_text(item, user_id=user_id))
+                        self._log("\n📘 今日计划简表：")
+                    elif kind == "task":
+                        if "first_task_ms" not in timing:
+                            timing["first_task_ms"] = round((time.perf_counter() - start) * 1000, 2)
+                        self._log(_format_task(item))
+                    elif kind == "commitment":
+                        slot = commitment_slot(item, user_id=user_id, use_date=False)
+                        for c in tracker.add(slot) if slot else []:
+                            plan, commitment = (c.a, c.b) if c.a.kind == PLAN else (c.b, c.a)
+                            self._log(f"  ⚠️ 冲突：『{plan.title}』与固定安排『{commitment.title}』重叠。")
+        if not tracker.conflicts:
+            self._log("✅ 未发现时间重叠，一切安排合理。")
+        return parser, tracker.conflicts, timing
+
+    def run_week(self, weekdays: list = WEEKDAYS) -> list:
+        """按顺序规划一周，返回每天的结果列表。"""
+        if weekdays:
+            self.prefetch(weekdays[0][1])
+        results = []
+        for i, (day, instruction) in enumerate(weekdays):
+            next_instruction = weekdays[i + 1][1] if i + 1 < len(weekdays) else None
+            results.append(self.run_day(day, instruction, next_instruction))
+        return results
+
+    def close(self):
+        self.history.close()
+
 
+def run():
+    # MEMOS_LOCAL_INDEX=1 时有把握的检索由本地索引直接作答
+    memos = MemOSClient(local_index=LocalMemoryIndex.from_env())
+    client = get_openai_client()
+    model = get_openai_model()
+    # 每日对话的记忆写入交给后台批量完成，不占用当日规划的耗时
+    writer = MemoryWriteBehind()
+    # 次日的记忆检索在当日后处理期间提前发起
+    prefetcher = MemoryPrefetcher(writer)
+
+    print("🚀 启动一周日程规划模拟")
+    print(f"👤 user_id: {memos.user_id}")
+    seed_unified_scenario(memos)
+
+    # DEMO_STREAM=1 时边生成边解析计划
+    stream = os.getenv("DEMO_STREAM", "").strip().lower() in ("1", "true", "yes", "on")
+    # PLAN_STORE=1 时每天的计划写入本地计划库
+    store = PlanStore.from_env()
+    planner = WeekPlanner(memos, client, model, writer, prefetcher=prefetcher, stream=stream, store=store)
     # 循环一周
-    for day, instruction in weekdays:
-        run_day(day, instruction)
+    try:
+        planner.run_week()
+    finally:
+        planner.close()
+        prefetcher.close()
+        writer.close()
+        print(f"\n🗂️ 记忆写入统计：{writer.stats()}")
+        if memos.local_index is not None:
+            print(f"🔎 本地记忆索引：{memos.local_index.stats()}")
+        if store is not None:
+            print(f"📒 本地计划库：{store.stats()}（{store.path}）")
+            store.close()
 
 
 def main():
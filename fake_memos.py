@@ -0,0 +1,230 @@
+"""
+fake_memos.py
+
+通俗说明：
+- 本地进程内的 MemOS 替身，实现 `/add/message` 与 `/search/memory`，离线即可复现性能实验。
+- 返回结构与 demo.py、`main._summarize_memory` 读取的一致：
+  `data.memory_detail_list`、`data.preference_detail_list`、`data.fact_detail_list`。
+- 数据按 user_id 存放在内存中；检索使用简单的词法打分（中文单字/二字 + 英文单词的重叠度）。
+- 可注入延迟与错误率，且随机数带种子，便于对缓存、批量写入、并发等优化做确定性对比。
+
+运行：
+- python fake_memos.py --port 8001 --latency-ms 50 --error-rate 0.01
+- 或 uvicorn fake_memos:create_app --factory（参数取自 FAKE_MEMOS_* 环境变量）
+- 客户端侧将 `MEMOS_BASE_URL` 指向 http://127.0.0.1:8001 即可
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from text_features import lexical_features
+
+
+_TIME_RANGE_RE = re.compile(r"(\d{1,2})[:：](\d{2})\s*(?:到|至|-|–|—|~)\s*(\d{1,2})[:：](\d{2})")
+_EXPLICIT_PREF_RE = re.compile(r"喜欢|偏好|希望|想要|prefer")
+_IMPLICIT_PREF_RE = re.compile(r"习惯|效率|通常|一般|容易|适合")
+
+
+class FakeMemOSStore:
+    """按 user_id 分区的内存记忆库，线程安全。"""
+
+    def __init__(self, top_k: int = 10):
+        self.top_k = top_k
+        self._lock = threading.Lock()
+        self._users: dict[str, dict[str, list]] = {}
+
+    def _user(self, user_id: str) -> dict[str, list]:
+        return self._users.setdefault(user_id, {"memories": [], "preferences": [], "facts": []})
+
+    def add(self, user_id: str, messages: list, conversation_id: str | None = None) -> int:
+        """写入消息：每条消息成为一条记忆，并按规则抽取偏好与带时段的事实。"""
+        now = time.strftime("%Y-%m-%d %H:%M:%S")
+        added = 0
+        with self._lock:
+            user = self._user(user_id)
+            for msg in messages or []:
+                content = (msg.get("content") or "").strip()
+                if not content:
+                    continue
+                feats = Counter(lexical_features(content))
+                user["memories"].append({
+                    "id": uuid.uuid4().hex,
+                    "memory_key": content[:20],
+                    "memory_value": content,
+                    "memory_type": "UserMemory" if msg.get("role") == "user" else "LongTermMemory",
+                    "conversation_id": conversation_id,
+                    "create_time": now,
+                    "_features": feats,
+                })
+                added += 1
+                if msg.get("role") != "user":
+                    continue
+                if _EXPLICIT_PREF_RE.search(content) or _IMPLICIT_PREF_RE.search(content):
+                    explicit = bool(_EXPLICIT_PREF_RE.search(content))
+                    user["preferences"].append({
+                        "id": uuid.uuid4().hex,
+                        "preference_type": "explicit_preference" if explicit else "implicit_preference",
+                        "preference": content,
+                        "reasoning": "用户直接表述" if explicit else "根据用户描述推断",
+                        "create_time": now,
+                        "_features": feats,
+                    })
+                m = _TIME_RANGE_RE.search(content)
+                if m:
+                    sh, sm, eh, em = m.groups()
+                    user["facts"].append({
+                        "id": uuid.uuid4().hex,
+                        "title": content,
+                        "time_range": f"{int(sh):02d}:{sm}-{int(eh):02d}:{em}",
+                        "tags": ["固定安排"],
+                        "create_time": now,
+                        "_features": feats,
+                    })
+        return added
+
+    def search(self, user_id: str, query: str) -> dict:
+        """按词法重叠度为三类记忆分别打分排序，返回 MemOS 同构的 data 字段。"""
+        q = Counter(lexical_features(query))
+        with self._lock:
+            user = self._users.get(user_id)
+            if not user:
+                return {"memory_detail_list": [], "preference_detail_list": [], "fact_detail_list": []}
+            doc_freq = Counter()
+            for item in user["memories"]:
+                doc_freq.update(item["_features"].keys())
+            n_docs = len(user["memories"]) or 1
+
+            def rank(items: list) -> list:
+                scored = []
+                for order, item in enumerate(items):
+                    feats = item["_features"]
+                    score = sum(
+                        min(cnt, feats[f]) * math.log(1 + n_docs / (1 + doc_freq[f]))
+                        for f, cnt in q.items() if f in feats
+                    )
+                    if score > 0:
+                        # 同分时越新的越靠前
+                        scored.append((score, order, item))
+                scored.sort(key=lambda s: (s[0], s[1]), reverse=True)
+                top = scored[:self.top_k]
+                best = top[0][0] if top else 1.0
+                out = []
+                for score, _, item in top:
+                    public = {k: v for k, v in item.items() if not k.startswith("_")}
+                    public["relativity"] = round(score / best, 4)
+                    out.append(public)
+                return out
+
+            return {
+                "memory_detail_list": rank(user["memories"]),
+                "preference_detail_list": rank(user["preferences"]),
+                "fact_detail_list": rank(user["facts"]),
+            }
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "users": len(self._users),
+                "memories": sum(len(u["memories"]) for u in self._users.values()),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._users.clear()
+
+
+def create_app(
+    latency_ms: float | None = None,
+    jitter_ms: float | None = None,
+    error_rate: float | None = None,
+    seed: int | None = None,
+    top_k: int | None = None,
+) -> FastAPI:
+    """创建假 MemOS 应用；未传入的参数读取 `FAKE_MEMOS_LATENCY_MS` 等环境变量。"""
+    latency_ms = float(os.getenv("FAKE_MEMOS_LATENCY_MS", "0")) if latency_ms is None else latency_ms
+    jitter_ms = float(os.getenv("FAKE_MEMOS_JITTER_MS", "0")) if jitter_ms is None else jitter_ms
+    error_rate = float(os.getenv("FAKE_MEMOS_ERROR_RATE", "0")) if error_rate is None else error_rate
+    seed = int(os.getenv("FAKE_MEMOS_SEED", "42")) if seed is None else seed
+    top_k = int(os.getenv("FAKE_MEMOS_TOP_K", "10")) if top_k is None else top_k
+
+    app = FastAPI(title="Fake MemOS", version="0.1.0")
+    store = FakeMemOSStore(top_k=top_k)
+    rng = random.Random(seed)
+    counters = {"add": 0, "search": 0, "injected_errors": 0}
+    app.state.store = store
+
+    async def _simulate():
+        """注入延迟与错误；返回非 None 时即为需要直接返回的错误响应。"""
+        delay = latency_ms + (rng.uniform(0, jitter_ms) if jitter_ms else 0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if error_rate and rng.random() < error_rate:
+            counters["injected_errors"] += 1
+            return JSONResponse({"code": 503, "message": "injected error"}, status_code=503)
+        return None
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.post("/add/message")
+    async def add_message(request: Request):
+        body = await request.json()
+        error = await _simulate()
+        if error is not None:
+            return error
+        counters["add"] += 1
+        added = store.add(body.get("user_id", ""), body.get("messages", []), body.get("conversation_id"))
+        return {"code": 0, "message": "ok", "data": {"success": True, "added": added}}
+
+    @app.post("/search/memory")
+    async def search_memory(request: Request):
+        body = await request.json()
+        error = await _simulate()
+        if error is not None:
+            return error
+        counters["search"] += 1
+        data = store.search(body.get("user_id", ""), body.get("query", ""))
+        return {"code": 0, "message": "ok", "data": data}
+
+    @app.get("/stats")
+    async def stats():
+        return {**counters, **store.stats()}
+
+    @app.post("/reset")
+    async def reset():
+        store.reset()
+        return {"status": "ok"}
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="本地假 MemOS 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+    app = create_app(args.latency_ms, args.jitter_ms, args.error_rate, args.seed, args.top_k)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+history_manager.py
+
+通俗说明：
+- 长会话的滚动历史：最近 N 轮对话原样保留，更早的轮次替换为简短摘要。
+- 规划类回复优先用已解析出的计划 JSON 生成摘要（时间段 + 活动），不再携带数 KB 的原始输出。
+- 摘要在后台线程里逐轮增量生成，`messages()` 从不等待：尚未摘要完的轮次暂时按原文返回。
+- 摘要函数可替换（例如改用小模型总结），签名为 `summarizer(user, assistant, plan_json) -> str`。
+"""
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _plan_tasks(plan_json) -> list:
+    if not isinstance(plan_json, dict):
+        return []
+    today = plan_json.get("today")
+    if isinstance(today, dict) and isinstance(today.get("tasks"), list):
+        return today["tasks"]
+    for key in ("tasks", "schedule"):
+        if isinstance(plan_json.get(key), list):
+            return plan_json[key]
+    return []
+
+
+def summarize_turn(user: str, assistant: str, plan_json=None, max_chars: int = 240) -> str:
+    """默认摘要：用户诉求的开头 + 计划任务列表；没有计划时截取回复的分析部分。"""
+    ask = " ".join((user or "").split())[:60]
+    tasks = _plan_tasks(plan_json)
+    if tasks:
+        items = []
+        for t in tasks:
+            if isinstance(t, dict):
+                items.append(f"{t.get('time', '')} {t.get('activity') or t.get('title') or ''}".strip())
+        summary = "；".join(items)
+        if isinstance(plan_json.get("today"), dict) and plan_json["today"].get("summary"):
+            summary = f"{plan_json['today']['summary']} 安排：{summary}"
+    else:
+        text = assistant or ""
+        idx = text.find("BEGIN_PLAN_UPDATE")
+        summary = " ".join((text[:idx] if idx != -1 else text).split())
+    if len(summary) > max_chars:
+        summary = summary[:max_chars] + "…"
+    return f"用户：{ask}｜回复要点：{summary}"
+
+
+class HistoryManager:
+    """保留最近 `keep_last_turns` 轮原文，其余轮次在后台压缩为摘要。"""
+
+    def __init__(self, keep_last_turns: int = 2, summarizer=None):
+        self.keep_last_turns = max(0, keep_last_turns)
+        self.summarizer = summarizer or summarize_turn
+        self._lock = threading.Lock()
+        # 每轮：{"user", "assistant", "plan_json", "summary", "scheduled"}，summary 为 None 表示尚未摘要
+        self._turns: list[dict] = []
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="history-summarizer")
+
+    def add_turn(self, user: str, assistant: str, plan_json=None):
+        """追加一轮对话；超出保留窗口的旧轮次提交到后台摘要。"""
+        with self._lock:
+            self._turns.append({"user": user, "assistant": assistant, "plan_json": plan_json, "summary": None})
+            pending = [t for t in self._turns[:len(self._turns) - self.keep_last_turns]
+                       if t["summary"] is None and not t.get("scheduled")]
+            for t in pending:
+                t["scheduled"] = True
+        for t in pending:
+            self._executor.submit(self._summarize, t)
+
+    def _summarize(self, t: dict):
+        try:
+            summary = self.summarizer(t["user"], t["assistant"], t["plan_json"])
+        except Exception as e:
+            summary = f"用户：{(t['user'] or '')[:60]}｜（摘要失败：{e}）"
+        with self._lock:
+            t["summary"] = summary
+
+    def messages(self) -> list:
+        """返回可直接放入请求的历史消息：一条摘要消息 + 未压缩轮次的原文。"""
+        with self._lock:
+            turns = list(self._turns)
+            cutoff = len(turns) - self.keep_last_turns
+            summaries, verbatim = [], []
+            for i, t in enumerate(turns):
+                if i < cutoff and t["summary"] is not None:
+                    summaries.append(t["summary"])
+                else:
+                    verbatim.append(t)
+        out = []
+        if summaries:
+            lines = "\n".join(f"- 第{i + 1}轮 {s}" for i, s in enumerate(summaries))
+            out.append({"role": "system", "content": f"此前对话摘要（按时间顺序）：\n{lines}"})
+        for t in verbatim:
+            out.append({"role": "user", "content": t["user"]})
+            out.append({"role": "assistant", "content": t["assistant"]})
+        return out
+
+    def wait_idle(self, timeout: float | None = None):
+        """等待已提交的摘要任务完成（用于测试或退出前）。"""
+        self._executor.submit(lambda: None).result(timeout)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def __len__(self):
+        return len(self._turns)
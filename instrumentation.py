@@ -0,0 +1,191 @@
+"""
+instrumentation.py
+
+通俗说明：
+- 热路径耗时埋点：`with span("llm.completion"):` 记录一个阶段的耗时，按阶段名汇总成直方图。
+- 默认关闭，关闭时 `span()` 直接返回共享的空上下文，几乎没有开销；
+  通过环境变量 `MEMLANG_METRICS=1` 或调用 `enable()` 打开。
+- `with turn("周一"):` 把一轮对话内的各阶段耗时归到一起，结束时可打印分阶段明细
+  （`MEMLANG_METRICS_LOG_TURNS=1` 或 `enable(log_turns=True)`）。
+- `set_gauge()` 记录瞬时状态（如熔断器状态），与计数器、直方图一起导出。
+- `render_prometheus()` 输出 Prometheus 文本格式，api_server 的 `/metrics` 直接返回它。
+"""
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+
+# 直方图分桶（秒），覆盖从本地解析到慢速模型调用的范围
+_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_NOOP = nullcontext()
+
+_enabled = False
+_log_turns = False
+_lock = threading.Lock()
+_histograms: dict[str, list] = {}  # stage -> [各桶计数..., +Inf 计数, 总和]
+_counters: dict[str, float] = {}
+_gauges: dict[str, float] = {}
+_current_turn: contextvars.ContextVar = contextvars.ContextVar("memlang_turn", default=None)
+
+
+def _env_flag(name: str) -> bool | None:
+    value = os.getenv(name)
+    if value is None or not value.strip():
+        return None
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def configure(default: bool = False):
+    """按环境变量初始化开关；未设置 `MEMLANG_METRICS` 时使用 `default`。"""
+    flag = _env_flag("MEMLANG_METRICS")
+    enable(default if flag is None else flag, log_turns=bool(_env_flag("MEMLANG_METRICS_LOG_TURNS")))
+
+
+def enable(on: bool = True, log_turns: bool | None = None):
+    global _enabled, _log_turns
+    _enabled = on
+    if log_turns is not None:
+        _log_turns = log_turns
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def observe(stage: str, seconds: float):
+    """记录一次已测得的阶段耗时（秒）。"""
+    if not _enabled:
+        return
+    with _lock:
+        hist = _histograms.get(stage)
+        if hist is None:
+            hist = _histograms[stage] = [0] * (len(_BUCKETS) + 1) + [0.0]
+        for i, bound in enumerate(_BUCKETS):
+            if seconds <= bound:
+                hist[i] += 1
+                break
+        else:
+            hist[len(_BUCKETS)] += 1
+        hist[-1] += seconds
+    current = _current_turn.get()
+    if current is not None:
+        current[stage] = current.get(stage, 0.0) + seconds
+
+
+def incr(name: str, value: float = 1):
+    """累加一个事件计数器。"""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name: str, value: float):
+    """设置一个瞬时值（覆盖旧值）。"""
+    if not _enabled:
+        return
+    with _lock:
+        _gauges[name] = value
+
+
+class _Span:
+    __slots__ = ("stage", "start")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def span(stage: str):
+    """阶段计时上下文；关闭埋点时返回空上下文。"""
+    if not _enabled:
+        return _NOOP
+    return _Span(stage)
+
+
+@contextmanager
+def turn(label: str):
+    """汇总一轮内各阶段耗时，产出 {阶段: 秒} 字典；开启日志时结束后打印明细。"""
+    if not _enabled:
+        yield {}
+        return
+    stages: dict[str, float] = {}
+    token = _current_turn.set(stages)
+    start = time.perf_counter()
+    try:
+        yield stages
+    finally:
+        _current_turn.reset(token)
+        total = time.perf_counter() - start
+        observe("turn.total", total)
+        if _log_turns:
+            parts = " | ".join(f"{k}={v * 1000:.0f}ms" for k, v in stages.items())
+            print(f"⏱️ {label} 耗时 {total * 1000:.0f}ms：{parts}")
+
+
+def snapshot() -> dict:
+    """返回各阶段的次数、总耗时与分桶计数，便于测试或导出 JSON。"""
+    with _lock:
+        out = {}
+        for stage, hist in _histograms.items():
+            out[stage] = {
+                "count": sum(hist[:-1]),
+                "sum_seconds": hist[-1],
+                "buckets": dict(zip([*map(str, _BUCKETS), "+Inf"], hist[:-1])),
+            }
+        return {"stages": out, "counters": dict(_counters), "gauges": dict(_gauges)}
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+        _gauges.clear()
+
+
+def _fmt(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+def render_prometheus() -> str:
+    """以 Prometheus 文本格式导出直方图与计数器。"""
+    lines = [
+        "# HELP memlang_stage_duration_seconds Duration of hot-path stages.",
+        "# TYPE memlang_stage_duration_seconds histogram",
+    ]
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+    for stage in sorted(histograms):
+        hist = histograms[stage]
+        cumulative = 0
+        for bound, count in zip(_BUCKETS, hist):
+            cumulative += count
+            lines.append(f'memlang_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        cumulative += hist[len(_BUCKETS)]
+        lines.append(f'memlang_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {cumulative}')
+        lines.append(f'memlang_stage_duration_seconds_sum{{stage="{stage}"}} {_fmt(hist[-1])}')
+        lines.append(f'memlang_stage_duration_seconds_count{{stage="{stage}"}} {cumulative}')
+    lines.append("# HELP memlang_events_total Event counters.")
+    lines.append("# TYPE memlang_events_total counter")
+    for name in sorted(counters):
+        lines.append(f'memlang_events_total{{event="{name}"}} {_fmt(counters[name])}')
+    lines.append("# HELP memlang_gauge Point-in-time values.")
+    lines.append("# TYPE memlang_gauge gauge")
+    for name in sorted(gauges):
+        lines.append(f'memlang_gauge{{name="{name}"}} {_fmt(gauges[name])}')
+    return "\n".join(lines) + "\n"
+
+
+configure()
@@ -4,54 +4,118 @@ langgraph_agent.py
 通俗说明：
 - 使用 LangGraph 构建一个最小化的“问答代理”，支持交互与非交互两种模式。
 - 交互模式：读取用户输入 → 调用大模型生成回复 → 打印并返回状态。
+- 交互模式可传入 `on_query(query)` 回调：输入一确定就被调用（例如预取记忆检索），与模型生成并行。
 - 非交互模式：读取 state['query'] → 调用大模型生成回复（包含认证错误兜底）。
+- 两种模式都支持 `stream=True`：逐 token 打印，并通过 LangGraph 的 custom 流推送
+  `{"token": ...}`（`agent.stream(state, stream_mode="custom")` 即可边生成边消费）；
+  状态中记录首 token 耗时 `ttft_ms` 与总耗时 `latency_ms`。
+- 传入 `cache=CompletionCache(...)` 后，相同的问题直接返回缓存回复（状态中 `cached=True`）；
+  单次调用可在状态里设 `cache=False` 绕过缓存。走缓存的调用以 `temperature=0` 请求模型，缓存的回复才可复用。
+- 图按 (类型, 是否流式) 只编译一次并缓存在进程内（`get_agent`）；`on_query` 与 `cache` 通过
+  LangGraph 的 `configurable` 绑定到编译好的图上，重复调用 `build_agent*` 不再重新编译。
+- langgraph / openai 在首次构建或调用代理时才导入，仅导入本模块（如 CLI 启动、api_server 进程启动）不再承担其开销。
 """
 
-from dotenv import load_dotenv
-import os
-import json
+import threading
+import time
 from typing import TypedDict
-from langgraph.graph import StateGraph
-import openai
+
+from completion_cache import DETERMINISTIC, CompletionCache
+from llm_client import get_openai_client, get_openai_model, stream_chat_completion
+
+INTERACTIVE = "interactive"
+NONINTERACTIVE = "noninteractive"
 
 # 定义状态模式（LangGraph 新版需要显式 state_schema）
 class AgentState(TypedDict, total=False):
     """代理的最小状态定义：保存用户输入与模型回复。"""
     query: str
     response: str
+    ttft_ms: int
+    latency_ms: int
+    cache: bool      # 输入：False 时本次绕过补全缓存
+    cached: bool     # 输出：本次回复是否来自缓存
+
+
+def _client_and_model():
+    """从 llm_client 的共享注册表取客户端，与 api_server / demo 复用同一连接池。"""
+    model = get_openai_model()
+    return get_openai_client(model=model), model
+
 
-load_dotenv()  # 加载 .env 文件
+_SYSTEM_PROMPT = "你是一名可靠的日程与任务助理，回答应简洁、结构化并可执行。"
 
-# 读取并校验 OPENAI_API_KEY
-_api_key = os.getenv("OPENAI_API_KEY")
-_api_base = os.getenv("OPENAI_API_BASE") 
-_model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
-# 与参考实现一致：使用 openai.Client，并支持 base_url
-client = openai.Client(api_key=_api_key, base_url=_api_base)
+def _generate(state, stream: bool, cache: CompletionCache | None = None):
+    """调用大模型生成回复并写入状态；流式模式下边生成边打印、推送 token。"""
+    from langgraph.config import get_stream_writer
+
+    client, model = _client_and_model()
+    messages = [
+        {"role": "system", "content": _SYSTEM_PROMPT},
+        {"role": "user", "content": state.get("query", "")}
+    ]
+    start = time.perf_counter()
+    use_cache = cache is not None and state.get("cache", True) is not False
+    # 只有确定性采样的回复才能缓存复用；不走缓存时保持模型默认采样
+    sampling = dict(DETERMINISTIC) if use_cache else {}
+    hit = cache.get(model, messages, sampling) if use_cache else None
+    state["cached"] = hit is not None
+    if hit is not None:
+        state["response"] = hit["content"]
+        state["latency_ms"] = int((time.perf_counter() - start) * 1000)
+        if stream:
+            get_stream_writer()({"token": hit["content"]})
+        print("🤖 助理（缓存）：", state["response"])
+        return state
+
+    if not stream:
+        response = client.chat.completions.create(model=model, messages=messages, **sampling)
+        state["response"] = response.choices[0].message.content
+        state["latency_ms"] = int((time.perf_counter() - start) * 1000)
+        if use_cache:
+            cache.put(model, messages, {"content": state["response"]}, sampling)
+        print("🤖 助理：", state["response"])
+        return state
+
+    writer = get_stream_writer()
+    parts = []
+    print("🤖 助理： ", end="", flush=True)
+    for token in stream_chat_completion(client, model, messages, **sampling):
+        if not parts:
+            state["ttft_ms"] = int((time.perf_counter() - start) * 1000)
+        parts.append(token)
+        writer({"token": token})
+        print(token, end="", flush=True)
+    print()
+    state["response"] = "".join(parts)
+    state["latency_ms"] = int((time.perf_counter() - start) * 1000)
+    if use_cache:
+        cache.put(model, messages, {"content": state["response"]}, sampling)
+    return state
+
+
+def _configurable(config) -> dict:
+    return (config or {}).get("configurable") or {}
+
+
+def _compile_interactive(stream: bool):
+    from langgraph.graph import StateGraph
 
-def build_agent():
-    """创建交互式 LangGraph 流程：循环读取输入并生成回复。"""
     graph = StateGraph(AgentState)
 
-    def ask_user(state):
+    def ask_user(state, config):
         """读取用户输入，写入到状态的 query 字段。"""
         user_query = input("👤 你：")
         state["query"] = user_query
+        on_query = _configurable(config).get("on_query")
+        if on_query is not None and user_query:
+            on_query(user_query)
         return state
 
-    def generate_response(state):
+    def generate_response(state, config):
         """调用大模型生成回复，保存到状态并打印。"""
-        response = client.chat.completions.create(
-            model=_model,
-            messages=[
-                {"role": "system", "content": "你是一名可靠的日程与任务助理，回答应简洁、结构化并可执行。"},
-                {"role": "user", "content": state.get("query", "")}
-            ]
-        )
-        state["response"] = response.choices[0].message.content
-        print("🤖 助理：", state["response"])
-        return state
+        return _generate(state, stream, _configurable(config).get("cache"))
 
     graph.add_node("ask_user", ask_user)
     graph.add_node("generate_response", generate_response)
@@ -61,21 +125,16 @@ def build_agent():
     return graph.compile()
 
 
-def build_agent_noninteractive():
-    """创建非交互 LangGraph 流程：从 state['query'] 直接生成回复。"""
+def _compile_noninteractive(stream: bool):
+    import openai
+    from langgraph.graph import StateGraph
+
     graph = StateGraph(AgentState)
 
-    def generate_response(state):
+    def generate_response(state, config):
         """调用大模型生成回复；认证失败时给出中文错误提示。"""
         try:
-            response = client.chat.completions.create(
-                model=_model,
-                messages=[
-                    {"role": "system", "content": "你是一名可靠的日程与任务助理，回答应简洁、结构化并可执行。"},
-                    {"role": "user", "content": state.get("query", "")}
-                ]
-            )
-            state["response"] = response.choices[0].message.content
+            return _generate(state, stream, _configurable(config).get("cache"))
         except openai.AuthenticationError:
             state["response"] = (
                 "OpenAI API 认证失败：请检查 OPENAI_API_KEY 是否有效。"
@@ -87,3 +146,39 @@ def build_agent_noninteractive():
     graph.add_node("generate_response", generate_response)
     graph.set_entry_point("generate_response")
     return graph.compile()
+
+
+_COMPILERS = {INTERACTIVE: _compile_interactive, NONINTERACTIVE: _compile_noninteractive}
+_agents: dict[tuple, object] = {}
+_agents_lock = threading.Lock()
+
+
+def get_agent(kind: str = NONINTERACTIVE, stream: bool = False):
+    """返回进程内共享的已编译图：按 (kind, stream) 首次调用时编译，之后直接复用（线程安全）。"""
+    if kind not in _COMPILERS:
+        raise ValueError(f"未知的代理类型：{kind}")
+    key = (kind, bool(stream))
+    agent = _agents.get(key)
+    if agent is not None:
+        return agent
+    with _agents_lock:
+        agent = _agents.get(key)
+        if agent is None:
+            agent = _agents[key] = _COMPILERS[kind](bool(stream))
+    return agent
+
+
+def _bind(agent, **configurable):
+    """把调用方的回调与缓存绑定到共享图上（只复制配置，不重新编译）。"""
+    configurable = {k: v for k, v in configurable.items() if v is not None}
+    return agent.with_config(configurable=configurable) if configurable else agent
+
+
+def build_agent(stream: bool = False, on_query=None, cache: CompletionCache | None = None):
+    """创建交互式 LangGraph 流程：循环读取输入并生成回复；`on_query` 在读到输入后、生成前调用。"""
+    return _bind(get_agent(INTERACTIVE, stream), on_query=on_query, cache=cache)
+
+
+def build_agent_noninteractive(stream: bool = False, cache: CompletionCache | None = None):
+    """创建非交互 LangGraph 流程：从 state['query'] 直接生成回复。"""
+    return _bind(get_agent(NONINTERACTIVE, stream), cache=cache)
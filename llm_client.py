@@ -5,27 +5,165 @@ llm_client.py
 - 统一管理大模型客户端与模型名读取，避免各处重复配置。
 - 从 `.env` 读取 `OPENAI_API_KEY` 与可选的 `OPENAI_API_BASE`（自托管/代理场景）。
 - 模型名默认使用 `gpt-4o-mini`，也可通过环境变量 `OPENAI_MODEL` 覆盖。
+- 客户端按 (api_key, base_url, model) 在进程内只创建一次并复用，底层 HTTP 连接池随之复用；
+  连接池与超时可通过 `OPENAI_MAX_CONNECTIONS`、`OPENAI_MAX_KEEPALIVE`、`OPENAI_TIMEOUT` 调整。
+- 进程退出（如 FastAPI shutdown）时调用 `close_openai_clients()` / `aclose_openai_clients()` 释放连接。
+- openai / httpx / dotenv 在首次读取配置或创建客户端时才导入，导入本模块本身几乎没有开销。
 """
 
-from dotenv import load_dotenv
 import os
-import openai
+import threading
+from typing import TYPE_CHECKING
 
-load_dotenv()
+if TYPE_CHECKING:
+    import openai
 
-def get_openai_client() -> openai.Client:
-    """创建并返回 OpenAI 客户端。
+_lock = threading.Lock()
+_clients: dict[tuple, "openai.Client"] = {}
+_async_clients: dict[tuple, "openai.AsyncClient"] = {}
+_env_loaded = False
+
+
+def _load_env():
+    """首次使用时读取 `.env`（只读一次）。"""
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _env_loaded = True
+
+
+def _env_number(name: str, default, cast):
+    try:
+        return cast((os.getenv(name, str(default)) or str(default)).strip())
+    except ValueError:
+        return default
+
+
+def _client_config(api_key: str | None, base_url: str | None, model: str | None):
+    """补全配置并返回注册表的键。"""
+    _load_env()
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    base_url = base_url or os.getenv("OPENAI_API_BASE")
+    if not api_key:
+        raise RuntimeError("OPENAI_API_KEY 未设置，请在 .env 中配置后重试。")
+    return (api_key, base_url, model or get_openai_model())
+
+
+def _http_options() -> dict:
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=_env_number("OPENAI_MAX_CONNECTIONS", 100, int),
+        max_keepalive_connections=_env_number("OPENAI_MAX_KEEPALIVE", 20, int),
+    )
+    timeout = httpx.Timeout(_env_number("OPENAI_TIMEOUT", 60.0, float), connect=10.0)
+    return {"limits": limits, "timeout": timeout}
+
+
+def get_openai_client(
+    api_key: str | None = None,
+    base_url: str | None = None,
+    model: str | None = None,
+) -> "openai.Client":
+    """返回进程内共享的 OpenAI 客户端（首次调用时创建，线程安全）。
 
     - 若配置了 `OPENAI_API_BASE`，则通过 `base_url` 指向自托管或代理服务。
     - 缺少 `OPENAI_API_KEY` 时抛出明确的错误提示，便于快速定位问题。
     """
-    api_key = os.getenv("OPENAI_API_KEY")
-    api_base = os.getenv("OPENAI_API_BASE")
-    if not api_key:
-        raise RuntimeError("OPENAI_API_KEY 未设置，请在 .env 中配置后重试。")
-    return openai.Client(api_key=api_key, base_url=api_base)
+    key = _client_config(api_key, base_url, model)
+    client = _clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            import openai
+
+            options = _http_options()
+            client = openai.Client(
+                api_key=key[0],
+                base_url=key[1],
+                timeout=options["timeout"],
+                http_client=openai.DefaultHttpxClient(**options),
+            )
+            _clients[key] = client
+    return client
+
+
+def get_async_openai_client(
+    api_key: str | None = None,
+    base_url: str | None = None,
+    model: str | None = None,
+) -> "openai.AsyncClient":
+    """返回进程内共享的异步 OpenAI 客户端，配置读取方式与 `get_openai_client` 相同。"""
+    key = _client_config(api_key, base_url, model)
+    client = _async_clients.get(key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _async_clients.get(key)
+        if client is None:
+            import openai
+
+            options = _http_options()
+            client = openai.AsyncClient(
+                api_key=key[0],
+                base_url=key[1],
+                timeout=options["timeout"],
+                http_client=openai.DefaultAsyncHttpxClient(**options),
+            )
+            _async_clients[key] = client
+    return client
+
+
+def close_openai_clients():
+    """关闭并清空已创建的同步客户端。"""
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        client.close()
+
+
+async def aclose_openai_clients():
+    """关闭并清空全部客户端（异步客户端需在其所属事件循环中关闭）。"""
+    with _lock:
+        clients = list(_async_clients.values())
+        _async_clients.clear()
+    for client in clients:
+        await client.close()
+    close_openai_clients()
+
+
+def stream_chat_completion(client: "openai.Client", model: str, messages: list, **kwargs):
+    """以流式方式调用对话补全，逐段产出文本增量（跳过空增量）。"""
+    stream = client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+    try:
+        for chunk in stream:
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+    finally:
+        stream.close()
+
+
+async def astream_chat_completion(client: "openai.AsyncClient", model: str, messages: list, **kwargs):
+    """`stream_chat_completion` 的异步版本。"""
+    stream = await client.chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+    try:
+        async for chunk in stream:
+            if chunk.choices:
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    yield delta
+    finally:
+        await stream.close()
 
 
 def get_openai_model(default: str = "gpt-4o-mini") -> str:
     """读取模型名，支持通过环境变量覆盖默认值。"""
-    return os.getenv("OPENAI_MODEL", default)
\ No newline at end of file
+    _load_env()
+    return os.getenv("OPENAI_MODEL", default)
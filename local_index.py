@@ -0,0 +1,284 @@
+"""
+local_index.py
+
+通俗说明：
+- 本地记忆索引：作为 MemOS 检索前的一层"读穿透"。每个用户一份混合索引：
+  BM25 词法打分（中文单字/二字 + 英文单词，见 text_features.py）+ 哈希向量余弦相似度（NumPy 数组）。
+- 索引内容来自两处：经由客户端写入的对话中用户本人的消息（`add_conversation`；助理回复往往是几 KB 的
+  模型原文，不当作记忆条目），以及 MemOS 返回的检索结果。
+- 只在把握较大时本地作答：该用户最近（`max_staleness` 秒内）从 MemOS 同步过结果、本地文档数足够、
+  全部查询词（按 IDF 加权）被返回结果覆盖的比例与最高相似度都超过阈值；本地语料里从未出现过的词
+  IDF 最高、且一定覆盖不到，问到新内容时会回退到 MemOS，并把 MemOS 的结果并入索引（同时刷新同步时间）。
+- 经由客户端写入的用户消息会同步进入索引；其余内容（助理回复经 MemOS 抽取后的记忆、别处写入的内容）
+  最迟在同步窗口过期后的下一次检索中并入。
+- 本地作答的结果结构与 MemOS 一致（`data.memory_detail_list` / `preference_detail_list` / `fact_detail_list`），
+  顶层额外带 `source: "local_index"` 与 `confidence`。
+- `stats()` 给出本地命中率、本地检索耗时，以及按 MemOS 检索耗时滑动平均估算的节省时间。
+- 通过 `MemOSClient(local_index=...)` 等启用；`LocalMemoryIndex.from_env()` 在 `MEMOS_LOCAL_INDEX=1` 时创建，
+  阈值可用 `MEMOS_LOCAL_INDEX_MIN_COVERAGE` / `_MIN_SIMILARITY` / `_MAX_STALENESS`（秒）调整。
+"""
+
+import math
+import os
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from semantic_cache import HashingEmbedder
+from text_features import lexical_features
+
+# MemOS 结果中的三类列表 → 索引中的文档类型
+_KINDS = {"memory_detail_list": "memory", "preference_detail_list": "preference", "fact_detail_list": "fact"}
+_LISTS = {kind: key for key, kind in _KINDS.items()}
+_TEXT_FIELDS = {"memory": ("memory_value", "memory_key"), "preference": ("preference",), "fact": ("title",)}
+
+
+def _item_text(kind: str, item: dict) -> str:
+    for field in _TEXT_FIELDS[kind]:
+        if item.get(field):
+            return str(item[field])
+    return ""
+
+
+class _UserDocs:
+    """单个用户的混合索引：倒排表 + 词频 + 文档长度 + 向量矩阵。"""
+
+    def __init__(self, dim: int, capacity: int = 64):
+        self.items: list[tuple[str, dict]] = []   # (类型, 原始条目)
+        self.tfs: list[Counter] = []
+        self.lengths: list[int] = []
+        self.keys: dict[tuple, int] = {}          # 去重键 → 文档下标
+        self.postings: dict[str, list[int]] = {}
+        self.df: Counter = Counter()
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.synced_at: float | None = None        # 最近一次并入 MemOS 检索结果的时间（monotonic）
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def add(self, key: tuple, kind: str, item: dict, feats: list[str], vec: np.ndarray) -> bool:
+        if key in self.keys:
+            return False
+        idx = len(self.items)
+        if idx == len(self.vectors):
+            grown = np.zeros((len(self.vectors) * 2, self.vectors.shape[1]), dtype=np.float32)
+            grown[:idx] = self.vectors
+            self.vectors = grown
+        tf = Counter(feats)
+        self.items.append((kind, item))
+        self.tfs.append(tf)
+        self.lengths.append(len(feats))
+        self.total_length += len(feats)
+        self.keys[key] = idx
+        self.vectors[idx] = vec
+        for feat in tf:
+            self.postings.setdefault(feat, []).append(idx)
+            self.df[feat] += 1
+        return True
+
+    def compacted(self, keep: int) -> "_UserDocs":
+        """只保留最新的 `keep` 条文档，返回重建了倒排表的新索引。"""
+        out = _UserDocs(self.vectors.shape[1], max(64, keep))
+        out.synced_at = self.synced_at
+        by_index = {i: k for k, i in self.keys.items()}
+        for idx in range(max(0, len(self.items) - keep), len(self.items)):
+            kind, item = self.items[idx]
+            out.add(by_index[idx], kind, item, list(self.tfs[idx].elements()), self.vectors[idx])
+        return out
+
+
+class LocalMemoryIndex:
+    """按用户分区的本地混合检索索引（线程安全）。"""
+
+    def __init__(
+        self,
+        embedder=None,
+        alpha: float = 0.6,
+        top_k: int = 10,
+        min_coverage: float = 0.8,
+        min_similarity: float = 0.3,
+        min_docs: int = 3,
+        max_staleness: float = 600.0,
+        max_docs_per_user: int = 2000,
+        max_users: int = 10000,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.embedder = embedder or HashingEmbedder()
+        self.alpha = alpha
+        self.top_k = top_k
+        self.min_coverage = min_coverage
+        self.min_similarity = min_similarity
+        self.min_docs = min_docs
+        self.max_staleness = max_staleness
+        self.max_docs_per_user = max(1, max_docs_per_user)
+        self.max_users = max(1, max_users)
+        self.k1 = k1
+        self.b = b
+
+        self._lock = threading.Lock()
+        self._users: OrderedDict[str, _UserDocs] = OrderedDict()
+        self._stats = {"lookups": 0, "local_hits": 0, "low_confidence": 0, "cold": 0, "docs_added": 0, "remote_searches": 0}
+        self._local_seconds = 0.0
+        self._saved_seconds = 0.0
+        self._remote_ewma: float | None = None
+
+    @classmethod
+    def from_env(cls, prefix: str = "MEMOS_LOCAL_INDEX") -> "LocalMemoryIndex | None":
+        """按环境变量创建；`<prefix>` 未开启时返回 None。"""
+        if os.getenv(prefix, "").strip().lower() not in ("1", "true", "yes", "on"):
+            return None
+        return cls(
+            min_coverage=float(os.getenv(f"{prefix}_MIN_COVERAGE", "0.8")),
+            min_similarity=float(os.getenv(f"{prefix}_MIN_SIMILARITY", "0.3")),
+            max_staleness=float(os.getenv(f"{prefix}_MAX_STALENESS", "600")),
+        )
+
+    # ---------- 写入 ----------
+
+    def add_messages(self, user_id: str, messages: list) -> int:
+        """索引一批已写入 MemOS 的对话消息中用户本人的消息，返回新增文档数。"""
+        now = time.strftime("%Y-%m-%d %H:%M:%S")
+        docs = []
+        for msg in messages or []:
+            if not isinstance(msg, dict) or msg.get("role") != "user":
+                continue
+            content = (msg.get("content") or "").strip()
+            if content:
+                docs.append(("memory", {
+                    "id": f"local_{uuid.uuid4().hex}",
+                    "memory_key": content[:20],
+                    "memory_value": content,
+                    "memory_type": "UserMemory",
+                    "create_time": now,
+                }))
+        return self._add_docs(user_id, docs, synced=False)
+
+    def add_results(self, user_id: str, result: dict, latency_s: float | None = None) -> int:
+        """并入一次 MemOS 检索结果（顺带记录其耗时，用于估算本地命中节省的时间），返回新增文档数。"""
+        data = (result or {}).get("data") if isinstance(result, dict) else None
+        docs = []
+        for key, kind in _KINDS.items():
+            for item in (data or {}).get(key) or []:
+                if isinstance(item, dict):
+                    docs.append((kind, {k: v for k, v in item.items() if k != "relativity"}))
+        if latency_s is not None:
+            with self._lock:
+                self._stats["remote_searches"] += 1
+                self._remote_ewma = latency_s if self._remote_ewma is None else 0.8 * self._remote_ewma + 0.2 * latency_s
+        return self._add_docs(user_id, docs, synced=isinstance(data, dict))
+
+    def _add_docs(self, user_id: str, entries: list, synced: bool) -> int:
+        prepared = []
+        for kind, item in entries:
+            text = _item_text(kind, item)
+            if text:
+                prepared.append((kind, item, text, lexical_features(text)))
+        vectors = self._embed([p[2] for p in prepared]) if prepared else None
+        added = 0
+        with self._lock:
+            docs = self._users.get(user_id)
+            if docs is None:
+                if not prepared:
+                    return 0
+                docs = self._users[user_id] = _UserDocs(vectors.shape[1])
+                while len(self._users) > self.max_users:
+                    self._users.popitem(last=False)
+            self._users.move_to_end(user_id)
+            for (kind, item, text, feats), vec in zip(prepared, vectors if vectors is not None else []):
+                # 同一条记忆可能既来自写入又来自检索结果（两处 id 不同），按类型 + 内容去重
+                if docs.add((kind, text), kind, item, feats, vec):
+                    added += 1
+            if len(docs) > self.max_docs_per_user:
+                docs = self._users[user_id] = docs.compacted(self.max_docs_per_user)
+            if synced:
+                docs.synced_at = time.monotonic()
+            self._stats["docs_added"] += added
+        return added
+
+    def invalidate(self, user_id: str):
+        """丢弃某个用户的本地索引（例如在服务端删除记忆之后）。"""
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    # ---------- 检索 ----------
+
+    def search(self, user_id: str, query: str) -> dict | None:
+        """把握足够时返回 MemOS 同构的检索结果，否则返回 None（调用方回退到 MemOS）。"""
+        start = time.perf_counter()
+        q_feats = Counter(lexical_features(query))
+        q_vec = self._embed([query])[0] if q_feats else None
+        with self._lock:
+            self._stats["lookups"] += 1
+            docs = self._users.get(user_id)
+            fresh = docs is not None and docs.synced_at is not None and time.monotonic() - docs.synced_at <= self.max_staleness
+            if not fresh or len(docs) < self.min_docs or q_vec is None:
+                self._stats["cold"] += 1
+                return None
+            self._users.move_to_end(user_id)
+            ranked, confidence, best_sim = self._rank(docs, q_feats, q_vec)
+            if not ranked or confidence < self.min_coverage or best_sim < self.min_similarity:
+                self._stats["low_confidence"] += 1
+                return None
+            data = {key: [] for key in _KINDS}
+            best = ranked[0][0]
+            for score, idx in ranked:
+                kind, item = docs.items[idx]
+                bucket = data[_LISTS[kind]]
+                if len(bucket) < self.top_k:
+                    bucket.append({**item, "relativity": round(score / best, 4) if best else 0.0})
+            elapsed = time.perf_counter() - start
+            self._stats["local_hits"] += 1
+            self._local_seconds += elapsed
+            if self._remote_ewma is not None:
+                self._saved_seconds += max(0.0, self._remote_ewma - elapsed)
+        return {"code": 0, "message": "ok", "data": data, "source": "local_index", "confidence": round(confidence, 4)}
+
+    def _rank(self, docs: _UserDocs, q_feats: Counter, q_vec: np.ndarray):
+        """返回 ([(混合分, 文档下标), ...], 查询词覆盖率, 最高余弦相似度)。"""
+        n = len(docs)
+        avg_len = docs.total_length / n if n else 1.0
+        idf = {f: math.log(1 + (n - docs.df[f] + 0.5) / (docs.df[f] + 0.5)) for f in q_feats}
+        bm25: dict[int, float] = {}
+        for feat, weight in idf.items():
+            for idx in docs.postings.get(feat, ()):
+                tf = docs.tfs[idx][feat]
+                norm = self.k1 * (1 - self.b + self.b * docs.lengths[idx] / avg_len)
+                bm25[idx] = bm25.get(idx, 0.0) + weight * tf * (self.k1 + 1) / (tf + norm)
+        if not bm25:
+            return [], 0.0, 0.0
+        candidates = np.fromiter(bm25.keys(), dtype=np.int64, count=len(bm25))
+        lexical = np.fromiter(bm25.values(), dtype=np.float64, count=len(bm25))
+        cosine = docs.vectors[candidates] @ q_vec
+        hybrid = self.alpha * lexical / lexical.max() + (1 - self.alpha) * cosine
+        order = np.argsort(-hybrid)[: self.top_k * len(_KINDS)]
+        ranked = [(float(hybrid[i]), int(candidates[i])) for i in order]
+        # 覆盖率：全部查询词中有多少（按 IDF 加权）被前 top_k 条文档命中；本地没见过的词计入分母
+        covered = set()
+        for _, idx in ranked[: self.top_k]:
+            covered.update(f for f in q_feats if f in docs.tfs[idx])
+        coverage = sum(idf[f] for f in covered) / (sum(idf.values()) or 1.0)
+        return ranked, coverage, float(cosine.max())
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["users"] = len(self._users)
+            out["docs"] = sum(len(d) for d in self._users.values())
+            local_seconds, saved_seconds, remote_ewma = self._local_seconds, self._saved_seconds, self._remote_ewma
+        hits = out["local_hits"]
+        out["local_hit_rate"] = round(hits / out["lookups"], 4) if out["lookups"] else 0.0
+        out["avg_local_ms"] = round(local_seconds / hits * 1000, 3) if hits else 0.0
+        out["avg_remote_ms"] = round(remote_ewma * 1000, 3) if remote_ewma is not None else None
+        out["saved_ms"] = round(saved_seconds * 1000, 1)
+        return out
+
+    def _embed(self, texts: list[str]) -> np.ndarray:
+        vecs = np.asarray(self.embedder.embed(texts), dtype=np.float32)
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vecs / norms
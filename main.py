@@ -4,11 +4,26 @@ main.py
 通俗说明：
 - 演示交互式代理的主入口：读取用户输入 → 生成回复 → 写回 MemOS → 可选查询摘要。
 - 每次循环都将本轮的用户/助理消息写回到 MemOS，以保持记忆的连续性。
+- 写回通过 `MemoryWriteBehind` 在后台批量完成，回复延迟不再包含记忆写入的网络往返。
+- 摘要查询在读到输入时就开始预取检索（`MemoryPrefetcher`），与模型生成并行；检索先于本轮写入，
+  且会先写出该用户此前提交的记忆，保证读到之前各轮的内容。
+- `PLAN_STORE=1` 时回复中带 `BEGIN_PLAN_UPDATE` 计划块的轮次会写入本地计划库（plan_store.py），
+  摘要查询再从库中汇总该用户最近 7 天的计划，不经过 MemOS 与模型；跨会话汇总需固定 `USER_ID`。
+- `MEMOS_LOCAL_INDEX=1` 时缓存未命中的检索先查本地记忆索引（local_index.py），有把握时不访问 MemOS。
 """
 
 import sys
+from datetime import date, timedelta
+
 from langgraph_agent import build_agent, build_agent_noninteractive
+from local_index import LocalMemoryIndex
 from memos_client import MemOSClient
+from memory_cache import SearchResultCache
+from semantic_cache import SemanticSearchCache
+from memory_writer import MemoryWriteBehind
+from plan_store import PlanStore
+from plan_stream import parse_plan_update
+from prefetch import MemoryPrefetcher
 
 
 def _summarize_memory(mem_result: dict) -> str:
@@ -61,32 +76,93 @@ def _summarize_memory(mem_result: dict) -> str:
 
     return "\n".join(lines) if lines else "(暂无偏好与事实摘要)"
 
+
+def _summarize_plans(summary: dict) -> str:
+    """本地计划库的汇总 → 可读文本：逐日任务数与时长，以及占用时间最多的几项活动。"""
+    if not summary.get("tasks"):
+        return "(本地计划库中暂无最近的计划)"
+    lines = [f"- 最近 {summary['days']} 天共 {summary['tasks']} 项任务，合计 {summary['minutes'] / 60:.1f} 小时"]
+    for day, d in summary["by_day"].items():
+        lines.append(f"  · {day}：{d['tasks']} 项，{d['minutes'] / 60:.1f} 小时")
+    top = list(summary["by_activity"].items())[:5]
+    if top:
+        lines.append("- 时间投入最多：" + "，".join(f"{name} {a['minutes'] / 60:.1f} 小时" for name, a in top))
+    return "\n".join(lines)
+
+
+def _save_plan(store: PlanStore, user_id: str, response: str) -> int | None:
+    """回复中解析出计划 JSON 时按当天日期写入本地计划库，返回计划 id；没有计划块时返回 None。
+
+    交互式对话规划的都是当天：模型常照抄提示词示例里的 `"date"`，不能用它决定计划日期。
+    """
+    plan, analysis, _ = parse_plan_update(response)
+    if not plan:
+        return None
+    return store.save_plan(user_id, None, plan, analysis=analysis or None, date=date.today())
+
+
+def _is_summary_query(query) -> bool:
+    return isinstance(query, str) and ("summary" in query.lower() or "摘要" in query)
+
+
 def main():
     """交互式运行入口：初始化代理与 MemOS 客户端并进入循环（仅基于 user_id）。"""
-    memos = MemOSClient()
-    agent = build_agent()
+    # 重复的摘要查询在 TTL 内直接命中本地缓存；写入记忆后自动失效
+    memos = MemOSClient(
+        search_cache=SearchResultCache(),
+        # 语义缓存默认关闭（MEMOS_SEMANTIC_CACHE=1 开启）
+        semantic_cache=SemanticSearchCache.from_env(),
+        # MEMOS_LOCAL_INDEX=1 时缓存未命中的检索先查本地混合索引
+        local_index=LocalMemoryIndex.from_env(),
+    )
+    writer = MemoryWriteBehind()
+    prefetcher = MemoryPrefetcher(writer)
+    store = PlanStore.from_env()
+    # 摘要查询一读到就在后台检索，不必等模型回复完成
+    agent = build_agent(on_query=lambda q: prefetcher.prefetch(memos, q) if _is_summary_query(q) else None)
 
     print("🧭 欢迎使用个人日程助手演示（MemOS + LangGraph）")
 
+    try:
+        _loop(agent, memos, writer, prefetcher, store)
+    finally:
+        if store is not None:
+            store.close()
+        prefetcher.close()
+        # 退出前写出尚未落盘的记忆
+        writer.close()
+
+
+def _loop(agent, memos: MemOSClient, writer: MemoryWriteBehind, prefetcher: MemoryPrefetcher, store: PlanStore | None = None):
+    """对话主循环：按需取回预取的摘要检索，再把本轮记忆写入交给后台。"""
     while True:
         # 每次调用执行一次：ask_user -> generate_response（无需额外编排）
         state = agent.invoke({})
         query = state.get("query")
         response = state.get("response")
 
+        # 查询历史上下文：当用户输入包含 "摘要" 或 "summary" 时，示例性检索最近任务摘要
+        if query and _is_summary_query(query):
+            # 检索在读到输入时已预取（先写出此前各轮的记忆再检索），这里通常只需取回结果；
+            # 须在提交本轮写入之前取，否则预取会因出现新写入而作废重查
+            res = prefetcher.get(memos, query)
+            print("🧠 记忆摘要：\n" + _summarize_memory(res))
+            if store is not None:
+                today = date.today()
+                summary = store.summary(memos.user_id, (today - timedelta(days=6)).isoformat(), today.isoformat())
+                print("📒 本地计划汇总：\n" + _summarize_plans(summary))
+
+        # 本轮回复带计划块时存入本地计划库，供之后的摘要查询汇总
+        if store is not None and response:
+            _save_plan(store, memos.user_id, response)
+
         # 保存记忆到 MemOS：记录用户输入与助理回复，形成跨会话的记忆链路
         if query and response:
             messages = [
                 {"role": "user", "content": query},
                 {"role": "assistant", "content": response}
             ]
-            memos.add_conversation(messages)
-
-        # 查询历史上下文：当用户输入包含 "摘要" 或 "summary" 时，示例性检索最近任务摘要
-        if query and isinstance(query, str) and ("summary" in query.lower() or "摘要" in query):
-            # 使用用户的 query 进行检索，仅基于 user_id
-            res = memos.search_memory(query)
-            print("🧠 记忆摘要：\n" + _summarize_memory(res))
+            writer.submit(memos, messages)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,185 @@
+"""
+memory_cache.py
+
+通俗说明：
+- `search_memory` 结果的本地缓存：按 `(user_id, 归一化后的查询文本)` 作为键。
+- 同时具备 TTL 过期、LRU 淘汰与总字节数上限；结果以 JSON 字节存储，命中时重新解析，
+  调用方修改返回值不会污染缓存。
+- `MemOSClient.add_conversation` 写入某个用户后会调用 `invalidate(user_id)`，自动失效该用户的全部缓存。
+- `stats()` 返回命中/未命中/过期/淘汰等计数与命中率，便于调参。
+- `WriteGenerations`：按用户的写入代数（线程安全、条目有上限；`clear()` 时全部前移），供本缓存、语义缓存与
+  `MemOSClient` 的检索合并键共用。
+"""
+
+import itertools
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+_PUNCT_TAIL = "。．.！!？?，,；;：:～~ "
+
+
+def normalize_query(query: str) -> str:
+    """查询归一化：全半角统一、小写、合并空白、去掉首尾标点。"""
+    text = unicodedata.normalize("NFKC", query or "").lower()
+    text = re.sub(r"\s+", " ", text)
+    return text.strip(_PUNCT_TAIL)
+
+
+class WriteGenerations:
+    """按用户的写入代数（线程安全，最多记住 `max_users` 个用户）。
+
+    - 代数取自全局递增计数器，`bump` 之后该用户的代数一定与之前读到的任何值都不同；
+    - 超出上限时淘汰最久未写入的用户，并把它的代数记为下限：未记录的用户一律返回该下限，
+      淘汰只会让进行中的检索多放弃一次回填，不会让写入前的旧结果被当成最新。
+    """
+
+    def __init__(self, max_users: int = 1024):
+        self.max_users = max(1, max_users)
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+        self._values: OrderedDict = OrderedDict()
+        self._floor = 0
+
+    def get(self, user_id: str) -> int:
+        with self._lock:
+            return self._values.get(user_id, self._floor)
+
+    def bump(self, user_id: str) -> int:
+        """记录一次写入，返回该用户的新代数。"""
+        with self._lock:
+            value = self._values[user_id] = next(self._counter)
+            self._values.move_to_end(user_id)
+            while len(self._values) > self.max_users:
+                _, evicted = self._values.popitem(last=False)
+                self._floor = max(self._floor, evicted)
+            return value
+
+    def bump_all(self) -> int:
+        """记录一次对所有用户生效的写入（如清空缓存），返回新的下限代数。"""
+        with self._lock:
+            self._values.clear()
+            self._floor = next(self._counter)
+            return self._floor
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._values)
+
+
+class SearchResultCache:
+    """按用户分区的检索结果缓存（TTL + LRU + 字节上限，线程安全）。"""
+
+    def __init__(self, ttl: float = 30.0, max_entries: int = 1024, max_bytes: int = 8 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max(1, max_bytes)
+
+        self._lock = threading.Lock()
+        # (user_id, key) -> (expires_at, payload_bytes)，顺序即 LRU 顺序（末尾最新）
+        self._entries: OrderedDict = OrderedDict()
+        self._user_keys: dict[str, set] = {}
+        # 每个用户的写入代数：检索期间若发生写入，旧结果不再回填缓存
+        self._generations = WriteGenerations(self.max_entries)
+        self._bytes = 0
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evictions": 0,
+            "invalidations": 0,
+            "oversize": 0,
+        }
+
+    def get(self, user_id: str, query: str):
+        """命中且未过期时返回结果副本，否则返回 None。"""
+        entry_key = (user_id, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            expires_at, payload = entry
+            if expires_at <= time.monotonic():
+                self._remove(entry_key)
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(entry_key)
+            self._stats["hits"] += 1
+        return json.loads(payload)
+
+    def generation(self, user_id: str) -> int:
+        """返回用户当前的写入代数，检索前读取并在 `put` 时传回。"""
+        return self._generations.get(user_id)
+
+    def put(self, user_id: str, query: str, result, generation: int | None = None) -> bool:
+        """写入一条检索结果。
+
+        - 单条超过字节上限时不缓存并返回 False；
+        - 传入 `generation` 且期间该用户发生过写入（代数已变化）时同样不缓存。
+        """
+        try:
+            payload = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        except (TypeError, ValueError):
+            return False
+        entry_key = (user_id, normalize_query(query))
+        with self._lock:
+            if generation is not None and generation != self._generations.get(user_id):
+                return False
+            if len(payload) > self.max_bytes:
+                self._stats["oversize"] += 1
+                return False
+            if entry_key in self._entries:
+                self._remove(entry_key)
+            self._entries[entry_key] = (time.monotonic() + self.ttl, payload)
+            self._user_keys.setdefault(user_id, set()).add(entry_key)
+            self._bytes += len(payload)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats["evictions"] += 1
+        return True
+
+    def invalidate(self, user_id: str) -> int:
+        """失效某个用户的全部缓存，返回被移除的条数。"""
+        with self._lock:
+            self._generations.bump(user_id)
+            keys = self._user_keys.pop(user_id, set())
+            for entry_key in keys:
+                _, payload = self._entries.pop(entry_key)
+                self._bytes -= len(payload)
+            if keys:
+                self._stats["invalidations"] += 1
+            return len(keys)
+
+    def clear(self):
+        """清空全部缓存；所有用户的代数一并前移，清空前开始的检索不会把旧结果回填进来。"""
+        with self._lock:
+            self._generations.bump_all()
+            self._entries.clear()
+            self._user_keys.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """返回计数快照：hits / misses / hit_rate / entries / bytes 等。"""
+        with self._lock:
+            out = dict(self._stats)
+            out["entries"] = len(self._entries)
+            out["bytes"] = self._bytes
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+        return out
+
+    def _remove(self, entry_key):
+        _, payload = self._entries.pop(entry_key)
+        self._bytes -= len(payload)
+        keys = self._user_keys.get(entry_key[0])
+        if keys is not None:
+            keys.discard(entry_key)
+            if not keys:
+                del self._user_keys[entry_key[0]]
@@ -0,0 +1,288 @@
+"""
+memory_writer.py
+
+通俗说明：
+- 记忆写入的"后写"（write-behind）管道：调用方把消息放入有界队列后立即返回，
+  由后台线程按 `user_id` 合并消息，批量调用 `/add/message` 写入 MemOS。
+- 触发写入的条件：单个用户缓冲的消息数达到 `batch_size`、最早一条消息等待超过 `max_age` 秒、
+  调用 `flush()` 或 `close()`。
+- 队列满时 `submit()` 最多阻塞 `put_timeout` 秒（背压），仍无空位则丢弃并计数。
+- `stats()` 返回 queued / flushed / dropped / failed 等计数，便于观察写入健康度。
+- 按用户的读后写一致性：`flush(user_id=...)` 只写出该用户的缓冲，且该用户没有待写消息时立即返回；
+  `sequence(user_id)` 在每次提交时递增，读方可据此判断检索开始后是否又有新的写入。
+- 后台线程只负责攒批与派发，从不等待写入本身：写入请求交给一个小线程池发出，
+  多个用户同时等待读后写时不会在单个后台线程上排队。每个用户一条写入队列，上一批写完才由同一个线程接着写下一批，
+  同一用户的写入不会乱序。`flush()` 的 `timeout` 是总的等待上限，超时返回 False，写入在后台继续。
+- 写入失败计入 `failed` 与 `last_error`，并记录日志（logger `memory_writer`）与埋点计数 `memos.write_behind_failed`。
+"""
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from instrumentation import incr
+from memos_client import MemOSClient
+
+logger = logging.getLogger(__name__)
+
+
+_STOP = object()
+
+
+class _Flush:
+    """控制消息：要求后台线程立即写出缓冲（指定 user_id 时只写该用户），并在完成后通知调用方。"""
+
+    def __init__(self, user_id: str | None = None):
+        self.user_id = user_id
+        self.done = threading.Event()
+
+
+class _Countdown:
+    """计数归零时调用一次回调：多个用户的写出全部完成后再通知调用方。"""
+
+    def __init__(self, n: int, callback):
+        self._left = n
+        self._lock = threading.Lock()
+        self._callback = callback
+        if n == 0:
+            callback()
+
+    def tick(self):
+        with self._lock:
+            self._left -= 1
+            fire = self._left == 0
+        if fire:
+            self._callback()
+
+
+class MemoryWriteBehind:
+    """按 user_id 合并、批量异步写入 MemOS 的后台写入器。"""
+
+    def __init__(
+        self,
+        max_queue: int = 1000,
+        batch_size: int = 20,
+        max_age: float = 2.0,
+        put_timeout: float = 1.0,
+        flush_workers: int = 4,
+    ):
+        self.batch_size = max(1, batch_size)
+        self.max_age = max_age
+        self.put_timeout = put_timeout
+
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._counters = {
+            "queued": 0,     # 已接收进入队列的消息条数
+            "flushed": 0,    # 已成功写入 MemOS 的消息条数
+            "dropped": 0,    # 队列满被拒绝的消息条数
+            "failed": 0,     # 写入请求失败的消息条数
+            "batches": 0,    # 成功发出的批量写入请求数
+        }
+        self.last_error: str | None = None
+        self._closed = False
+        # user_id -> 已提交但尚未写出（成功或失败）的消息数 / 累计提交次数
+        self._pending: dict[str, int] = {}
+        self._seq: dict[str, int] = {}
+
+        # user_id -> {"client": MemOSClient, "messages": [...], "since": 首条消息入缓冲的时间}
+        self._buffers: dict[str, dict] = {}
+        # 写入线程池；user_id -> 该用户排在进行中写入之后的 [(缓冲或 None, 完成回调), ...]，
+        # 用户在字典中即表示有一批正在写出
+        self._flush_pool = ThreadPoolExecutor(max_workers=max(1, flush_workers), thread_name_prefix="memos-flush")
+        self._lanes: dict[str, list] = {}
+        self._lanes_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="memos-write-behind", daemon=True)
+        self._worker.start()
+
+    # ----------------------------
+    # 调用方接口
+    # ----------------------------
+
+    def submit(self, memos: MemOSClient, messages: list) -> bool:
+        """将一轮对话消息放入写入队列，立即返回。
+
+        返回：
+        - True 表示已入队；False 表示队列持续已满或写入器已关闭，消息被丢弃。
+        """
+        if not messages:
+            return True
+        if self._closed:
+            self._count("dropped", len(messages))
+            return False
+        user_id = memos.user_id
+        # 先登记待写数，避免后台线程先写完再登记导致计数为负
+        self._track(user_id, len(messages))
+        try:
+            self._queue.put((memos, list(messages)), timeout=self.put_timeout)
+        except queue.Full:
+            self._track(user_id, -len(messages))
+            self._count("dropped", len(messages))
+            return False
+        with self._lock:
+            self._seq[user_id] = self._seq.get(user_id, 0) + 1
+        self._count("queued", len(messages))
+        return True
+
+    def pending(self, user_id: str) -> int:
+        """该用户已提交但尚未写出的消息数。"""
+        with self._lock:
+            return self._pending.get(user_id, 0)
+
+    def sequence(self, user_id: str) -> int:
+        """该用户累计成功入队的提交次数；数值变化说明有新的写入。"""
+        with self._lock:
+            return self._seq.get(user_id, 0)
+
+    def flush(self, timeout: float | None = None, user_id: str | None = None) -> bool:
+        """写出此前已入队的消息（可只针对某个用户）；在 `timeout` 秒内全部写出返回 True。"""
+        if self._closed or not self._worker.is_alive():
+            return True
+        if user_id is not None and not self.pending(user_id):
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        req = _Flush(user_id)
+        try:
+            self._queue.put(req, timeout=timeout)
+        except queue.Full:
+            return False
+        return req.done.wait(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def close(self, timeout: float | None = 10.0):
+        """写出剩余消息并停止后台线程。可重复调用。"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._worker.join(timeout)
+        if not self._worker.is_alive():
+            self._flush_pool.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        """返回计数快照，附带当前队列长度与待写出的缓冲消息数。"""
+        with self._lock:
+            out = dict(self._counters)
+        out["queue_size"] = self._queue.qsize()
+        out["buffered"] = sum(len(b["messages"]) for b in list(self._buffers.values()))
+        return out
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    # ----------------------------
+    # 后台线程
+    # ----------------------------
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._counters[key] += n
+
+    def _track(self, user_id: str, n: int):
+        with self._lock:
+            left = self._pending.get(user_id, 0) + n
+            if left > 0:
+                self._pending[user_id] = left
+            else:
+                self._pending.pop(user_id, None)
+
+    def _next_deadline(self) -> float | None:
+        if not self._buffers:
+            return None
+        oldest = min(b["since"] for b in self._buffers.values())
+        return max(0.0, oldest + self.max_age - time.monotonic())
+
+    def _run(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self._next_deadline())
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                # 关闭时才在后台线程上等待全部写出
+                done = threading.Event()
+                self._flush_all(done.set)
+                done.wait()
+                return
+            if isinstance(item, _Flush):
+                if item.user_id is None:
+                    self._flush_all(item.done.set)
+                else:
+                    self._flush_user(item.user_id, item.done.set)
+                continue
+            if item is not None:
+                memos, messages = item
+                buf = self._buffers.setdefault(
+                    memos.user_id, {"client": memos, "messages": [], "since": time.monotonic()}
+                )
+                buf["client"] = memos
+                buf["messages"].extend(messages)
+                if len(buf["messages"]) >= self.batch_size:
+                    self._flush_user(memos.user_id)
+
+            now = time.monotonic()
+            for user_id in [u for u, b in self._buffers.items() if now - b["since"] >= self.max_age]:
+                self._flush_user(user_id)
+
+    def _flush_all(self, on_done):
+        """写出全部用户的缓冲；连同各用户进行中的写入都完成后调用 `on_done`。"""
+        users = set(self._buffers)
+        with self._lanes_lock:
+            users.update(self._lanes)
+        countdown = _Countdown(len(users), on_done)
+        for user_id in users:
+            self._flush_user(user_id, countdown.tick)
+
+    def _flush_user(self, user_id: str, on_done=None):
+        """取出该用户的缓冲排入其写入队列；`on_done` 在此前该用户的全部写入完成后调用。"""
+        buf = self._buffers.pop(user_id, None)
+        with self._lanes_lock:
+            lane = self._lanes.get(user_id)
+            if lane is not None:
+                # 该用户有写入在进行：排在后面，由写完上一批的线程接着写
+                lane.append((buf, on_done))
+                return
+            if buf is None:
+                if on_done is not None:
+                    on_done()
+                return
+            self._lanes[user_id] = []
+        self._flush_pool.submit(self._drain_lane, user_id, buf, on_done)
+
+    def _drain_lane(self, user_id: str, buf: dict | None, on_done):
+        """在线程池中按提交顺序写出该用户排队的各批，直到队列为空。"""
+        while True:
+            try:
+                if buf:
+                    self._write(user_id, buf)
+            finally:
+                if on_done is not None:
+                    on_done()
+            with self._lanes_lock:
+                lane = self._lanes[user_id]
+                if not lane:
+                    del self._lanes[user_id]
+                    return
+                buf, on_done = lane.pop(0)
+
+    def _write(self, user_id: str, buf: dict):
+        messages = buf["messages"]
+        if not messages:
+            return
+        try:
+            buf["client"].add_conversation(messages)
+        except Exception as e:
+            self.last_error = str(e)
+            self._count("failed", len(messages))
+            incr("memos.write_behind_failed", len(messages))
+            logger.warning("后台写入记忆失败（%s，%d 条）：%s", user_id, len(messages), e)
+            return
+        finally:
+            self._track(user_id, -len(messages))
+        self._count("flushed", len(messages))
+        self._count("batches")
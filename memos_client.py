@@ -6,31 +6,93 @@ memos_client.py
 - 所有必要的连接配置从 `.env` 中读取，包括：`MEMOS_API_KEY`、`MEMOS_BASE_URL`（可选 `OPENAI_API_BASE`）。
 - `user_id` 可由调用方显式传入；若未传入且环境变量也未设置，将自动随机生成一个。
 - 主要方法：`add_conversation(messages)` 写入消息，`search_memory(query)` 检索记忆。
+- 可选传入 `search_cache`（见 memory_cache.py）缓存检索结果，写入后自动失效该用户的缓存；
+  `semantic_cache`（见 semantic_cache.py）在精确缓存未命中时按查询语义相似度复用结果。
+- `AsyncMemOSClient` 提供同名的异步接口，基于连接池复用的 keep-alive 传输（可用时启用 HTTP/2），
+  连接池大小由 `MEMOS_POOL_SIZE` 控制，`MEMOS_HTTP2=false` 可关闭 HTTP/2。
+- 同一用户同时发出的相同检索会合并成一次上游请求（见 singleflight.py），`MEMOS_COALESCE=false` 可关闭；
+  写入完成后发起的检索不会并入写入前就已开始的那次请求。
+- 多租户：`MemOSTenantClient` / `AsyncMemOSTenantClient` 不绑定用户，`user_id` 逐次传入，
+  所有用户共用一个连接池（每个主机最多 `MEMOS_POOL_SIZE` 条连接，占满时排队等待而不是新建连接），
+  服务端为成千上万个用户读写记忆时内存与 socket 数量保持不变。
+  `for_user(user_id)` 返回一个轻量的单用户视图，接口与 `MemOSClient` 相同，可直接交给写入器、预取器与 WeekPlanner。
+- 可选传入 `local_index`（见 local_index.py）：缓存未命中时先查本地 BM25 + 向量混合索引，把握足够就本地作答，
+  否则请求 MemOS 并把结果并入索引；成功写入的对话也会进入索引。
+- 故障隔离（见 resilience.py）：写入与检索各有一个熔断器，连续失败后快速失败——检索返回降级的空记忆
+  （`degraded: true`，不进缓存与本地索引），写入抛出 `CircuitOpenError`；单次请求的超时按近期 p99 自适应
+  （不超过 `MEMOS_TIMEOUT`）；`MEMOS_HEDGE=1` 时检索超过 p95 未返回会补发一次，取先返回的结果。
 """
 
 import os
+import copy
 import json
+import time
+import asyncio
 import requests
 import uuid
 from dotenv import load_dotenv
 
+from instrumentation import incr, span
+from memory_cache import WriteGenerations, normalize_query
+from resilience import CircuitBreaker, CircuitOpenError, Hedger, LatencyTracker
+from singleflight import AsyncSingleFlight, SingleFlight
+
 load_dotenv()
 
-class MemOSClient:
-    """MemOS 客户端封装：读取配置并暴露写入/检索接口（基于 user_id）。
+# 重试策略（同步与异步客户端共用，保持行为一致）
+_RETRY_TOTAL = 3
+_RETRY_BACKOFF_FACTOR = 0.5
+_RETRY_STATUS_FORCELIST = (429, 500, 502, 503, 504)
 
-    支持在初始化时传入 `user_id`；若未传入则优先使用环境变量 `USER_ID`，如仍为空则随机生成。
-    """
 
-    def __init__(self, user_id: str | None = None):
-        # 从环境变量读取连接信息；user_id 可外部传入，或使用环境变量/随机生成
+def _env_flag(name: str, default: str) -> bool:
+    value = (os.getenv(name, default) or default).strip().lower()
+    return value in ("1", "true", "yes", "on")
+
+
+def _retryable(res) -> bool:
+    """响应状态码属于可重试的失败（限流 / 5xx）。"""
+    return res.status_code in _RETRY_STATUS_FORCELIST
+
+
+def _pool_size(pool_size: int | None) -> int:
+    if pool_size is None:
+        try:
+            pool_size = int((os.getenv("MEMOS_POOL_SIZE", "100") or "100").strip())
+        except ValueError:
+            pool_size = 100
+    return max(1, pool_size)
+
+
+def _require_user_id(user_id: str | None) -> str:
+    if not user_id:
+        raise ValueError("多租户客户端的每次调用都必须传入 user_id")
+    return user_id
+
+
+class _MemOSBase:
+    """同步/异步客户端共用的配置读取与请求体构造；各方法显式接收 user_id，单用户与多租户客户端共用。"""
+
+    def __init__(self, search_cache=None, semantic_cache=None, coalesce: bool | None = None, local_index=None):
+        self.search_cache = search_cache
+        self.semantic_cache = semantic_cache
+        # 查询时按顺序尝试：先精确缓存，再语义缓存
+        self._search_caches = [c for c in (search_cache, semantic_cache) if c is not None]
+        # 缓存之后、MemOS 之前的本地混合索引
+        self.local_index = local_index
+        # 按接口的熔断器（MEMOS_BREAKER=false 时为 None）、耗时分布与可选的检索对冲
+        self.breakers = {ep: CircuitBreaker.from_env(f"memos.{ep}") for ep in ("search", "add")}
+        self.latency = {ep: LatencyTracker() for ep in ("search", "add")}
+        self.hedger = Hedger.from_env(self.latency["search"])
+        self.coalesce = _env_flag("MEMOS_COALESCE", "true") if coalesce is None else coalesce
+        # 每个用户的写入代数，参与合并键，保证写后发起的检索读到新数据（加锁递增、条目有上限）
+        self._write_generations = WriteGenerations()
+        # 从环境变量读取连接信息
         self.api_key = os.getenv("MEMOS_API_KEY")
         self.base_url = os.getenv("MEMOS_BASE_URL")
-        self.user_id = user_id or os.getenv("USER_ID") or f"user_{uuid.uuid4().hex[:10]}"
 
         # 网络/SSL配置（可通过环境变量控制）
-        verify_ssl_env = (os.getenv("MEMOS_VERIFY_SSL", "true") or "true").strip().lower()
-        self.verify_ssl = verify_ssl_env in ("1", "true", "yes", "on")
+        self.verify_ssl = _env_flag("MEMOS_VERIFY_SSL", "true")
         timeout_env = (os.getenv("MEMOS_TIMEOUT", "20") or "20").strip()
         try:
             self.timeout = float(timeout_env)
@@ -43,40 +105,289 @@ class MemOSClient:
                 self.base_url = "https://" + self.base_url
             self.base_url = self.base_url.rstrip("/")
 
+    def _url(self, path: str) -> str:
+        path = path.strip()
+        if not path.startswith("/"):
+            path = "/" + path
+        return f"{self.base_url}{path}"
+
+    def _headers(self) -> dict:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Token {self.api_key}"
+        return headers
+
+    def _cached_search(self, user_id: str, query: str):
+        """返回 (缓存结果或 None, 各缓存当前的写入代数)。"""
+        generations = [c.generation(user_id) for c in self._search_caches]
+        for cache in self._search_caches:
+            cached = cache.get(user_id, query)
+            if cached is not None:
+                incr("memos.search_cache_hit")
+                return cached, generations
+        return None, generations
+
+    def _store_search(self, user_id: str, query: str, result, generations):
+        for cache, generation in zip(self._search_caches, generations):
+            cache.put(user_id, query, result, generation=generation)
+
+    def _invalidate_search(self, user_id: str):
+        self._write_generations.bump(user_id)
+        for cache in self._search_caches:
+            cache.invalidate(user_id)
+
+    def _local_search(self, user_id: str, query: str):
+        """本地索引有把握时返回结果，否则返回 None。"""
+        if self.local_index is None:
+            return None
+        with span("memos.local_search"):
+            result = self.local_index.search(user_id, query)
+        incr("memos.local_hit" if result is not None else "memos.local_miss")
+        return result
+
+    def _index_results(self, user_id: str, result, latency_s: float):
+        if self.local_index is not None:
+            self.local_index.add_results(user_id, result, latency_s)
+
+    def _index_messages(self, user_id: str, messages: list):
+        if self.local_index is not None:
+            self.local_index.add_messages(user_id, messages)
+
+    def _check_breaker(self, endpoint: str) -> bool:
+        breaker = self.breakers.get(endpoint)
+        return breaker is None or breaker.allow()
+
+    def _record_outcome(self, endpoint: str, ok: bool):
+        breaker = self.breakers.get(endpoint)
+        if breaker is not None:
+            breaker.record_success() if ok else breaker.record_failure()
+
+    def _release_breaker(self, endpoint: str):
+        breaker = self.breakers.get(endpoint)
+        if breaker is not None:
+            breaker.release()
+
+    def _timeout_for(self, endpoint: str) -> float:
+        """自适应超时：按该接口近期 p99 估算，不超过配置的 `MEMOS_TIMEOUT`。"""
+        return self.latency[endpoint].timeout(self.timeout)
+
+    @staticmethod
+    def _degraded_search(reason: str) -> dict:
+        """熔断期间的降级结果：结构与正常检索一致，但记忆为空。"""
+        incr("memos.search_degraded")
+        return {
+            "code": 0,
+            "message": "degraded",
+            "data": {"memory_detail_list": [], "preference_detail_list": [], "fact_detail_list": []},
+            "degraded": True,
+            "reason": reason,
+        }
+
+    def resilience_stats(self) -> dict:
+        """熔断器状态、各接口 p95 / 自适应超时，以及对冲统计。"""
+        out = {}
+        for ep, tracker in self.latency.items():
+            p95 = tracker.percentile(95)
+            breaker = self.breakers.get(ep)
+            out[ep] = {
+                "breaker": breaker.stats() if breaker is not None else None,
+                "p95_ms": round(p95 * 1000, 2) if p95 is not None else None,
+                "timeout_s": round(self._timeout_for(ep), 3),
+            }
+        out["hedge"] = self.hedger.stats() if self.hedger is not None else None
+        return out
+
+    def _flight_key(self, user_id: str, query: str) -> tuple:
+        return user_id, normalize_query(query), self._write_generations.get(user_id)
+
+    def _add_payload(self, user_id: str, messages: list) -> dict:
+        return {
+            "user_id": user_id,
+            "messages": messages,
+            "conversation_id": f"session_{uuid.uuid4().hex[:10]}"
+        }
+
+    def _search_payload(self, user_id: str, query: str) -> dict:
+        return {
+            "query": query,
+            "user_id": user_id,
+            "conversation_id": f"session_{uuid.uuid4().hex[:10]}"
+        }
+
+
+class _BoundUser:
+    """绑定单个用户的客户端：`user_id` 由调用方传入，或取环境变量 `USER_ID`，仍为空则随机生成。"""
+
+    def _bind(self, user_id: str | None):
+        self.user_id = user_id or os.getenv("USER_ID") or f"user_{uuid.uuid4().hex[:10]}"
+
+    def _ensure_user_id(self):
+        """在请求前确保存在 user_id；若缺失则随机生成一个。"""
+        if not getattr(self, "user_id", None):
+            self.user_id = f"user_{uuid.uuid4().hex[:10]}"
+        return self.user_id
+
+
+class MemOSUserView:
+    """多租户客户端上某个用户的视图：接口与 `MemOSClient` 一致，不持有连接，创建成本可忽略。
+
+    对异步多租户客户端，`add_conversation` / `search_memory` 返回协程。
+    """
+
+    __slots__ = ("client", "user_id")
+
+    def __init__(self, client, user_id: str):
+        self.client = client
+        self.user_id = _require_user_id(user_id)
+
+    def add_conversation(self, messages: list):
+        return self.client.add_conversation(self.user_id, messages)
+
+    def search_memory(self, query: str):
+        return self.client.search_memory(self.user_id, query)
+
+
+class _SyncMemOS(_MemOSBase):
+    """同步请求实现：基于带重试的 `requests.Session`。"""
+
+    def __init__(
+        self,
+        search_cache=None,
+        semantic_cache=None,
+        coalesce: bool | None = None,
+        local_index=None,
+        adapter_kwargs: dict | None = None,
+    ):
+        super().__init__(search_cache=search_cache, semantic_cache=semantic_cache, coalesce=coalesce, local_index=local_index)
+        self._flights = SingleFlight(clone=copy.deepcopy) if self.coalesce else None
+
         # 构建带重试的 Session
         from urllib3.util.retry import Retry
         from requests.adapters import HTTPAdapter
         self._session = requests.Session()
         retries = Retry(
-            total=3,
-            backoff_factor=0.5,
-            status_forcelist=[429, 500, 502, 503, 504],
+            total=_RETRY_TOTAL,
+            backoff_factor=_RETRY_BACKOFF_FACTOR,
+            status_forcelist=list(_RETRY_STATUS_FORCELIST),
             allowed_methods=["POST", "GET"],
             raise_on_status=False,
         )
-        adapter = HTTPAdapter(max_retries=retries)
+        adapter = HTTPAdapter(max_retries=retries, **(adapter_kwargs or {}))
         self._session.mount("https://", adapter)
         self._session.mount("http://", adapter)
 
-    def _ensure_user_id(self):
-        """在请求前确保存在 user_id；若缺失则随机生成一个。"""
-        if not getattr(self, "user_id", None):
-            self.user_id = f"user_{uuid.uuid4().hex[:10]}"
+    def close(self):
+        """关闭底层连接池。"""
+        self._session.close()
+        if self.hedger is not None:
+            self.hedger.close()
+
+    def _post(self, endpoint: str, path: str, data: dict, hedged: bool = False):
+        """发请求（含 urllib3 重试，`hedged` 时经对冲），成功时记录耗时，并按结果更新熔断器。
+
+        对冲时只有胜出的那次请求计入熔断器与耗时统计；落败的请求在后台跑完，结果不计。
+        """
+        try:
+            if hedged:
+                res, elapsed = self.hedger.call(
+                    lambda: self._send(endpoint, path, data), is_failure=lambda sent: _retryable(sent[0])
+                )
+            else:
+                res, elapsed = self._send(endpoint, path, data)
+        except Exception:
+            self._record_outcome(endpoint, False)
+            raise
+        except BaseException:
+            self._release_breaker(endpoint)
+            raise
+        if res.status_code == 200:
+            self.latency[endpoint].record(elapsed)
+        self._record_outcome(endpoint, not _retryable(res))
+        return res
+
+    def _send(self, endpoint: str, path: str, data: dict):
+        """只发请求，不更新熔断器与耗时统计；返回 (响应, 耗时秒)。"""
+        start = time.perf_counter()
+        res = self._session.post(
+            self._url(path), headers=self._headers(), json=data,
+            timeout=self._timeout_for(endpoint), verify=self.verify_ssl,
+        )
+        return res, time.perf_counter() - start
+
+    def _add(self, user_id: str, messages: list):
+        if not self._check_breaker("add"):
+            raise CircuitOpenError("MemOS 写入接口已熔断，暂不写入")
+        data = self._add_payload(user_id, messages)
+        try:
+            with span("memos.add"):
+                res = self._post("add", "/add/message", data)
+        except Exception as e:
+            raise Exception(f"写入对话请求失败：{e}")
+        finally:
+            # 写入后该用户的检索缓存失效（请求失败也可能已部分写入，一并失效）
+            self._invalidate_search(user_id)
+        if res.status_code != 200:
+            raise Exception(f"写入对话失败：{res.status_code} {res.text}")
+        self._index_messages(user_id, messages)
+        return res.json()
+
+    def _search(self, user_id: str, query: str):
+        cached, generations = self._cached_search(user_id, query)
+        if cached is not None:
+            return cached
+        local = self._local_search(user_id, query)
+        if local is not None:
+            return local
+        if self._flights is None:
+            return self._search_upstream(user_id, query, generations)
+        # 并发的相同检索只发一次请求，其余调用共享结果（或同一个异常）
+        result, shared = self._flights.do(
+            self._flight_key(user_id, query), self._search_upstream, user_id, query, generations
+        )
+        if shared:
+            incr("memos.search_coalesced")
+        return result
+
+    def _search_upstream(self, user_id: str, query: str, generations):
+        if not self._check_breaker("search"):
+            return self._degraded_search("circuit_open")
+        data = self._search_payload(user_id, query)
+        start = time.perf_counter()
+        try:
+            with span("memos.search"):
+                res = self._post("search", "/search/memory", data, hedged=self.hedger is not None)
+        except Exception as e:
+            raise Exception(f"检索记忆请求失败：{e}")
+        if res.status_code != 200:
+            raise Exception(f"检索记忆失败：{res.status_code} {res.text}")
+        result = res.json()
+        self._store_search(user_id, query, result, generations)
+        self._index_results(user_id, result, time.perf_counter() - start)
+        return result
 
-    def _url(self, path: str) -> str:
-        path = path.strip()
-        if not path.startswith("/"):
-            path = "/" + path
-        return f"{self.base_url}{path}"
+
+class MemOSClient(_BoundUser, _SyncMemOS):
+    """MemOS 客户端封装：读取配置并暴露写入/检索接口（基于 user_id）。
+
+    支持在初始化时传入 `user_id`；若未传入则优先使用环境变量 `USER_ID`，如仍为空则随机生成。
+    每个实例各有一个 Session；需要同时服务大量用户时改用 `MemOSTenantClient`。
+    """
+
+    def __init__(
+        self,
+        user_id: str | None = None,
+        search_cache=None,
+        semantic_cache=None,
+        coalesce: bool | None = None,
+        local_index=None,
+    ):
+        super().__init__(search_cache=search_cache, semantic_cache=semantic_cache, coalesce=coalesce, local_index=local_index)
+        self._bind(user_id)
 
     def _headers(self) -> dict:
-        headers = {
-            "Content-Type": "application/json",
-            # 某些服务端连接复用在特定网络下易引发 EOF，显式关闭连接可提升稳定性
-            "Connection": "close",
-        }
-        if self.api_key:
-            headers["Authorization"] = f"Token {self.api_key}"
+        headers = super()._headers()
+        # 某些服务端连接复用在特定网络下易引发 EOF，显式关闭连接可提升稳定性
+        headers["Connection"] = "close"
         return headers
 
     def add_conversation(self, messages: list):
@@ -89,21 +400,7 @@ class MemOSClient:
         - 服务端返回的 JSON 对象（dict），包含写入结果。
         """
         # 在请求前确保 user_id 存在
-        self._ensure_user_id()
-        url = self._url("/add/message")
-        headers = self._headers()
-        data = {
-            "user_id": self.user_id,
-            "messages": messages,
-            "conversation_id": f"session_{uuid.uuid4().hex[:10]}"
-        }
-        try:
-            res = self._session.post(url, headers=headers, json=data, timeout=self.timeout, verify=self.verify_ssl)
-        except Exception as e:
-            raise Exception(f"写入对话请求失败：{e}")
-        if res.status_code != 200:
-            raise Exception(f"写入对话失败：{res.status_code} {res.text}")
-        return res.json()
+        return self._add(self._ensure_user_id(), messages)
 
     def search_memory(self, query: str):
         """查询记忆摘要或执行检索任务（仅按 user_id 分区）。
@@ -115,18 +412,253 @@ class MemOSClient:
         - 服务端返回的 JSON 对象（dict），一般包含记忆详情列表与偏好列表等。
         """
         # 在请求前确保 user_id 存在
-        self._ensure_user_id()
-        url = self._url("/search/memory")
+        return self._search(self._ensure_user_id(), query)
+
+
+class MemOSTenantClient(_SyncMemOS):
+    """多租户同步客户端：一个 Session、一个有界连接池服务所有用户，`user_id` 逐次传入（线程安全）。
+
+    - 每个主机最多保持 `pool_size` 条 keep-alive 连接（默认取 `MEMOS_POOL_SIZE`），
+      连接全部占用时调用方阻塞等待空闲连接，而不是无限制地新建 socket；
+    - 检索缓存、请求合并与写后失效都按 user_id 隔离，与 `MemOSClient` 行为一致。
+    """
+
+    def __init__(
+        self,
+        pool_size: int | None = None,
+        search_cache=None,
+        semantic_cache=None,
+        coalesce: bool | None = None,
+        local_index=None,
+    ):
+        self.pool_size = _pool_size(pool_size)
+        super().__init__(
+            search_cache=search_cache,
+            semantic_cache=semantic_cache,
+            coalesce=coalesce,
+            local_index=local_index,
+            adapter_kwargs={"pool_connections": 4, "pool_maxsize": self.pool_size, "pool_block": True},
+        )
+
+    def for_user(self, user_id: str) -> MemOSUserView:
+        """返回单用户视图（接口同 `MemOSClient`），共用本实例的连接池与缓存。"""
+        return MemOSUserView(self, user_id)
+
+    def add_conversation(self, user_id: str, messages: list):
+        """为指定用户写入对话，返回服务端 JSON。"""
+        return self._add(_require_user_id(user_id), messages)
+
+    def search_memory(self, user_id: str, query: str):
+        """检索指定用户的记忆，返回服务端 JSON。"""
+        return self._search(_require_user_id(user_id), query)
+
+
+class _AsyncMemOS(_MemOSBase):
+    """异步请求实现：基于 `httpx.AsyncClient` 连接池。"""
+
+    def __init__(
+        self,
+        pool_size: int | None = None,
+        http2: bool | None = None,
+        search_cache=None,
+        semantic_cache=None,
+        coalesce: bool | None = None,
+        local_index=None,
+    ):
+        super().__init__(search_cache=search_cache, semantic_cache=semantic_cache, coalesce=coalesce, local_index=local_index)
+        self._flights = AsyncSingleFlight(clone=copy.deepcopy) if self.coalesce else None
+        import httpx
+
+        self.pool_size = _pool_size(pool_size)
+
+        if http2 is None:
+            http2 = _env_flag("MEMOS_HTTP2", "true")
+        if http2:
+            try:
+                import h2  # noqa: F401  HTTP/2 需要额外依赖 h2
+            except ImportError:
+                http2 = False
+        self.http2 = http2
+
+        self._client = httpx.AsyncClient(
+            http2=self.http2,
+            verify=self.verify_ssl,
+            timeout=self.timeout,
+            limits=httpx.Limits(
+                max_connections=self.pool_size,
+                max_keepalive_connections=self.pool_size,
+            ),
+        )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def aclose(self):
+        """关闭底层连接池。"""
+        await self._client.aclose()
+        if self.hedger is not None:
+            self.hedger.close()
+
+    @staticmethod
+    def _backoff(attempt: int) -> float:
+        """与 urllib3 Retry 相同的退避：第 1 次重试立即进行，之后按 factor * 2^(n-1) 增长。"""
+        if attempt <= 1:
+            return 0.0
+        return _RETRY_BACKOFF_FACTOR * (2 ** (attempt - 1))
+
+    async def _post(self, endpoint: str, path: str, data: dict):
+        """发一次请求（含重试），成功时记录耗时，并按最终结果更新熔断器。"""
+        try:
+            res = await self._post_with_retry(endpoint, path, data)
+        except Exception:
+            self._record_outcome(endpoint, False)
+            raise
+        except BaseException:
+            # 被取消（对冲落败、合并的检索被取消、客户端断开）：不是 MemOS 的失败，只归还探测名额
+            self._release_breaker(endpoint)
+            raise
+        self._record_outcome(endpoint, res.status_code not in _RETRY_STATUS_FORCELIST)
+        return res
+
+    async def _post_with_retry(self, endpoint: str, path: str, data: dict):
+        import httpx
+
+        url = self._url(path)
         headers = self._headers()
-        data = {
-            "query": query,
-            "user_id": self.user_id,
-            "conversation_id": f"session_{uuid.uuid4().hex[:10]}"
-        }
+        attempt = 0
+        while True:
+            start = time.perf_counter()
+            try:
+                res = await self._client.post(url, headers=headers, json=data, timeout=self._timeout_for(endpoint))
+            except httpx.TransportError:
+                if attempt >= _RETRY_TOTAL:
+                    raise
+                attempt += 1
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            if res.status_code in _RETRY_STATUS_FORCELIST and attempt < _RETRY_TOTAL:
+                attempt += 1
+                delay = self._backoff(attempt)
+                retry_after = res.headers.get("Retry-After")
+                if retry_after:
+                    try:
+                        delay = max(delay, float(retry_after))
+                    except ValueError:
+                        pass
+                await asyncio.sleep(delay)
+                continue
+            if res.status_code == 200:
+                self.latency[endpoint].record(time.perf_counter() - start)
+            return res
+
+    async def _add(self, user_id: str, messages: list):
+        if not self._check_breaker("add"):
+            raise CircuitOpenError("MemOS 写入接口已熔断，暂不写入")
+        data = self._add_payload(user_id, messages)
         try:
-            res = self._session.post(url, headers=headers, json=data, timeout=self.timeout, verify=self.verify_ssl)
+            with span("memos.add"):
+                res = await self._post("add", "/add/message", data)
+        except Exception as e:
+            raise Exception(f"写入对话请求失败：{e}")
+        finally:
+            self._invalidate_search(user_id)
+        if res.status_code != 200:
+            raise Exception(f"写入对话失败：{res.status_code} {res.text}")
+        self._index_messages(user_id, messages)
+        return res.json()
+
+    async def _search(self, user_id: str, query: str):
+        cached, generations = self._cached_search(user_id, query)
+        if cached is not None:
+            return cached
+        local = self._local_search(user_id, query)
+        if local is not None:
+            return local
+        if self._flights is None:
+            return await self._search_upstream(user_id, query, generations)
+        result, shared = await self._flights.do(
+            self._flight_key(user_id, query), self._search_upstream, user_id, query, generations
+        )
+        if shared:
+            incr("memos.search_coalesced")
+        return result
+
+    async def _search_upstream(self, user_id: str, query: str, generations):
+        if not self._check_breaker("search"):
+            return self._degraded_search("circuit_open")
+        data = self._search_payload(user_id, query)
+        start = time.perf_counter()
+        try:
+            with span("memos.search"):
+                if self.hedger is not None:
+                    res = await self.hedger.acall(
+                        lambda: self._post("search", "/search/memory", data), is_failure=_retryable
+                    )
+                else:
+                    res = await self._post("search", "/search/memory", data)
         except Exception as e:
             raise Exception(f"检索记忆请求失败：{e}")
         if res.status_code != 200:
             raise Exception(f"检索记忆失败：{res.status_code} {res.text}")
-        return res.json()
+        result = res.json()
+        self._store_search(user_id, query, result, generations)
+        self._index_results(user_id, result, time.perf_counter() - start)
+        return result
+
+
+class AsyncMemOSClient(_BoundUser, _AsyncMemOS):
+    """MemOS 异步客户端：接口与 `MemOSClient` 一致，方法均为协程。
+
+    - 底层使用 `httpx.AsyncClient` 连接池，连接保持 keep-alive 复用，避免每次请求重新握手；
+    - 安装了 `h2` 时启用 HTTP/2（服务端不支持会自动协商回 HTTP/1.1）；
+    - 重试策略与同步客户端相同：最多重试 3 次，指数退避，对 429/5xx 与连接错误重试。
+
+    建议在进程内复用同一实例，并在退出时调用 `aclose()`（或使用 `async with`）。
+    """
+
+    def __init__(
+        self,
+        user_id: str | None = None,
+        pool_size: int | None = None,
+        http2: bool | None = None,
+        search_cache=None,
+        semantic_cache=None,
+        coalesce: bool | None = None,
+        local_index=None,
+    ):
+        super().__init__(
+            pool_size, http2,
+            search_cache=search_cache, semantic_cache=semantic_cache, coalesce=coalesce, local_index=local_index,
+        )
+        self._bind(user_id)
+
+    async def add_conversation(self, messages: list):
+        """将对话内容存入 MemOS 记忆（仅按 user_id 分区）。返回服务端 JSON。"""
+        return await self._add(self._ensure_user_id(), messages)
+
+    async def search_memory(self, query: str):
+        """查询记忆摘要或执行检索任务（仅按 user_id 分区）。返回服务端 JSON。"""
+        return await self._search(self._ensure_user_id(), query)
+
+
+class AsyncMemOSTenantClient(_AsyncMemOS):
+    """多租户异步客户端：一个 httpx 连接池服务所有用户，`user_id` 逐次传入。
+
+    连接数上限为 `pool_size`（默认取 `MEMOS_POOL_SIZE`），占满时请求在池内排队；
+    适合 api_server 这类在一个进程内为大量用户读写记忆的场景。
+    """
+
+    def for_user(self, user_id: str) -> MemOSUserView:
+        """返回单用户视图（方法为协程），共用本实例的连接池与缓存。"""
+        return MemOSUserView(self, user_id)
+
+    async def add_conversation(self, user_id: str, messages: list):
+        """为指定用户写入对话，返回服务端 JSON。"""
+        return await self._add(_require_user_id(user_id), messages)
+
+    async def search_memory(self, user_id: str, query: str):
+        """检索指定用户的记忆，返回服务端 JSON。"""
+        return await self._search(_require_user_id(user_id), query)
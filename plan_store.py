@@ -0,0 +1,326 @@
+"""
+plan_store.py
+
+通俗说明：
+- 本地计划库：把每天解析出的计划 JSON 及其中的每条任务、固定安排写入嵌入式 SQLite（WAL 模式），
+  "上周二我安排了什么""这周政治学习排了几次"这类问题直接查本地库，毫秒级返回，
+  不必再走一次 MemOS 检索加一次模型调用。
+- 两张表：`plans`（一天一份计划，保留原始 JSON 与分析文本）与 `tasks`（逐条任务 / 固定安排，
+  起止时间换算成当天分钟数）。索引覆盖 (user_id, 日期)、时间段与活动名称。
+- 写入用一个事务 + `executemany` 批量插入；`save_plans()` 可一次写入多天、多用户的计划。
+- 查询接口：`plans()`、`latest_plan()`、`tasks()`（按日期范围、时段、活动关键词过滤）、
+  `summary()`（按天与按活动汇总时长）、`slots()` / `conflicts()`（交给 conflicts.py 做历史计划的冲突校验）。
+- 计划日期依次取：显式传入的 `date`、计划 JSON 的 `date`、首条带日期的固定安排、当天日期；
+  若 `day` 是星期名且与该日期的星期不一致，按星期名平移到同一周内对应的那一天。
+- 环境变量：`PLAN_STORE=1` 开启（demo / simulate 默认不开启），`PLAN_STORE_PATH` 指定文件路径（默认 plans.db）。
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import date as _date, timedelta
+
+from conflicts import PLAN, Slot, commitment_slot, find_conflicts, parse_hm, plan_tasks, task_slot, weekday_of
+
+_DAY_MINUTES = 24 * 60
+_DATE_RE = re.compile(r"(\d{4}-\d{2}-\d{2})")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS plans ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " user_id TEXT NOT NULL,"
+    " plan_date TEXT NOT NULL,"
+    " day TEXT,"
+    " created_at REAL NOT NULL,"
+    " analysis TEXT,"
+    " plan_json TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_plans_user_date ON plans(user_id, plan_date)",
+    "CREATE TABLE IF NOT EXISTS tasks ("
+    " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+    " plan_id INTEGER NOT NULL REFERENCES plans(id) ON DELETE CASCADE,"
+    " user_id TEXT NOT NULL,"
+    " plan_date TEXT NOT NULL,"
+    " kind TEXT NOT NULL,"
+    " start_min INTEGER NOT NULL,"
+    " end_min INTEGER NOT NULL,"
+    " activity TEXT NOT NULL,"
+    " priority TEXT,"
+    " raw TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_tasks_user_date_time ON tasks(user_id, plan_date, start_min, end_min)",
+    "CREATE INDEX IF NOT EXISTS idx_tasks_user_activity ON tasks(user_id, activity)",
+    "CREATE INDEX IF NOT EXISTS idx_tasks_plan ON tasks(plan_id)",
+)
+
+
+def resolve_date(day=None, plan_json: dict | None = None, date=None, today: _date | None = None) -> str:
+    """确定计划所属日期（ISO 格式），规则见模块说明。"""
+    base = None
+    for candidate in (date, (plan_json or {}).get("date")):
+        m = _DATE_RE.search(str(candidate or ""))
+        if m:
+            base = _date.fromisoformat(m.group(1))
+            break
+    if base is None:
+        for c in (plan_json or {}).get("commitments", []) or []:
+            m = _DATE_RE.search(str(c.get("time_range", "")) if isinstance(c, dict) else "")
+            if m:
+                base = _date.fromisoformat(m.group(1))
+                break
+    if base is None:
+        m = _DATE_RE.search(str(day or ""))
+        base = _date.fromisoformat(m.group(1)) if m else (today or _date.today())
+    wanted = weekday_of(day)
+    if wanted is not None and wanted != base.weekday():
+        base += timedelta(days=wanted - base.weekday())
+    return base.isoformat()
+
+
+def _hm(minutes: int) -> str:
+    minutes %= _DAY_MINUTES
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+class PlanStore:
+    """SQLite 计划库（线程安全，所有线程共用一个连接）。"""
+
+    def __init__(self, path: str = "plans.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # WAL 下 NORMAL 已能保证崩溃后数据库一致，只可能丢最后几个事务
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        for stmt in _SCHEMA:
+            self._db.execute(stmt)
+        self._stats = {"plans_saved": 0, "tasks_saved": 0, "queries": 0}
+
+    @classmethod
+    def from_env(cls, prefix: str = "PLAN_STORE") -> "PlanStore | None":
+        """按环境变量创建；`<prefix>` 未开启时返回 None。"""
+        if os.getenv(prefix, "").strip().lower() not in ("1", "true", "yes", "on"):
+            return None
+        return cls(path=os.getenv(f"{prefix}_PATH") or "plans.db")
+
+    # ---------- 写入 ----------
+
+    def save_plan(self, user_id: str, day, plan_json: dict, analysis: str | None = None, date=None) -> int:
+        """保存一天的计划，返回计划 id。"""
+        return self.save_plans([{
+            "user_id": user_id, "day": day, "plan_json": plan_json, "analysis": analysis, "date": date,
+        }])[0]
+
+    def save_plans(self, records) -> list[int]:
+        """批量保存计划：每条记录含 user_id、day、plan_json，可选 analysis、date；在一个事务内完成。"""
+        prepared = []
+        for rec in records:
+            plan_json = rec.get("plan_json") if isinstance(rec.get("plan_json"), dict) else {}
+            plan_date = resolve_date(rec.get("day"), plan_json, rec.get("date"))
+            rows = self._task_rows(rec["user_id"], plan_date, plan_json)
+            prepared.append((rec, plan_json, plan_date, rows))
+
+        now = time.time()
+        ids = []
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for rec, plan_json, plan_date, rows in prepared:
+                    cur = self._db.execute(
+                        "INSERT INTO plans (user_id, plan_date, day, created_at, analysis, plan_json) VALUES (?, ?, ?, ?, ?, ?)",
+                        (rec["user_id"], plan_date, str(rec.get("day") or ""), now, rec.get("analysis"),
+                         json.dumps(plan_json, ensure_ascii=False)),
+                    )
+                    plan_id = cur.lastrowid
+                    self._db.executemany(
+                        "INSERT INTO tasks (plan_id, user_id, plan_date, kind, start_min, end_min, activity, priority, raw)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                        [(plan_id, *row) for row in rows],
+                    )
+                    ids.append(plan_id)
+                    self._stats["tasks_saved"] += len(rows)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._stats["plans_saved"] += len(ids)
+        return ids
+
+    @staticmethod
+    def _task_rows(user_id: str, plan_date: str, plan_json: dict) -> list[tuple]:
+        """计划 JSON → tasks 表的行；起止时间为当天分钟数，跨午夜的结束时间大于 1440。"""
+        rows = []
+        for task in plan_tasks(plan_json):
+            slot = task_slot(task, plan_date, user_id)
+            if slot:
+                rows.append(_slot_row(slot, plan_date, task, task.get("priority")))
+        for c in plan_json.get("commitments", []) or []:
+            slot = commitment_slot(c, plan_date, user_id, use_date=False)
+            if slot:
+                rows.append(_slot_row(slot, plan_date, c, None))
+        return rows
+
+    # ---------- 查询 ----------
+
+    def plans(self, user_id: str, date_from: str | None = None, date_to: str | None = None, limit: int = 100) -> list[dict]:
+        """按日期范围（含两端）列出计划，新的在前；同一天多次规划只取最新一份。"""
+        sql = (
+            "SELECT id, plan_date, day, created_at, analysis, plan_json FROM plans p"
+            " WHERE user_id = ? AND plan_date >= ? AND plan_date <= ?"
+            " AND id = (SELECT MAX(id) FROM plans q WHERE q.user_id = p.user_id AND q.plan_date = p.plan_date)"
+            " ORDER BY plan_date DESC LIMIT ?"
+        )
+        rows = self._query(sql, (user_id, date_from or "0000-00-00", date_to or "9999-99-99", limit))
+        return [_plan_dict(r) for r in rows]
+
+    def latest_plan(self, user_id: str, day=None, date=None) -> dict | None:
+        """某一天（日期或本周的星期名）的最新计划；都不传时返回最近的一份。"""
+        if day is None and date is None:
+            rows = self._query(
+                "SELECT id, plan_date, day, created_at, analysis, plan_json FROM plans"
+                " WHERE user_id = ? ORDER BY plan_date DESC, id DESC LIMIT 1",
+                (user_id,),
+            )
+        else:
+            rows = self._query(
+                "SELECT id, plan_date, day, created_at, analysis, plan_json FROM plans"
+                " WHERE user_id = ? AND plan_date = ? ORDER BY id DESC LIMIT 1",
+                (user_id, resolve_date(day, None, date)),
+            )
+        return _plan_dict(rows[0]) if rows else None
+
+    def tasks(
+        self,
+        user_id: str,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        time_from: str | None = None,
+        time_to: str | None = None,
+        activity: str | None = None,
+        kind: str | None = PLAN,
+        latest_only: bool = True,
+    ) -> list[dict]:
+        """按日期范围、时段（与 [time_from, time_to) 有重叠）与活动关键词查询任务，按时间排序。
+
+        `kind=None` 时同时返回固定安排；`latest_only` 时同一天只看最新一份计划。
+        """
+        clauses = ["t.user_id = ?", "t.plan_date >= ?", "t.plan_date <= ?"]
+        params: list = [user_id, date_from or "0000-00-00", date_to or "9999-99-99"]
+        if time_to is not None:
+            clauses.append("t.start_min < ?")
+            params.append(_minutes(time_to))
+        if time_from is not None:
+            clauses.append("t.end_min > ?")
+            params.append(_minutes(time_from))
+        if activity:
+            clauses.append("t.activity LIKE ?")
+            params.append(f"%{activity}%")
+        if kind:
+            clauses.append("t.kind = ?")
+            params.append(kind)
+        if latest_only:
+            clauses.append(
+                "t.plan_id = (SELECT MAX(id) FROM plans p WHERE p.user_id = t.user_id AND p.plan_date = t.plan_date)"
+            )
+        rows = self._query(
+            "SELECT t.plan_id, t.plan_date, t.kind, t.start_min, t.end_min, t.activity, t.priority, t.raw"
+            f" FROM tasks t WHERE {' AND '.join(clauses)} ORDER BY t.plan_date, t.start_min",
+            params,
+        )
+        return [_task_dict(r) for r in rows]
+
+    def summary(self, user_id: str, date_from: str | None = None, date_to: str | None = None) -> dict:
+        """按天统计任务数与总时长，按活动统计出现次数与总时长（只看计划任务）。"""
+        tasks = self.tasks(user_id, date_from, date_to)
+        by_day: dict[str, dict] = {}
+        by_activity: dict[str, dict] = {}
+        for t in tasks:
+            minutes = t["end_min"] - t["start_min"]
+            d = by_day.setdefault(t["date"], {"tasks": 0, "minutes": 0})
+            d["tasks"] += 1
+            d["minutes"] += minutes
+            a = by_activity.setdefault(t["activity"], {"count": 0, "minutes": 0})
+            a["count"] += 1
+            a["minutes"] += minutes
+        return {
+            "user_id": user_id,
+            "days": len(by_day),
+            "tasks": len(tasks),
+            "minutes": sum(d["minutes"] for d in by_day.values()),
+            "by_day": dict(sorted(by_day.items())),
+            "by_activity": dict(sorted(by_activity.items(), key=lambda kv: -kv[1]["minutes"])),
+        }
+
+    def slots(self, user_id: str, date_from: str | None = None, date_to: str | None = None) -> list:
+        """历史计划的时段（计划任务 + 固定安排），可直接交给 `conflicts.find_conflicts`。"""
+        out = []
+        for t in self.tasks(user_id, date_from, date_to, kind=None):
+            s, e = _hm(t["start_min"]), _hm(t["end_min"])
+            out.append(Slot.on(t["date"], s, e, t["activity"], t["kind"], user_id))
+        return out
+
+    def conflicts(self, user_id: str, date_from: str | None = None, date_to: str | None = None, plan_vs_plan: bool = True):
+        """对历史计划做冲突校验（含跨午夜、跨天），返回 `Conflict` 列表。"""
+        return find_conflicts(self.slots(user_id, date_from, date_to), plan_vs_plan=plan_vs_plan)
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["plans"] = self._db.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+            out["tasks"] = self._db.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+        return out
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _query(self, sql: str, params) -> list:
+        with self._lock:
+            self._stats["queries"] += 1
+            return self._db.execute(sql, params).fetchall()
+
+
+def _minutes(hm: str) -> int:
+    value = parse_hm(hm)
+    if value is None:
+        raise ValueError(f"无法解析时刻：{hm!r}")
+    return value
+
+
+def _slot_row(slot, plan_date: str, item: dict, priority) -> tuple:
+    # 时段的绝对分钟数减去当天零点，得到当天分钟数
+    offset = slot.start - slot.start % _DAY_MINUTES
+    return (
+        slot.user_id, plan_date, slot.kind, slot.start - offset, slot.end - offset, slot.title,
+        str(priority) if priority is not None else None, json.dumps(item, ensure_ascii=False),
+    )
+
+
+def _plan_dict(row) -> dict:
+    return {
+        "id": row["id"],
+        "date": row["plan_date"],
+        "day": row["day"],
+        "created_at": row["created_at"],
+        "analysis": row["analysis"],
+        "plan": json.loads(row["plan_json"]),
+    }
+
+
+def _task_dict(row) -> dict:
+    return {
+        "plan_id": row["plan_id"],
+        "date": row["plan_date"],
+        "kind": row["kind"],
+        "time": f"{_hm(row['start_min'])}-{_hm(row['end_min'])}",
+        "start_min": row["start_min"],
+        "end_min": row["end_min"],
+        "activity": row["activity"],
+        "priority": row["priority"],
+        "task": json.loads(row["raw"]),
+    }
@@ -0,0 +1,182 @@
+"""
+plan_stream.py
+
+通俗说明：
+- 模型输出的增量解析器：边接收流式片段边识别 `BEGIN_PLAN_UPDATE` / `END_PLAN_UPDATE` 标记，
+  不必等整段回复生成完。
+- 标记之前的自由文本作为"分析文本"，在读到 BEGIN 标记的那一刻就交给调用方（可立即做冲突检测）。
+- 标记之间的 JSON 用一个逐字符的小状态机扫描（字符串/转义/括号层级/当前键名），
+  `tasks`（或 `schedule`）与 `commitments` 数组里的每个元素一闭合就解析并返回，界面可以逐条渲染。
+- `close()` 返回完整计划 JSON；解析失败时返回 None，并把原因记在 `error` 上，而不是静默吞掉。
+- 非流式场景用 `parse_plan_update(content)` 一次性解析。
+"""
+
+import json
+
+BEGIN = "BEGIN_PLAN_UPDATE"
+END = "END_PLAN_UPDATE"
+
+# 数组键名 → 其元素的事件类型
+_ITEM_SECTIONS = {"tasks": "task", "schedule": "task", "commitments": "commitment"}
+
+
+class PlanUpdateStreamParser:
+    """流式解析模型回复；`feed()` 返回新产生的事件列表 [(类型, 内容), ...]。
+
+    事件类型：
+    - "analysis"：BEGIN 标记之前的全部自由文本（只产生一次）；
+    - "task" / "commitment"：计划 JSON 中一条完整的任务 / 固定安排（dict）。
+    """
+
+    def __init__(self):
+        self.analysis: str | None = None
+        self.tasks: list[dict] = []
+        self.commitments: list[dict] = []
+        self.plan: dict | None = None
+        self.error: str | None = None
+        self._parts: list[str] = []     # 全部原文，用于 content 与无标记时的兜底解析
+        self._pending = ""              # 尚未确认不含 BEGIN 标记的文本尾部
+        self._state = "analysis"        # analysis → block → after_json → done
+        self._block = ""
+        self._pos = 0
+        # JSON 扫描状态
+        self._stack: list[list] = []    # 每层：[括号, 当前键名, 元素事件类型]
+        self._in_str = False
+        self._escape = False
+        self._str_start = 0
+        self._last_str: str | None = None
+        self._item_start: int | None = None
+        self._item_depth = 0
+        self._item_kind: str | None = None
+        self._json_start: int | None = None
+        self._json_end: int | None = None
+
+    @property
+    def content(self) -> str:
+        return "".join(self._parts)
+
+    @property
+    def in_block(self) -> bool:
+        """是否已经读到 BEGIN 标记。"""
+        return self._state != "analysis"
+
+    def feed(self, chunk: str) -> list[tuple[str, object]]:
+        if not chunk:
+            return []
+        self._parts.append(chunk)
+        events: list[tuple[str, object]] = []
+        if self._state == "analysis":
+            text = self._pending + chunk
+            idx = text.find(BEGIN)
+            if idx == -1:
+                # 保留可能是半个标记的尾部，其余确定属于分析文本
+                keep = len(BEGIN) - 1
+                self._pending = text[-keep:] if len(text) > keep else text
+                return events
+            before = self.content[:len(self.content) - len(text) + idx]
+            self.analysis = before
+            events.append(("analysis", before))
+            self._state = "block"
+            self._pending = ""
+            chunk = text[idx + len(BEGIN):]
+        if self._state in ("block", "after_json"):
+            self._block += chunk
+            if self._state == "block":
+                self._scan(events)
+            if self._state == "after_json" and END in self._block[self._json_end:]:
+                self._state = "done"
+        return events
+
+    def _scan(self, events: list):
+        b = self._block
+        stack = self._stack
+        for i in range(self._pos, len(b)):
+            ch = b[i]
+            if self._in_str:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_str = False
+                    try:
+                        self._last_str = json.loads(b[self._str_start:i + 1])
+                    except ValueError:
+                        self._last_str = None
+                continue
+            if self._json_start is None:
+                # 跳过 JSON 之前的空白、代码块围栏等
+                if ch == "{":
+                    self._json_start = i
+                    stack.append(["{", None, None])
+                continue
+            if ch == '"':
+                self._in_str = True
+                self._str_start = i
+            elif ch in "{[":
+                parent = stack[-1]
+                if ch == "{" and parent[0] == "[" and parent[2] and self._item_start is None:
+                    self._item_start, self._item_depth, self._item_kind = i, len(stack) + 1, parent[2]
+                key = parent[1] if parent[0] == "{" else None
+                stack.append([ch, None, _ITEM_SECTIONS.get(key) if ch == "[" else None])
+            elif ch in "}]":
+                if not stack:
+                    continue
+                depth = len(stack)
+                stack.pop()
+                if ch == "}" and self._item_start is not None and depth == self._item_depth:
+                    try:
+                        item = json.loads(b[self._item_start:i + 1])
+                    except ValueError:
+                        item = None
+                    if isinstance(item, dict):
+                        (self.tasks if self._item_kind == "task" else self.commitments).append(item)
+                        events.append((self._item_kind, item))
+                    self._item_start = None
+                if not stack:
+                    self._json_end = i + 1
+                    self._state = "after_json"
+                    self._pos = i + 1
+                    return
+            elif ch == ":" and stack[-1][0] == "{":
+                stack[-1][1] = self._last_str
+            elif ch == "," and stack[-1][0] == "{":
+                stack[-1][1] = None
+        self._pos = len(b)
+
+    def close(self) -> dict | None:
+        """结束解析，返回完整计划 JSON（失败时为 None，原因见 `error`）。"""
+        if self._state == "analysis":
+            # 没有标记：整段都是分析文本，取到最后一个右花括号为止、能完整解析的最外层片段
+            content = self.content
+            self.analysis = content
+            end = content.rfind("}")
+            starts = [i for i, ch in enumerate(content[:end]) if ch == "{"] if end != -1 else []
+            if not starts:
+                self.error = "未找到 BEGIN_PLAN_UPDATE 标记"
+                return None
+            for start in starts:
+                try:
+                    self.plan = json.loads(content[start:end + 1])
+                    break
+                except ValueError as e:
+                    self.error = f"无标记且 JSON 解析失败：{e}"
+            if self.plan is not None:
+                self.error = None
+            return self.plan
+        if self._json_end is None:
+            self.error = "计划 JSON 不完整（生成被截断？）"
+            return None
+        try:
+            self.plan = json.loads(self._block[self._json_start:self._json_end])
+        except ValueError as e:
+            self.error = f"计划 JSON 解析失败：{e}"
+        return self.plan
+
+
+def parse_plan_update(content: str) -> tuple[dict | None, str, PlanUpdateStreamParser]:
+    """一次性解析完整回复，返回 (计划 JSON 或 None, 分析文本, 解析器)。"""
+    parser = PlanUpdateStreamParser()
+    parser.feed(content or "")
+    plan = parser.close()
+    return plan, parser.analysis or "", parser
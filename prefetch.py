@@ -0,0 +1,111 @@
+"""
+prefetch.py
+
+通俗说明：
+- 记忆检索的预取：指令一确定就在后台线程发起 `search_memory`，与提示词准备、模型调用、后处理并行。
+- 读后写一致性（按用户）：预取开始前先写出该用户尚未落盘的记忆（`MemoryWriteBehind.flush(user_id=...)`），
+  保证能读到之前提交的写入；取结果时若发现预取开始后该用户又提交了新的写入，则丢弃预取结果重新检索。
+- 同一用户的同一查询（按 `normalize_query` 归一）只保留一个进行中的预取；未预取过的查询在 `get()` 时同步检索。
+- `stats()` 返回 started / hits / stale / misses 计数，便于观察预取命中情况。
+"""
+
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from instrumentation import incr, span
+from memory_cache import normalize_query
+from memory_writer import MemoryWriteBehind
+from memos_client import MemOSClient
+
+
+class MemoryPrefetcher:
+    """在后台线程池中提前发起记忆检索，并在取结果时校验读后写一致性。"""
+
+    def __init__(
+        self,
+        writer: MemoryWriteBehind | None = None,
+        max_workers: int = 4,
+        consistency_timeout: float | None = 10.0,
+    ):
+        self.writer = writer
+        self.consistency_timeout = consistency_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="memos-prefetch")
+        self._lock = threading.Lock()
+        # (user_id, 归一化查询) -> (Future, 预取开始时该用户的写入序号)
+        self._inflight: dict[tuple, tuple[Future, int]] = {}
+        self._counters = {"started": 0, "hits": 0, "stale": 0, "misses": 0}
+
+    def _key(self, memos: MemOSClient, query: str) -> tuple:
+        return memos.user_id, normalize_query(query)
+
+    def _sequence(self, memos: MemOSClient) -> int:
+        return self.writer.sequence(memos.user_id) if self.writer is not None else 0
+
+    def _count(self, key: str):
+        with self._lock:
+            self._counters[key] += 1
+        incr(f"memos.prefetch_{key}")
+
+    def _search(self, memos: MemOSClient, query: str) -> dict:
+        if self.writer is not None:
+            # 先写出该用户此前提交的记忆，再检索
+            with span("memos.prefetch_flush"):
+                self.writer.flush(timeout=self.consistency_timeout, user_id=memos.user_id)
+        return memos.search_memory(query)
+
+    def prefetch(self, memos: MemOSClient, query: str) -> Future:
+        """在后台发起检索并立即返回 Future；已有同一查询的有效预取时直接复用。"""
+        key = self._key(memos, query)
+        seq = self._sequence(memos)
+        with self._lock:
+            entry = self._inflight.get(key)
+            if entry is not None and entry[1] == seq:
+                return entry[0]
+            future = self._executor.submit(self._search, memos, query)
+            self._inflight[key] = (future, seq)
+        self._count("started")
+        return future
+
+    def get(self, memos: MemOSClient, query: str, timeout: float | None = None) -> dict:
+        """取检索结果：优先使用仍然有效的预取，否则同步检索。"""
+        key = self._key(memos, query)
+        with self._lock:
+            entry = self._inflight.pop(key, None)
+        if entry is not None:
+            future, seq = entry
+            if seq == self._sequence(memos):
+                self._count("hits")
+                with span("memos.prefetch_wait"):
+                    return future.result(timeout)
+            # 预取开始后该用户又有新的写入，结果可能缺少这部分记忆
+            future.cancel()
+            self._count("stale")
+        else:
+            self._count("misses")
+        return self._search(memos, query)
+
+    def discard(self, user_id: str):
+        """丢弃某个用户全部进行中的预取。"""
+        with self._lock:
+            keys = [k for k in self._inflight if k[0] == user_id]
+            for k in keys:
+                self._inflight.pop(k)[0].cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._counters)
+            out["inflight"] = len(self._inflight)
+        return out
+
+    def close(self):
+        with self._lock:
+            for future, _ in self._inflight.values():
+                future.cancel()
+            self._inflight.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
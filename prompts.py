@@ -29,6 +29,9 @@ SYSTEM_PROMPT_UNIFIED = (
     "请务必确保 JSON 合法且完整（不得包含额外解释文字）。"
 )
 
+# 综合场景的长期目标（demo 逐日规划与批量规划共用）
+GOAL_TEXT = "每天学习2小时，准备政治和英语"
+
 def build_unified_demo_prompt(goal_text: str, memory_context: str) -> str:
     """综合场景 Prompt 构造器（将目标与记忆上下文整合）"""
     prompt_lines = [
@@ -0,0 +1,295 @@
+"""
+resilience.py
+
+通俗说明：
+- 尾延迟与故障隔离的小工具，供 memos_client.py 使用（同步与异步客户端通用）。
+- `CircuitBreaker`：按接口熔断。连续失败达到阈值后"打开"，之后的调用直接快速失败（检索返回降级的空记忆），
+  冷却 `reset_timeout` 秒后进入"半开"，放行一个探测请求：成功则恢复，失败则继续打开。
+  探测请求被取消（对冲落败、调用方断开等）时用 `release()` 归还名额；未归还的探测超过 `reset_timeout` 视为过期，
+  重新放行，避免熔断器卡在半开。
+  状态以 gauge 导出（0 关闭 / 1 半开 / 2 打开），状态切换计入事件计数。
+- `LatencyTracker`：保留最近若干次成功请求的耗时，给出 p95 / p99，并据此计算自适应超时
+  （约为 p99 的数倍，不低于下限、不超过配置的超时），服务变慢时不再每次都等满 20 秒。
+- `Hedger`：对冲请求。首个请求超过 p95 仍未返回时再发一个相同请求，取先成功的那个；
+  样本不足时不对冲。发出次数与"对冲请求获胜"次数计入统计与埋点。
+- 环境变量：`MEMOS_BREAKER`（默认开启）、`MEMOS_BREAKER_FAILURES`（默认 5）、`MEMOS_BREAKER_RESET`（秒，默认 30）；
+  `MEMOS_HEDGE=1` 开启对冲，`MEMOS_HEDGE_MIN_DELAY_MS`（默认 20）为最短对冲等待。
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, TimeoutError as FutureTimeout, wait
+
+from instrumentation import incr, set_gauge
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return (os.getenv(name, default) or default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_number(name: str, default, cast=float):
+    """读取数值型环境变量；未设置或无法解析时使用默认值（与 `MEMOS_TIMEOUT` 的处理一致）。"""
+    try:
+        return cast((os.getenv(name, str(default)) or str(default)).strip())
+    except ValueError:
+        return default
+
+
+class CircuitOpenError(Exception):
+    """熔断器打开时快速失败。"""
+
+
+class CircuitBreaker:
+    """连续失败计数型熔断器（线程安全，协程中也可直接使用：各方法均不阻塞）。"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._probe_at = 0.0
+        self._stats = {"allowed": 0, "rejected": 0, "successes": 0, "failures": 0, "opened": 0}
+        set_gauge(f"{name}.breaker_state", 0)
+
+    @classmethod
+    def from_env(cls, name: str, prefix: str = "MEMOS_BREAKER") -> "CircuitBreaker | None":
+        """按环境变量创建；`<prefix>=false` 时返回 None。"""
+        if not _env_flag(prefix, "true"):
+            return None
+        return cls(
+            name,
+            failure_threshold=_env_number(f"{prefix}_FAILURES", 5, int),
+            reset_timeout=_env_number(f"{prefix}_RESET", 30.0),
+        )
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        """是否放行本次调用；打开期间返回 False，冷却结束后放行有限个探测请求。"""
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self._stats["rejected"] += 1
+                    return False
+                self._transition(HALF_OPEN)
+            if self._state == HALF_OPEN:
+                now = time.monotonic()
+                if self._probes >= self.half_open_max_calls and now - self._probe_at >= self.reset_timeout:
+                    # 探测迟迟没有结果（如被取消后未归还），视为过期
+                    self._probes = 0
+                if self._probes >= self.half_open_max_calls:
+                    self._stats["rejected"] += 1
+                    return False
+                self._probes += 1
+                self._probe_at = now
+            self._stats["allowed"] += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._stats["successes"] += 1
+            self._failures = 0
+            if self._state != CLOSED:
+                self._transition(CLOSED)
+
+    def record_failure(self):
+        with self._lock:
+            self._stats["failures"] += 1
+            self._failures += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._transition(OPEN)
+
+    def release(self):
+        """放行的调用没有结果（被取消）时归还半开探测名额，不计成功或失败。"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes > 0:
+                self._probes -= 1
+
+    def _transition(self, state: str):
+        self._state = state
+        self._probes = 0
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self._stats["opened"] += 1
+        set_gauge(f"{self.name}.breaker_state", _STATE_VALUE[state])
+        incr(f"{self.name}.breaker_{state}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"state": self._state, "consecutive_failures": self._failures, **self._stats}
+
+
+class LatencyTracker:
+    """最近 `window` 次成功请求的耗时分布，用于对冲等待与自适应超时。"""
+
+    def __init__(self, window: int = 256, min_samples: int = 20):
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._samples: deque = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> float | None:
+        """样本不足 `min_samples` 时返回 None。"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def timeout(self, ceiling: float, multiplier: float = 4.0, floor: float = 1.0) -> float:
+        """自适应超时：p99 × multiplier，限制在 [floor, ceiling]；样本不足时用 ceiling。"""
+        p99 = self.percentile(99)
+        if p99 is None:
+            return ceiling
+        return min(ceiling, max(floor, p99 * multiplier))
+
+
+class _HedgeOutcome:
+    """对冲竞速的裁判：记录失败的一方，成功者出现时返回 True。"""
+
+    def __init__(self, is_failure=None):
+        self.is_failure = is_failure
+        self.result = None
+        self._failed = None
+        self._error = None
+
+    def settle(self, future) -> bool:
+        """`future` 为已完成的 Future / Task。"""
+        error = future.exception()
+        if error is not None:
+            self._error = error
+            return False
+        result = future.result()
+        if self.is_failure is not None and self.is_failure(result):
+            self._failed = (result,)
+            return False
+        self.result = result
+        return True
+
+    def fallback(self):
+        """两次都失败：优先返回失败的响应（交给调用方按状态码处理），否则抛出异常。"""
+        if self._failed is not None:
+            return self._failed[0]
+        raise self._error
+
+
+class Hedger:
+    """对冲请求：首个请求超过 p95 未返回时补发一次，取先成功的结果（`is_failure` 判定的失败响应不算成功）。"""
+
+    def __init__(self, tracker: LatencyTracker, percentile: float = 95, min_delay: float = 0.02, max_workers: int = 16):
+        self.tracker = tracker
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_workers = max_workers
+        self._executor: ThreadPoolExecutor | None = None
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "hedged": 0, "hedge_wins": 0}
+
+    @classmethod
+    def from_env(cls, tracker: LatencyTracker, prefix: str = "MEMOS_HEDGE") -> "Hedger | None":
+        """按环境变量创建；`<prefix>` 未开启时返回 None。"""
+        if not _env_flag(prefix, "false"):
+            return None
+        return cls(tracker, min_delay=_env_number(f"{prefix}_MIN_DELAY_MS", 20.0) / 1000)
+
+    def delay(self) -> float | None:
+        """对冲前的等待时间；样本不足时为 None（不对冲）。"""
+        p = self.tracker.percentile(self.percentile)
+        return None if p is None else max(self.min_delay, p)
+
+    def _count(self, key: str, name: str | None = None):
+        with self._lock:
+            self._stats[key] += 1
+        if name:
+            incr(name)
+
+    def call(self, fn, metric: str = "memos.search", is_failure=None):
+        """同步版：在线程池中执行 `fn()`，必要时补发一次。
+
+        `is_failure(result)` 为真的返回值（如 5xx 响应）不算胜出，只在两次都失败时作为兜底返回。
+        """
+        self._count("calls")
+        delay = self.delay()
+        if delay is None:
+            return fn()
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="hedge")
+            executor = self._executor
+        first = executor.submit(fn)
+        try:
+            return first.result(timeout=delay)
+        except FutureTimeout:
+            pass
+        self._count("hedged", f"{metric}.hedge_sent")
+        second = executor.submit(fn)
+        pending, outcome = {first, second}, _HedgeOutcome(is_failure)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if outcome.settle(future):
+                    if future is second:
+                        self._count("hedge_wins", f"{metric}.hedge_won")
+                    # 落后的请求继续在后台完成，结果丢弃（调用方只按返回的这一个结果更新熔断器与耗时）
+                    return outcome.result
+        return outcome.fallback()
+
+    async def acall(self, fn, metric: str = "memos.search", is_failure=None):
+        """异步版：`fn` 为返回协程的无参函数；先成功者胜出，落后的请求被取消。"""
+        self._count("calls")
+        delay = self.delay()
+        if delay is None:
+            return await fn()
+        tasks = [asyncio.ensure_future(fn())]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                return tasks[0].result()
+            self._count("hedged", f"{metric}.hedge_sent")
+            tasks.append(asyncio.ensure_future(fn()))
+            pending, outcome = set(tasks), _HedgeOutcome(is_failure)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if outcome.settle(task):
+                        if task is tasks[1]:
+                            self._count("hedge_wins", f"{metric}.hedge_won")
+                        return outcome.result
+            return outcome.fallback()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+        delay = self.delay()
+        out["delay_ms"] = round(delay * 1000, 2) if delay is not None else None
+        out["hedge_win_rate"] = round(out["hedge_wins"] / out["hedged"], 4) if out["hedged"] else 0.0
+        return out
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
@@ -0,0 +1,251 @@
+"""
+scheduler.py
+
+通俗说明：
+- 本地确定性排程修复器：模型给出的计划与固定安排冲突、或违反 prompts.py 中的规则时，
+  直接在本地把任务挪到最近的可行时段，不再为修复多走一轮模型调用（毫秒级）。
+- 规则与 `SYSTEM_PROMPT_UNIFIED` 一致：
+  1. 固定承诺优先：固定安排（记忆中抽取 + 计划 JSON 的 commitments）原地保留，其他任务不得与之重叠；
+  2. 晚上（默认 18:00 以后）不安排高强度任务；政治学习安排在上午；
+  3. 有冲突时移动到最近可行时段（与原开始时间相差最小），高优先级任务先落位。
+- 固定安排从记忆文本中抽取，例如"每个工作日早上9:30到10:00有晨会""每周三10:00到11:00有团队例会"，
+  并识别"每天 / 工作日 / 周X"等适用日期。只采信用户本人的表述（role=user / UserMemory）、
+  标记为固定安排的事实，以及带"每天 / 每周 / 工作日"等周期措辞的条目；助理回复与召回的旧计划
+  不算固定安排，否则模型此前提议的时段会被当成每天的占用，误差逐日累积。
+- `repair()` 返回修复后的任务列表、每次移动的原因，以及放不下的任务。
+"""
+
+import re
+from dataclasses import dataclass, field
+
+from conflicts import parse_hm
+
+_PRIORITY = {"高": 0, "high": 0, "中": 1, "medium": 1, "低": 2, "low": 2}
+_RANGE_RE = re.compile(r"(\d{1,2}[:：]\d{2})\s*(?:到|至|-|–|—|~)\s*(\d{1,2}[:：]\d{2})")
+_WEEKDAY_RE = re.compile(r"(?:每周|周|星期)([一二三四五六日天])")
+_WEEKDAY_NUM = {"一": 0, "二": 1, "三": 2, "四": 3, "五": 4, "六": 5, "日": 6, "天": 6}
+_TITLE_PREFIX_RE = re.compile(r"^(?:都|一般|通常|固定)?(?:是|有|要|去|参加|进行)*")
+_EVENING_RE = re.compile(r"晚上|晚间|傍晚")
+# 轻松的活动不算高强度；其余高优先级或学习/工作类任务视为高强度
+_LIGHT_RE = re.compile(r"复盘|阅读|休息|散步|整理|放松|冥想|晚餐|聚餐|午饭|午餐|健身|晨练|运动|娱乐")
+_HEAVY_RE = re.compile(r"学习|政治|英语|代码|评审|汇报|PPT|培训|周报|写作|刷题|背诵|听力|真题")
+_POLITICS_RE = re.compile(r"政治")
+# 周期性措辞：来源不明的条目只有这样写才当作固定安排
+_RECURRING_RE = re.compile(r"每天|每日|每周|每个?工作日|工作日|周末|每个?周[一二三四五六日天]")
+
+
+def _fmt(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _parse_range(text: str) -> tuple[int, int] | None:
+    m = _RANGE_RE.search(text or "")
+    if not m:
+        return None
+    start, end = parse_hm(m.group(1)), parse_hm(m.group(2))
+    if start is None or end is None or end <= start:
+        return None
+    return start, end
+
+
+@dataclass(frozen=True)
+class Commitment:
+    """一条固定安排；`weekdays` 为 None 表示每天都有。"""
+    title: str
+    start: int
+    end: int
+    weekdays: frozenset | None = None
+
+    def applies(self, weekday: int | None) -> bool:
+        return self.weekdays is None or weekday is None or weekday in self.weekdays
+
+    @property
+    def time(self) -> str:
+        return f"{_fmt(self.start)}-{_fmt(self.end)}"
+
+
+def parse_commitment(text: str) -> Commitment | None:
+    """从一句记忆文本中抽取固定安排；没有时间段时返回 None。"""
+    m = _RANGE_RE.search(text or "")
+    span = _parse_range(text)
+    if not m or not span:
+        return None
+    if "工作日" in text:
+        weekdays = frozenset(range(5))
+    elif "周末" in text:
+        weekdays = frozenset((5, 6))
+    else:
+        days = {_WEEKDAY_NUM[d] for d in _WEEKDAY_RE.findall(text[:m.start()])}
+        weekdays = frozenset(days) if days else None
+    tail = re.split(r"[，。,.;；！!]", text[m.end():], maxsplit=1)[0]
+    title = _TITLE_PREFIX_RE.sub("", tail.strip()).removesuffix("时间") or "固定安排"
+    return Commitment(title, span[0], span[1], weekdays)
+
+
+def _is_fixed_source(item: dict, text: str) -> bool:
+    """记忆条目是否可作为固定安排的来源（规则见模块说明）。"""
+    if item.get("role") == "assistant":
+        return False
+    if any("固定" in str(tag) for tag in item.get("tags") or []):
+        return True
+    if item.get("role") == "user" or item.get("memory_type") == "UserMemory":
+        return True
+    return bool(_RECURRING_RE.search(text))
+
+
+def extract_commitments(memories) -> list[Commitment]:
+    """从记忆条目（MemOS 返回的 dict 或纯文本）中抽取固定安排，按时间去重。
+
+    dict 条目按来源过滤（见 `_is_fixed_source`）；纯文本视为调用方确认过的用户表述。
+    """
+    out, seen = [], set()
+    for item in memories or []:
+        if isinstance(item, dict):
+            text = item.get("memory_value") or item.get("title") or item.get("preference") or ""
+            if not _is_fixed_source(item, text):
+                continue
+        else:
+            text = str(item)
+        c = parse_commitment(text)
+        if c and (c.start, c.end, c.weekdays) not in seen:
+            seen.add((c.start, c.end, c.weekdays))
+            out.append(c)
+    return out
+
+
+def commitments_from_plan(plan_json: dict) -> list[Commitment]:
+    """计划 JSON 中 `commitments` 字段（time_range 形如 "2025-11-07T09:30-10:00"）。"""
+    out = []
+    for c in (plan_json or {}).get("commitments", []) or []:
+        if not isinstance(c, dict):
+            continue
+        span = _parse_range(str(c.get("time_range", "")).split("T", 1)[-1])
+        if span:
+            out.append(Commitment(c.get("title") or "固定安排", span[0], span[1]))
+    return out
+
+
+@dataclass
+class RepairResult:
+    """修复结果：`tasks` 按时间排序；`moves` 记录每次移动；`unplaced` 为找不到可行时段的任务。"""
+    tasks: list
+    moves: list = field(default_factory=list)
+    unplaced: list = field(default_factory=list)
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.moves or self.unplaced)
+
+
+class ScheduleRepairer:
+    """按 prompts.py 的规则在本地修复一天的任务安排。"""
+
+    def __init__(
+        self,
+        day_start: str = "07:00",
+        day_end: str = "22:00",
+        evening_start: str = "18:00",
+        morning_end: str = "12:00",
+    ):
+        self.day_start = parse_hm(day_start)
+        self.day_end = parse_hm(day_end)
+        self.evening_start = parse_hm(evening_start)
+        self.morning_end = parse_hm(morning_end)
+
+    def is_high_intensity(self, task: dict) -> bool:
+        activity = str(task.get("activity") or task.get("title") or "")
+        if _LIGHT_RE.search(activity):
+            return False
+        return bool(_HEAVY_RE.search(activity)) or _PRIORITY.get(str(task.get("priority", "中")), 1) == 0
+
+    def _window(self, task: dict) -> tuple[int, int, str | None]:
+        """任务允许出现的时间窗口，以及收窄窗口的规则说明。"""
+        activity = str(task.get("activity") or task.get("title") or "")
+        lo, hi, rule = self.day_start, self.day_end, None
+        if _POLITICS_RE.search(activity):
+            hi, rule = min(hi, self.morning_end), "政治学习安排在上午"
+        if self.is_high_intensity(task):
+            if self.evening_start < hi:
+                hi, rule = self.evening_start, rule or "晚上不安排高强度任务"
+        return lo, hi, rule
+
+    @staticmethod
+    def _is_fixed(task: dict, commitments: list[Commitment], span: tuple[int, int]) -> bool:
+        activity = str(task.get("activity") or task.get("title") or "")
+        if "固定" in str(task.get("source", "")):
+            return True
+        return any(c.start == span[0] and c.end == span[1] and (c.title in activity or activity in c.title)
+                   for c in commitments)
+
+    @staticmethod
+    def _blocker(span: tuple[int, int], occupied: list) -> str | None:
+        for start, end, title, fixed in occupied:
+            if start < span[1] and span[0] < end:
+                return f"与固定安排『{title}』冲突" if fixed else f"与任务『{title}』冲突"
+        return None
+
+    @staticmethod
+    def _nearest(start: int, duration: int, lo: int, hi: int, occupied: list) -> int | None:
+        """在 [lo, hi] 内找与 start 最接近、且不与已占用时段重叠的开始时间。"""
+        best = None
+        cursor = lo
+        for o_start, o_end, _, _ in sorted(occupied) + [(hi, hi, "", False)]:
+            gap_end = min(o_start, hi)
+            if gap_end - cursor >= duration:
+                candidate = min(max(start, cursor), gap_end - duration)
+                if best is None or abs(candidate - start) < abs(best - start):
+                    best = candidate
+            cursor = max(cursor, o_end)
+            if cursor >= hi:
+                break
+        return best
+
+    def repair(self, tasks: list, commitments: list[Commitment] = (), weekday: int | None = None) -> RepairResult:
+        """修复一天的任务；`weekday`（周一为 0）用于筛选当天适用的固定安排。"""
+        todays = [c for c in commitments if c.applies(weekday)]
+        occupied = [(c.start, c.end, c.title, True) for c in todays]
+        fixed, flexible, untimed = [], [], []
+        for order, task in enumerate(tasks or []):
+            if not isinstance(task, dict):
+                continue
+            span = _parse_range(str(task.get("time", "")))
+            if span is None:
+                untimed.append(task)
+            elif self._is_fixed(task, todays, span):
+                fixed.append((span, task))
+            else:
+                flexible.append((span, order, task))
+
+        placed = [(span, task) for span, task in fixed]
+        for span, task in fixed:
+            if not any(c.start == span[0] and c.end == span[1] for c in todays):
+                occupied.append((span[0], span[1], str(task.get("activity") or "固定安排"), True))
+
+        moves, unplaced = [], []
+        # 高优先级先落位；同优先级按原开始时间
+        flexible.sort(key=lambda f: (_PRIORITY.get(str(f[2].get("priority", "中")), 1), f[0][0], f[1]))
+        for span, _, task in flexible:
+            title = str(task.get("activity") or task.get("title") or "未命名任务")
+            lo, hi, rule = self._window(task)
+            reason = None
+            if span[0] < lo or span[1] > hi:
+                reason = rule or "超出可安排时间"
+            else:
+                reason = self._blocker(span, occupied)
+            if reason is None:
+                placed.append((span, task))
+                occupied.append((span[0], span[1], title, False))
+                continue
+            duration = span[1] - span[0]
+            start = self._nearest(span[0], duration, lo, hi, occupied)
+            if start is None:
+                unplaced.append({"activity": title, "time": task.get("time"), "reason": reason})
+                continue
+            new_span = (start, start + duration)
+            new_time = f"{_fmt(new_span[0])}-{_fmt(new_span[1])}"
+            moves.append({"activity": title, "from": task.get("time"), "to": new_time, "reason": reason})
+            placed.append((new_span, {**task, "time": new_time, "adjusted_from": task.get("time")}))
+            occupied.append((new_span[0], new_span[1], title, False))
+
+        placed.sort(key=lambda p: p[0])
+        return RepairResult([t for _, t in placed] + untimed, moves, unplaced)
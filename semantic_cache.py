@@ -0,0 +1,218 @@
+"""
+semantic_cache.py
+
+通俗说明：
+- `search_memory` 前的语义缓存：把查询向量化，在同一用户的历史查询中找余弦相似度最高的一条，
+  超过阈值就直接返回它的检索结果。
+- 向量化器可插拔：任何提供 `embed(texts) -> np.ndarray[n, dim]` 的对象都可以传入；
+  默认的 `HashingEmbedder` 基于字符 n-gram 哈希，纯本地、结果确定，但只衡量字面重合而非语义：
+  "本周摘要 / 给我这周的总结"这类改写相似度只有 0.1 左右，要命中改写需要换成真正的语义向量模型。
+  默认阈值 0.9 按哈希向量校准，只命中标点、空白、词序等近乎原样的重复查询。
+- 时间限定词（星期、今天 / 明天、上午 / 下午、数字等，见 `text_features.temporal_terms`）不同的查询
+  一律不互相命中，即使相似度过了阈值——"周一的计划摘要"不会拿到"周五的计划摘要"的结果。
+- 默认不开启：`SemanticSearchCache.from_env()` 在 `MEMOS_SEMANTIC_CACHE=1` 时才创建，
+  阈值可由 `MEMOS_SEMANTIC_THRESHOLD` 调整（换用语义向量模型时通常要调低）。
+- 每个用户一个内存向量索引（NumPy 数组），支持 TTL 与按最近使用淘汰；
+  最多保留 `max_users` 个用户，超出时整用户淘汰最久未访问的；写入记忆后整用户失效。
+- 接口与 `SearchResultCache` 一致（get / put / generation / invalidate / stats），
+  通过 `MemOSClient(semantic_cache=...)` 启用；`report()` 额外给出按用户的命中率。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from memory_cache import WriteGenerations
+from text_features import lexical_features, temporal_terms
+
+
+class HashingEmbedder:
+    """确定性哈希向量化：中文取单字与相邻二字，其它取单词，哈希到固定维度后 L2 归一化。"""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def embed(self, texts: list[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feat in lexical_features(text):
+                digest = hashlib.blake2b(feat.encode("utf-8"), digest_size=8).digest()
+                h = int.from_bytes(digest, "little")
+                # 低位决定维度，最高位决定符号，减少哈希碰撞带来的系统性偏差
+                out[row, h % self.dim] += -1.0 if h >> 63 else 1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+class _UserIndex:
+    """单个用户的向量索引：预分配数组，按槽位存放查询向量与结果。"""
+
+    def __init__(self, dim: int, capacity: int):
+        self.vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self.expires_at = np.zeros(capacity, dtype=np.float64)
+        self.last_used = np.zeros(capacity, dtype=np.float64)
+        self.payloads: list[bytes | None] = [None] * capacity
+        self.temporal: list[tuple | None] = [None] * capacity
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def slot_for_insert(self, now: float) -> int:
+        if self.size < len(self.payloads):
+            self.size += 1
+            return self.size - 1
+        # 已满：优先复用过期槽位，否则淘汰最久未使用的一条
+        expired = np.flatnonzero(self.expires_at[:self.size] <= now)
+        if expired.size:
+            return int(expired[0])
+        return int(np.argmin(self.last_used[:self.size]))
+
+
+class SemanticSearchCache:
+    """按用户分区的语义检索缓存（线程安全）。"""
+
+    def __init__(
+        self,
+        embedder=None,
+        threshold: float = 0.9,
+        ttl: float = 300.0,
+        max_entries_per_user: int = 256,
+        max_users: int = 1024,
+    ):
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries_per_user = max(1, max_entries_per_user)
+        self.max_users = max(1, max_users)
+
+        self._lock = threading.Lock()
+        # user_id -> 索引，顺序即 LRU 顺序（末尾最近使用），超过 max_users 时整用户淘汰
+        self._indexes: OrderedDict = OrderedDict()
+        self._generations = WriteGenerations(self.max_users)
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+        self._hit_similarity_sum = 0.0
+
+    @classmethod
+    def from_env(cls, embedder=None) -> "SemanticSearchCache | None":
+        """`MEMOS_SEMANTIC_CACHE=1` 时创建，否则返回 None。"""
+        if os.getenv("MEMOS_SEMANTIC_CACHE", "").strip().lower() not in ("1", "true", "yes", "on"):
+            return None
+        return cls(
+            embedder=embedder,
+            threshold=float(os.getenv("MEMOS_SEMANTIC_THRESHOLD", "0.9")),
+            ttl=float(os.getenv("MEMOS_SEMANTIC_TTL", "300")),
+        )
+
+    def _embed_one(self, query: str) -> np.ndarray:
+        vec = np.asarray(self.embedder.embed([query]), dtype=np.float32)[0]
+        norm = float(np.linalg.norm(vec))
+        return vec / norm if norm else vec
+
+    def get(self, user_id: str, query: str):
+        """相似度达到阈值时返回缓存结果副本，否则返回 None。"""
+        vec = self._embed_one(query)
+        terms = temporal_terms(query)
+        now = time.monotonic()
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is not None:
+                self._indexes.move_to_end(user_id)
+            if index is None or index.size == 0:
+                self._stats["misses"] += 1
+                if index is not None:
+                    index.misses += 1
+                return None
+            sims = index.vectors[:index.size] @ vec
+            sims[index.expires_at[:index.size] <= now] = -1.0
+            # 指向不同日期 / 时段的查询不互相命中
+            for i in range(index.size):
+                if index.temporal[i] != terms:
+                    sims[i] = -1.0
+            best = int(np.argmax(sims))
+            similarity = float(sims[best])
+            if similarity < self.threshold:
+                self._stats["misses"] += 1
+                index.misses += 1
+                return None
+            index.last_used[best] = now
+            index.hits += 1
+            self._stats["hits"] += 1
+            self._hit_similarity_sum += similarity
+            payload = index.payloads[best]
+        return json.loads(payload)
+
+    def generation(self, user_id: str) -> int:
+        return self._generations.get(user_id)
+
+    def put(self, user_id: str, query: str, result, generation: int | None = None) -> bool:
+        """写入一条检索结果；期间该用户发生过写入（代数变化）时不缓存。"""
+        try:
+            payload = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        except (TypeError, ValueError):
+            return False
+        vec = self._embed_one(query)
+        now = time.monotonic()
+        with self._lock:
+            if generation is not None and generation != self._generations.get(user_id):
+                return False
+            index = self._indexes.get(user_id)
+            if index is None:
+                index = _UserIndex(vec.shape[0], self.max_entries_per_user)
+                self._indexes[user_id] = index
+                while len(self._indexes) > self.max_users:
+                    _, evicted = self._indexes.popitem(last=False)
+                    self._stats["evictions"] += evicted.size
+            self._indexes.move_to_end(user_id)
+            full = index.size == len(index.payloads)
+            slot = index.slot_for_insert(now)
+            if full and index.expires_at[slot] > now:
+                self._stats["evictions"] += 1
+            index.vectors[slot] = vec
+            index.expires_at[slot] = now + self.ttl
+            index.last_used[slot] = now
+            index.payloads[slot] = payload
+            index.temporal[slot] = temporal_terms(query)
+        return True
+
+    def invalidate(self, user_id: str) -> int:
+        """失效某个用户的全部语义缓存，返回被移除的条数。"""
+        with self._lock:
+            self._generations.bump(user_id)
+            index = self._indexes.pop(user_id, None)
+            if index is None or index.size == 0:
+                return 0
+            self._stats["invalidations"] += 1
+            return index.size
+
+    def stats(self) -> dict:
+        with self._lock:
+            out = dict(self._stats)
+            out["users"] = len(self._indexes)
+            out["entries"] = sum(ix.size for ix in self._indexes.values())
+            hit_similarity_sum = self._hit_similarity_sum
+        lookups = out["hits"] + out["misses"]
+        out["hit_rate"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+        out["avg_hit_similarity"] = round(hit_similarity_sum / out["hits"], 4) if out["hits"] else 0.0
+        return out
+
+    def report(self, top: int = 10) -> dict:
+        """命中率报告：全局统计 + 查询量最多的若干用户的命中情况，用于调整阈值。"""
+        with self._lock:
+            per_user = [
+                {
+                    "user_id": user_id,
+                    "entries": ix.size,
+                    "hits": ix.hits,
+                    "misses": ix.misses,
+                    "hit_rate": round(ix.hits / (ix.hits + ix.misses), 4) if ix.hits + ix.misses else 0.0,
+                }
+                for user_id, ix in self._indexes.items()
+            ]
+        per_user.sort(key=lambda r: r["hits"] + r["misses"], reverse=True)
+        return {"threshold": self.threshold, "overall": self.stats(), "users": per_user[:top]}
@@ -0,0 +1,232 @@
+"""
+simulate.py
+
+通俗说明：
+- 多用户并行运行 demo.py 的"写入先验记忆 + 一周规划"场景，用作回归与长时间稳定性测试。
+- 每个用户有独立的 `WeekPlanner`（历史对话互相隔离），共用模型客户端、后台记忆写入器，
+  以及一个多租户 `MemOSTenantClient`（每个用户只是它的轻量视图，连接池大小由 `MEMOS_POOL_SIZE` 控制）。
+- 每个用户的次日记忆检索在当日后处理期间预取（共用一个 `MemoryPrefetcher`），并保证读到前一天的写入。
+- 冲突由 `scheduler.ScheduleRepairer` 在本地修复，报告给出每天修复（移动）与放不下的任务数。
+- 全部用户一周的计划时段（修复后）最后用 `conflicts.find_conflicts` 一次性批量校验（跨天、计划之间的重叠）。
+- `--stream` 时模型以流式返回，计划边生成边解析，报告中额外给出首 token 与首个任务的耗时分布。
+- 并发上限由 `--concurrency` 控制（线程池），结束后输出 JSON 汇总：吞吐、每天的延迟分布、冲突检测结果。
+- `MEMOS_LOCAL_INDEX=1` 时所有用户共用一个本地记忆索引（local_index.py），报告给出本地命中率与节省的检索耗时。
+- `PLAN_STORE=1` 时所有用户的计划写入同一个本地计划库（plan_store.py），报告附带写入量与单用户汇总查询耗时。
+- `--offline` 会在本地启动假 MemOS 与 OpenAI 兼容桩服务，无需任何外部依赖即可跑完整流程。
+
+示例：
+- python simulate.py --users 1000 --concurrency 64 --offline
+- python simulate.py --users 20 --concurrency 4 --output sim.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import ExitStack
+
+from benchmarks.loadtest import summarize_latencies
+from conflicts import find_conflicts, summarize as summarize_conflicts
+
+
+def run_user(
+    user_id: str, client, model: str, writer, weekdays, prefetcher=None, stream: bool = False, tenant=None, store=None
+) -> dict:
+    """为单个用户跑完整的一周场景，返回逐日结果；给出 `tenant` 时复用其连接池。"""
+    from demo import WeekPlanner, seed_unified_scenario
+    from memos_client import MemOSClient
+
+    memos = tenant.for_user(user_id) if tenant is not None else MemOSClient(user_id=user_id)
+    seed_unified_scenario(memos, verbose=False)
+    planner = WeekPlanner(memos, client, model, writer, verbose=False, prefetcher=prefetcher, stream=stream, store=store)
+    try:
+        return {"user_id": user_id, "days": planner.run_week(weekdays)}
+    finally:
+        planner.close()
+
+
+def summarize(results: list, errors: dict, wall_s: float, writer_stats: dict) -> dict:
+    """汇总吞吐、每天延迟分布与冲突情况。"""
+    per_day: dict[str, dict] = {}
+    users_with_conflicts = 0
+    total_days = 0
+    for result in results:
+        had_conflict = False
+        for day in result["days"]:
+            total_days += 1
+            d = per_day.setdefault(day["day"], {
+                "latencies": [], "ttft": [], "first_task": [], "conflicts": 0, "users_with_conflicts": 0, "unparsed": 0,
+                "repaired": 0, "unplaced": 0,
+            })
+            d["repaired"] += day.get("repaired", 0)
+            d["unplaced"] += day.get("unplaced", 0)
+            d["latencies"].append(day["latency_ms"])
+            if "ttft_ms" in day:
+                d["ttft"].append(day["ttft_ms"])
+            if "first_task_ms" in day:
+                d["first_task"].append(day["first_task_ms"])
+            d["conflicts"] += day["conflicts"]
+            if day["conflicts"]:
+                d["users_with_conflicts"] += 1
+                had_conflict = True
+            if not day["parsed"]:
+                d["unparsed"] += 1
+        users_with_conflicts += had_conflict
+
+    days_out = {}
+    for name, d in per_day.items():
+        days_out[name] = {
+            "runs": len(d["latencies"]),
+            "latency_ms": summarize_latencies(d["latencies"]),
+            **({"ttft_ms": summarize_latencies(d["ttft"])} if d["ttft"] else {}),
+            **({"first_task_ms": summarize_latencies(d["first_task"])} if d["first_task"] else {}),
+            "conflicts": d["conflicts"],
+            "users_with_conflicts": d["users_with_conflicts"],
+            "unparsed": d["unparsed"],
+            "repaired": d["repaired"],
+            "unplaced": d["unplaced"],
+        }
+    # 全部用户、全部天数的计划时段一次扫描，找出计划之间（含跨午夜）的重叠
+    check_start = time.perf_counter()
+    all_slots = [s for result in results for day in result["days"] for s in day.pop("slots", [])]
+    bulk = summarize_conflicts(find_conflicts(all_slots))
+    bulk["slots"] = len(all_slots)
+    bulk["check_ms"] = round((time.perf_counter() - check_start) * 1000, 2)
+
+    users = len(results) + sum(errors.values())
+    return {
+        "users": users,
+        "succeeded": len(results),
+        "failed": sum(errors.values()),
+        "errors": errors,
+        "wall_s": round(wall_s, 3),
+        "throughput": {
+            "users_per_s": round(len(results) / wall_s, 3) if wall_s else 0.0,
+            "days_per_s": round(total_days / wall_s, 3) if wall_s else 0.0,
+        },
+        "per_day": days_out,
+        "conflicts": {
+            "total": sum(d["conflicts"] for d in days_out.values()),
+            "users_with_conflicts": users_with_conflicts,
+            "plan_overlaps": bulk,
+        },
+        "memory_writer": writer_stats,
+    }
+
+
+def simulate(
+    users: int,
+    concurrency: int,
+    user_prefix: str = "sim_user",
+    weekdays=None,
+    progress: bool = True,
+    stream: bool = False,
+) -> dict:
+    """以至多 `concurrency` 个线程并行模拟 `users` 个用户，返回汇总报告。"""
+    from demo import WEEKDAYS
+    from llm_client import get_openai_client, get_openai_model
+    from memory_writer import MemoryWriteBehind
+    from local_index import LocalMemoryIndex
+    from memos_client import MemOSTenantClient
+    from plan_store import PlanStore
+    from prefetch import MemoryPrefetcher
+
+    weekdays = weekdays or WEEKDAYS
+    model = get_openai_model()
+    client = get_openai_client(model=model)
+    writer = MemoryWriteBehind(max_queue=max(1000, users * 2))
+    prefetcher = MemoryPrefetcher(writer, max_workers=concurrency)
+    tenant = MemOSTenantClient(local_index=LocalMemoryIndex.from_env())
+    store = PlanStore.from_env()
+
+    results, errors = [], {}
+    start = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sim-user") as pool:
+            futures = [
+                pool.submit(run_user, f"{user_prefix}_{i}", client, model, writer, weekdays, prefetcher, stream, tenant, store)
+                for i in range(users)
+            ]
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    key = type(e).__name__
+                    errors[key] = errors.get(key, 0) + 1
+                if progress and (done % max(1, users // 10) == 0 or done == users):
+                    print(f"… 已完成 {done}/{users} 个用户（失败 {sum(errors.values())}）", file=sys.stderr)
+    finally:
+        prefetcher.close()
+        writer.close()
+        tenant.close()
+    report = summarize(results, errors, time.perf_counter() - start, writer.stats())
+    report["prefetch"] = prefetcher.stats()
+    if tenant.local_index is not None:
+        report["local_index"] = tenant.local_index.stats()
+    report["memos_resilience"] = tenant.resilience_stats()
+    if store is not None:
+        try:
+            report["plan_store"] = _plan_store_report(store, results)
+        finally:
+            store.close()
+    return report
+
+
+def _plan_store_report(store, results: list) -> dict:
+    """计划库写入量，以及从本地库回答"某用户这周的计划汇总"所需的耗时。"""
+    out = store.stats()
+    if results:
+        user_id = results[0]["user_id"]
+        start = time.perf_counter()
+        summary = store.summary(user_id)
+        out["summary_query_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        out["summary_sample"] = {"user_id": user_id, "days": summary["days"], "tasks": summary["tasks"]}
+    return out
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="多用户并行一周规划模拟")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--user-prefix", default="sim_user")
+    parser.add_argument("--offline", action="store_true", help="启动本地假 MemOS 与桩模型服务")
+    parser.add_argument("--stream", action="store_true", help="流式调用模型并增量解析计划")
+    parser.add_argument("--llm-latency-ms", type=float, default=500.0, help="离线模式下桩模型的延迟")
+    parser.add_argument("--memos-latency-ms", type=float, default=20.0, help="离线模式下假 MemOS 的延迟")
+    parser.add_argument("--output", default=None, help="JSON 报告输出路径，默认打印到标准输出")
+    args = parser.parse_args(argv)
+
+    with ExitStack() as stack:
+        if args.offline:
+            from benchmarks.servers import running_server
+
+            memos_url = stack.enter_context(running_server(
+                "fake_memos:create_app",
+                env={"FAKE_MEMOS_LATENCY_MS": str(args.memos_latency_ms)},
+                factory=True,
+            ))
+            llm_url = stack.enter_context(running_server(
+                "benchmarks.servers:create_fake_openai_app",
+                env={"FAKE_OPENAI_LATENCY_MS": str(args.llm_latency_ms), "FAKE_OPENAI_REPLY": "plan"},
+                factory=True,
+            ))
+            os.environ.update({
+                "MEMOS_BASE_URL": memos_url,
+                "OPENAI_API_BASE": f"{llm_url}/v1",
+                "OPENAI_API_KEY": "offline",
+            })
+        report = simulate(args.users, args.concurrency, args.user_prefix, stream=args.stream)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0 if not report["failed"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+singleflight.py
+
+通俗说明：
+- 请求合并（single-flight）：同一个键上同时进行中的相同调用只真正发出一次，
+  其余调用等待这一次的结果，成功时共享结果，失败时抛出同一个异常。
+- 调用结束后键立即释放，之后的调用会重新发起（这里不做缓存，缓存见 memory_cache / completion_cache）。
+- `SingleFlight` 用于线程场景（同步 `MemOSClient`）；`AsyncSingleFlight` 用于协程场景（`AsyncMemOSClient`、api_server）。
+- 异步版的取消语义：某个等待者被取消只影响它自己；只有全部等待者都取消时，才取消底层的那次调用。
+- 可传入 `clone`（如 `copy.deepcopy`）：跟随者拿到结果副本，避免多个调用方修改同一个对象。
+"""
+
+import asyncio
+import threading
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: BaseException | None = None
+
+
+class SingleFlight:
+    """线程版请求合并。"""
+
+    def __init__(self, clone=None):
+        self.clone = clone
+        self._lock = threading.Lock()
+        self._calls: dict = {}
+        self._stats = {"calls": 0, "shared": 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        """执行 `fn(*args, **kwargs)`，同键的并发调用只执行一次；返回 (结果, 是否为共享结果)。"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self._stats["calls"] += 1
+            else:
+                self._stats["shared"] += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return (self.clone(call.result) if self.clone else call.result), True
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "inflight": len(self._calls)}
+
+
+class _AsyncCall:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class AsyncSingleFlight:
+    """协程版请求合并；需在同一个事件循环内使用。"""
+
+    def __init__(self, clone=None):
+        self.clone = clone
+        self._calls: dict = {}
+        self._stats = {"calls": 0, "shared": 0, "cancelled": 0}
+
+    async def do(self, key, fn, *args, **kwargs):
+        """等待 `await fn(*args, **kwargs)`，同键的并发调用只执行一次；返回 (结果, 是否为共享结果)。"""
+        call = self._calls.get(key)
+        leader = call is None
+        if leader:
+            call = self._calls[key] = _AsyncCall(asyncio.ensure_future(fn(*args, **kwargs)))
+            self._stats["calls"] += 1
+            call.task.add_done_callback(lambda _t, k=key, c=call: self._release(k, c))
+        else:
+            self._stats["shared"] += 1
+        call.waiters += 1
+        try:
+            # shield：单个等待者被取消时不连带取消共享的调用
+            result = await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            if not call.task.done():
+                call.waiters -= 1
+                if call.waiters == 0:
+                    # 已没有人需要这个结果
+                    call.task.cancel()
+                    self._stats["cancelled"] += 1
+            raise
+        if not leader and self.clone:
+            result = self.clone(result)
+        return result, not leader
+
+    def _release(self, key, call: _AsyncCall):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        # 全部等待者已取消时读取一次异常，避免 "exception was never retrieved" 警告
+        if not call.task.cancelled():
+            call.task.exception()
+
+    def stats(self) -> dict:
+        return {**self._stats, "inflight": len(self._calls)}
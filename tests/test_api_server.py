@@ -0,0 +1,92 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+import api_server
+from completion_cache import CompletionCache
+from concurrency import ConcurrencyLimiter
+from singleflight import AsyncSingleFlight
+
+
+class _SlowClient:
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model, messages, **sampling):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="好的"))], usage=None)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    client = _SlowClient()
+    monkeypatch.setattr(api_server, "get_async_openai_client", lambda model=None: client)
+    monkeypatch.setattr(api_server, "get_openai_model", lambda: "fake")
+    monkeypatch.setattr(api_server, "completion_cache", None)
+    monkeypatch.setattr(api_server, "chat_flights", AsyncSingleFlight())
+    monkeypatch.setattr(api_server, "limiter", ConcurrencyLimiter(per_user=1))
+    return client
+
+
+def _req(user_id):
+    return api_server.ChatRequest(prompt="安排明天的学习", user_id=user_id, temperature=0)
+
+
+def test_same_prompt_from_two_users_keeps_per_user_limits(server):
+    async def scenario():
+        busy = asyncio.ensure_future(api_server.chat(_req("a")))
+        await asyncio.sleep(0.01)
+        # a 已到单用户上限：a 的第二个请求被拒，b 不受影响并与 a 的首个请求共享模型调用
+        results = await asyncio.gather(
+            api_server.chat(_req("a")), api_server.chat(_req("b")), return_exceptions=True
+        )
+        return await busy, results
+
+    first, (rejected, other) = asyncio.run(scenario())
+    assert isinstance(rejected, HTTPException) and rejected.status_code == 429
+    assert other["content"] == "好的" and other["coalesced"]
+    assert first["content"] == "好的" and not first["coalesced"]
+    assert server.calls == 1
+
+
+def test_leader_rejection_does_not_reach_followers(server):
+    async def scenario():
+        hold = api_server.limiter.acquire("a")
+        await hold.__aenter__()
+        try:
+            # a 自身超限先被拒；同一提示词的 b 照常拿到回复
+            return await asyncio.gather(
+                api_server.chat(_req("a")), api_server.chat(_req("b")), return_exceptions=True
+            )
+        finally:
+            await hold.__aexit__(None, None, None)
+
+    rejected, ok = asyncio.run(scenario())
+    assert isinstance(rejected, HTTPException) and rejected.status_code == 429
+    assert ok["content"] == "好的"
+
+
+def test_disk_cache_runs_off_loop_and_closes_on_shutdown(server, monkeypatch, tmp_path):
+    cache = CompletionCache(path=str(tmp_path / "completions.db"))
+    monkeypatch.setattr(api_server, "completion_cache", cache)
+    threads = []
+    get, put = cache.get, cache.put
+    monkeypatch.setattr(cache, "get", lambda *a: threads.append(threading.get_ident()) or get(*a))
+    monkeypatch.setattr(cache, "put", lambda *a: threads.append(threading.get_ident()) or put(*a))
+
+    async def scenario():
+        async with api_server.lifespan(api_server.app):
+            first = await api_server.chat(_req("a"))
+            second = await api_server.chat(_req("a"))
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert not first["cached"] and second["cached"]
+    assert server.calls == 1
+    assert len(threads) == 3 and threading.get_ident() not in threads
+    assert not cache.persistent
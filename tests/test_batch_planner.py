@@ -0,0 +1,33 @@
+import asyncio
+from types import SimpleNamespace
+
+from batch_planner import BatchPlanner
+
+
+class _FakeClient:
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, model, messages):
+        self.calls += 1
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="今天按原计划执行。"))])
+
+
+def test_llm_slot_is_released_while_waiting_for_the_consumer():
+    client = _FakeClient()
+    planner = BatchPlanner(client=client, model="fake", concurrency=1, memory_concurrency=1)
+    items = [{"user_id": f"u{i}", "day": "周一", "instruction": "安排学习"} for i in range(20)]
+
+    async def scenario():
+        results = planner.run(items)
+        first = await results.__anext__()
+        # 调用方暂不消费：结果队列（容量 4）填满后，两个协程都应已调用完模型、只在等队列
+        await asyncio.sleep(0.1)
+        calls = client.calls
+        await results.aclose()  # 提前关闭也不能让后台协程卡在已满的队列上
+        return first, calls
+
+    first, calls = asyncio.run(scenario())
+    assert first["ok"]
+    assert calls == 7
@@ -0,0 +1,30 @@
+from completion_cache import CompletionCache, is_deterministic
+
+MESSAGES = [{"role": "user", "content": "帮我安排明天上午的学习计划"}]
+
+
+def test_only_explicit_temperature_zero_is_deterministic():
+    assert is_deterministic({"temperature": 0})
+    assert is_deterministic({"temperature": 0.0})
+    assert not is_deterministic(None)
+    assert not is_deterministic({})
+    assert not is_deterministic({"temperature": 0.7})
+
+
+def test_unset_temperature_is_never_cached():
+    cache = CompletionCache()
+    assert not cache.put("m", MESSAGES, {"content": "a"})
+    assert cache.get("m", MESSAGES) is None
+    assert cache.put("m", MESSAGES, {"content": "b"}, {"temperature": 0})
+    assert cache.get("m", MESSAGES, {"temperature": 0}) == {"content": "b"}
+    assert cache.get("m", MESSAGES) is None
+    assert cache.stats()["skipped"] >= 2
+
+
+def test_chat_coalesces_only_explicit_temperature_zero():
+    import api_server
+    from api_server import ChatRequest
+
+    assert not api_server._coalescable(ChatRequest(prompt="hi"))
+    assert not api_server._coalescable(ChatRequest(prompt="hi", temperature=0.7))
+    assert api_server._coalescable(ChatRequest(prompt="hi", temperature=0)) == (api_server.chat_flights is not None)
@@ -0,0 +1,90 @@
+import asyncio
+import time
+
+import pytest
+
+from concurrency import ConcurrencyLimiter, ConcurrencyRejected
+
+
+async def _enter(limiter: ConcurrencyLimiter, user_id: str | None):
+    async with limiter.acquire(user_id):
+        pass
+
+
+def test_user_over_limit_is_rejected_without_waiting():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_concurrency=8, per_user=1, queue_timeout=5)
+        async with limiter.acquire("u1"):
+            start = time.perf_counter()
+            with pytest.raises(ConcurrencyRejected) as exc:
+                await _enter(limiter, "u1")
+            waited = time.perf_counter() - start
+            # 其他用户不受影响
+            await _enter(limiter, "u2")
+        return limiter, exc.value, waited
+
+    limiter, err, waited = asyncio.run(scenario())
+    assert err.reason == "user"
+    assert waited < 0.5
+    assert limiter.rejected == {"user": 1, "global": 0}
+    assert limiter.stats()["active_users"] == 0
+
+
+def test_global_queue_times_out_and_releases_user_slot():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_concurrency=1, per_user=1, queue_timeout=0.05)
+        async with limiter.acquire("u1"):
+            with pytest.raises(ConcurrencyRejected) as exc:
+                await _enter(limiter, "u2")
+            assert limiter.stats()["waiting"] == 0
+        # 超时后 u2 的用户名额已归还，全局名额空出后可以正常进入
+        await _enter(limiter, "u2")
+        return limiter, exc.value
+
+    limiter, err = asyncio.run(scenario())
+    assert err.reason == "global"
+    assert limiter.rejected == {"user": 0, "global": 1}
+    assert limiter.stats()["active_users"] == 0
+
+
+def test_full_queue_is_rejected_immediately():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_concurrency=1, per_user=4, queue_timeout=5, max_queue=0)
+        async with limiter.acquire("u1"):
+            with pytest.raises(ConcurrencyRejected) as exc:
+                await asyncio.wait_for(_enter(limiter, "u2"), 0.5)
+        return exc.value
+
+    assert asyncio.run(scenario()).reason == "global"
+
+
+def test_cancelled_holder_and_waiter_release_their_slots():
+    async def scenario():
+        limiter = ConcurrencyLimiter(max_concurrency=1, per_user=1, queue_timeout=5)
+        holding = asyncio.Event()
+
+        async def hold():
+            async with limiter.acquire("u1"):
+                holding.set()
+                await asyncio.sleep(10)
+
+        holder = asyncio.create_task(hold())
+        await holding.wait()
+        waiter = asyncio.create_task(_enter(limiter, "u2"))
+        await asyncio.sleep(0.01)
+        assert limiter.stats()["waiting"] == 1
+
+        waiter.cancel()
+        holder.cancel()
+        for task in (waiter, holder):
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+        stats = limiter.stats()
+        assert stats["waiting"] == 0 and stats["active_users"] == 0
+        # 两个名额都已归还：同一用户可以再次进入，且无需排队
+        async with limiter.acquire("u1") as waited_ms:
+            assert waited_ms < 100
+        return limiter
+
+    assert asyncio.run(scenario()).rejected == {"user": 0, "global": 0}
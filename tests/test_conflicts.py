@@ -0,0 +1,80 @@
+import random
+from collections import Counter
+from itertools import combinations
+
+import pytest
+
+from conflicts import COMMITMENT, PLAN, ConflictTracker, Slot, _reportable, find_conflicts
+
+TITLES = ["晨会", "学习政治", "学习英语", "客户电话"]
+
+
+def _random_slots(rng: random.Random, n: int) -> list[Slot]:
+    pool = []
+    for _ in range(n):
+        # 半小时粒度：大量首尾相接、开始时间相同的时段；结束早于开始即跨过午夜
+        start = rng.randrange(0, 48) * 30
+        end = (start + rng.choice([0, 30, 60, 90, 120, 240])) % 1440
+        start_hm, end_hm = f"{start // 60:02d}:{start % 60:02d}", f"{end // 60:02d}:{end % 60:02d}"
+        slot = Slot.on(rng.randrange(3), start_hm, end_hm, rng.choice(TITLES),
+                       rng.choice([PLAN, COMMITMENT]), rng.choice(["u1", "u2"]))
+        if rng.random() < 0.1:
+            slot = Slot(slot.start, slot.start, slot.title, slot.kind, slot.user_id)  # 零长度
+        pool.append(slot)
+        if rng.random() < 0.15:
+            pool.append(slot)  # 完全相同的重复时段
+    return pool
+
+
+def _naive(slots, plan_vs_plan):
+    found = []
+    for x, y in combinations(slots, 2):
+        if x.user_id != y.user_id or x.end <= x.start or y.end <= y.start:
+            continue
+        if x.start < y.end and y.start < x.end and _reportable(x, y, plan_vs_plan):
+            found.append((x, y))
+    return found
+
+
+def _pairs(pairs) -> Counter:
+    key = lambda s: (s.start, s.end, s.title, s.kind, s.user_id)
+    return Counter(tuple(sorted(pair, key=key)) for pair in pairs)
+
+
+@pytest.mark.parametrize("seed", range(200))
+@pytest.mark.parametrize("plan_vs_plan", [True, False])
+def test_sweep_line_matches_naive(seed, plan_vs_plan):
+    rng = random.Random(seed)
+    slots = _random_slots(rng, rng.randrange(1, 40))
+    expected = _pairs(_naive(slots, plan_vs_plan))
+
+    conflicts = find_conflicts(slots, plan_vs_plan=plan_vs_plan)
+    assert _pairs((c.a, c.b) for c in conflicts) == expected
+    assert all((c.a.start, c.a.end) <= (c.b.start, c.b.end) for c in conflicts)
+
+    tracker = ConflictTracker(plan_vs_plan=plan_vs_plan)
+    rng.shuffle(slots)
+    online = tracker.extend(slots)
+    assert _pairs((c.a, c.b) for c in online) == expected
+    assert online == tracker.conflicts
+
+
+def test_touching_slots_do_not_conflict():
+    a = Slot.on(0, "09:00", "10:00", "学习政治")
+    b = Slot.on(0, "10:00", "11:00", "晨会", COMMITMENT)
+    assert find_conflicts([a, b]) == []
+    assert ConflictTracker().extend([b, a]) == []
+
+
+def test_slot_crossing_midnight_conflicts_with_next_day():
+    late = Slot.on(0, "23:00", "01:00", "学习英语")
+    early = Slot.on(1, "00:30", "02:00", "晨会", COMMITMENT)
+    [conflict] = find_conflicts([early, late])
+    assert (conflict.a, conflict.b) == (late, early)
+    assert conflict.overlap_minutes == 30
+
+
+def test_copied_commitment_is_not_reported():
+    commitment = Slot.on(0, "09:30", "10:00", "晨会", COMMITMENT)
+    copied = Slot.on(0, "09:30", "10:00", "晨会 ")
+    assert find_conflicts([commitment, copied]) == []
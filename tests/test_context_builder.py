@@ -0,0 +1,31 @@
+from context_builder import ContextAssembler, count_tokens
+
+
+def _turn(day: str, reply: str) -> list:
+    return [{"role": "user", "content": f"{day}的安排"}, {"role": "assistant", "content": reply}]
+
+
+def test_oversized_last_turn_is_truncated_not_dropped():
+    assembler = ContextAssembler(history_budget=200)
+    history = _turn("周一", "晨练后学习政治。") + _turn("周二", "计划" * 500)
+    kept, report = assembler.trim_history(history)
+    assert kept, "最近一轮不应被整段丢弃"
+    assert kept[-2]["content"] == "周二的安排"
+    assert kept[-1]["role"] == "assistant" and kept[-1]["content"].startswith("计划")
+    assert report["history_tokens_kept"] <= 200
+    assert sum(count_tokens(m["content"]) for m in kept) == report["history_tokens_kept"]
+    assert report["history_tokens_dropped"] > 0
+
+
+def test_oversized_older_turn_is_skipped_and_earlier_turns_kept():
+    assembler = ContextAssembler(history_budget=200)
+    history = _turn("周一", "晨练后学习政治。") + _turn("周二", "计划" * 500) + _turn("周三", "复盘笔记。")
+    kept, _ = assembler.trim_history(history)
+    assert [m["content"] for m in kept if m["role"] == "user"] == ["周一的安排", "周三的安排"]
+
+
+def test_history_within_budget_is_kept_verbatim():
+    history = _turn("周一", "晨练。") + _turn("周二", "学习英语。")
+    kept, report = ContextAssembler().trim_history(history)
+    assert kept == history
+    assert report["history_tokens_dropped"] == 0
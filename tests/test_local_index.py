@@ -0,0 +1,53 @@
+import pytest
+
+from local_index import LocalMemoryIndex
+
+MEMORIES = [
+    "每个工作日早上9:30到10:00有晨会",
+    "每周三10:00到11:00有团队例会",
+    "每天12:00到12:30有客户电话沟通",
+    "我的长期目标是每天学习2小时，准备政治和英语",
+]
+
+
+@pytest.fixture
+def index():
+    ix = LocalMemoryIndex()
+    ix.add_results("u1", {"code": 0, "data": {"memory_detail_list": [{"memory_value": m} for m in MEMORIES]}})
+    return ix
+
+
+def test_well_covered_query_is_answered_locally(index):
+    result = index.search("u1", "团队例会")
+    assert result["source"] == "local_index"
+    assert result["confidence"] >= index.min_coverage
+    assert result["data"]["memory_detail_list"][0]["memory_value"] == "每周三10:00到11:00有团队例会"
+
+
+def test_unknown_query_terms_fall_through_to_memos(index):
+    # "改期" 本地从未出现过：即使其余词都能命中，也不能本地作答
+    assert index.search("u1", "团队例会改期") is None
+    assert index.search("u1", "明天去看牙医") is None
+    assert index.stats()["low_confidence"] == 2
+
+
+def test_coverage_threshold_is_the_gate(index):
+    index.min_coverage = 1.01
+    assert index.search("u1", "团队例会") is None
+
+
+def test_unsynced_user_is_cold():
+    ix = LocalMemoryIndex()
+    ix.add_messages("u1", [{"role": "user", "content": m} for m in MEMORIES])
+    assert ix.search("u1", "团队例会") is None
+    assert ix.stats()["cold"] == 1
+
+
+def test_add_messages_indexes_only_user_turns():
+    ix = LocalMemoryIndex()
+    added = ix.add_messages("u1", [
+        {"role": "user", "content": "每周三10:00到11:00有团队例会"},
+        {"role": "assistant", "content": "好的，已为你安排如下：\nBEGIN_PLAN_UPDATE\n{...}\nEND_PLAN_UPDATE"},
+    ])
+    assert added == 1
+    assert ix.stats()["docs"] == 1
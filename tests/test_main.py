@@ -0,0 +1,36 @@
+from datetime import date
+
+from main import _save_plan
+from plan_store import PlanStore
+
+REPLY = (
+    "今天以复习为主。\n"
+    "BEGIN_PLAN_UPDATE\n"
+    '{"today": {"tasks": [{"time": "09:00-11:00", "activity": "复习", "priority": "高"}]}}\n'
+    "END_PLAN_UPDATE\n"
+)
+
+
+def test_plan_replies_feed_the_summary(tmp_path):
+    store = PlanStore(str(tmp_path / "plans.db"))
+    try:
+        assert _save_plan(store, "u1", "好的，没有计划变化。") is None
+        assert _save_plan(store, "u1", REPLY) is not None
+        today = date.today().isoformat()
+        summary = store.summary("u1", today, today)
+        assert summary["tasks"] == 1
+    finally:
+        store.close()
+
+
+def test_plan_copying_the_prompt_example_date_is_stored_under_today(tmp_path):
+    # 提示词示例里的日期是固定的 2025-11-07，模型常原样照抄
+    reply = REPLY.replace('{"today"', '{"date": "2025-11-07", "today"')
+    store = PlanStore(str(tmp_path / "plans.db"))
+    try:
+        _save_plan(store, "u1", reply)
+        today = date.today().isoformat()
+        assert store.summary("u1", today, today)["tasks"] == 1
+        assert store.summary("u1", "2025-11-07", "2025-11-07")["tasks"] == 0
+    finally:
+        store.close()
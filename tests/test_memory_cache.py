@@ -0,0 +1,55 @@
+import threading
+
+from memory_cache import SearchResultCache, WriteGenerations
+
+
+def test_concurrent_bumps_are_not_lost():
+    gens = WriteGenerations()
+    seen = []
+    lock = threading.Lock()
+
+    def writer():
+        for _ in range(500):
+            value = gens.bump("u1")
+            with lock:
+                seen.append(value)
+
+    threads = [threading.Thread(target=writer) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(set(seen)) == len(seen) == 4000
+    assert gens.get("u1") == max(seen)
+
+
+def test_generations_are_bounded_and_eviction_stays_safe():
+    gens = WriteGenerations(max_users=2)
+    before = gens.get("u1")
+    gens.bump("u1")
+    gens.bump("u2")
+    gens.bump("u3")
+    assert len(gens) == 2
+    # u1 已被淘汰，但代数不会回到写入前读到的值
+    assert gens.get("u1") != before
+
+
+def test_search_cache_rejects_put_after_write_even_when_evicted():
+    cache = SearchResultCache(max_entries=1)
+    generation = cache.generation("u1")
+    cache.invalidate("u1")
+    for i in range(5):
+        cache.invalidate(f"other-{i}")
+    assert not cache.put("u1", "本周计划", {"memories": []}, generation=generation)
+    assert cache.put("u1", "本周计划", {"memories": []}, generation=cache.generation("u1"))
+
+
+def test_search_cache_clear_rejects_puts_started_before_it():
+    cache = SearchResultCache()
+    cache.invalidate("u1")
+    before = {u: cache.generation(u) for u in ("u1", "u2")}
+    cache.clear()
+    for user_id, generation in before.items():
+        assert not cache.put(user_id, "本周计划", {"memories": []}, generation=generation)
+        assert cache.put(user_id, "本周计划", {"memories": []}, generation=cache.generation(user_id))
+    assert cache.stats()["entries"] == 2
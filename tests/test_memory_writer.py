@@ -0,0 +1,95 @@
+import threading
+import time
+
+from memory_writer import MemoryWriteBehind
+
+
+class _SlowClient:
+    """按写完的先后记录各批；第一次调用写得很慢。"""
+
+    def __init__(self, user_id="u1", first_delay=0.2):
+        self.user_id = user_id
+        self.first_delay = first_delay
+        self.calls = 0
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def add_conversation(self, messages):
+        with self.lock:
+            self.calls += 1
+            first = self.calls == 1
+        if first:
+            time.sleep(self.first_delay)
+        with self.lock:
+            self.batches.append([m["content"] for m in messages])
+
+
+def _msg(text):
+    return [{"role": "user", "content": text}]
+
+
+def test_user_flush_respects_timeout():
+    client = _SlowClient(first_delay=0.5)
+    writer = MemoryWriteBehind(max_age=60)
+    try:
+        writer.submit(client, _msg("a"))
+        start = time.monotonic()
+        assert writer.flush(timeout=0.1, user_id="u1") is False
+        assert time.monotonic() - start < 0.3
+        assert writer.flush(timeout=2, user_id="u1") is True
+    finally:
+        writer.close()
+
+
+def test_user_flush_and_background_flush_keep_order():
+    client = _SlowClient(first_delay=0.2)
+    writer = MemoryWriteBehind(batch_size=2, max_age=60)
+    try:
+        writer.submit(client, _msg("a"))
+        done = threading.Thread(target=writer.flush, kwargs={"timeout": 2, "user_id": "u1"})
+        done.start()
+        time.sleep(0.05)
+        # 第一批还在写，后台按 batch_size 触发的第二批必须排在它之后
+        writer.submit(client, _msg("b") + _msg("c"))
+        done.join()
+        assert writer.flush(timeout=2)
+        assert client.batches == [["a"], ["b", "c"]]
+    finally:
+        writer.close()
+
+
+def test_queued_user_write_does_not_block_other_users():
+    slow = _SlowClient("u1", first_delay=0.5)
+    fast = _SlowClient("u2", first_delay=0)
+    writer = MemoryWriteBehind(max_age=60)
+    try:
+        writer.submit(slow, _msg("a"))
+        assert writer.flush(timeout=0.05, user_id="u1") is False   # 第一批正在慢慢写
+        writer.submit(slow, _msg("b"))
+        threading.Thread(target=writer.flush, kwargs={"timeout": 2, "user_id": "u1"}).start()
+        time.sleep(0.05)
+        # u1 的第二批排在第一批之后，后台线程不等它，u2 照常写出
+        writer.submit(fast, _msg("x"))
+        start = time.monotonic()
+        assert writer.flush(timeout=1, user_id="u2") is True
+        assert time.monotonic() - start < 0.3
+        assert writer.flush(timeout=2)
+        assert slow.batches == [["a"], ["b"]]
+        assert fast.batches == [["x"]]
+    finally:
+        writer.close()
+
+
+def test_failed_write_is_counted_not_printed(capsys):
+    class _Broken:
+        user_id = "u1"
+
+        def add_conversation(self, messages):
+            raise RuntimeError("boom")
+
+    with MemoryWriteBehind(max_age=60) as writer:
+        writer.submit(_Broken(), _msg("a"))
+        assert writer.flush(timeout=2)
+        assert writer.stats()["failed"] == 1
+        assert writer.last_error == "boom"
+    assert capsys.readouterr().out == ""
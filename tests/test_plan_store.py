@@ -0,0 +1,62 @@
+from datetime import date
+
+import pytest
+
+from plan_store import PlanStore, resolve_date
+
+TODAY = date(2025, 11, 7)  # 周五
+
+
+def test_resolve_date_prefers_explicit_then_plan_then_commitments():
+    plan = {"date": "2025-11-04", "commitments": [{"time_range": "2025-11-06T09:30-10:00"}]}
+    assert resolve_date(None, plan, date="2025-11-05", today=TODAY) == "2025-11-05"
+    assert resolve_date(None, plan, today=TODAY) == "2025-11-04"
+    assert resolve_date(None, {"commitments": plan["commitments"]}, today=TODAY) == "2025-11-06"
+    assert resolve_date("2025-11-03", {}, today=TODAY) == "2025-11-03"
+    assert resolve_date(None, None, today=TODAY) == "2025-11-07"
+
+
+def test_resolve_date_aligns_weekday_name_within_the_same_week():
+    assert resolve_date("周一", {"date": "2025-11-07"}) == "2025-11-03"
+    assert resolve_date("sunday", None, date="2025-11-05") == "2025-11-09"
+    assert resolve_date("星期五", None, date="2025-11-07") == "2025-11-07"
+    assert resolve_date("周三", None, today=TODAY) == "2025-11-05"
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = PlanStore(str(tmp_path / "plans.db"))
+    yield s
+    s.close()
+
+
+def _plan(*tasks, commitments=()):
+    return {
+        "today": {"tasks": [{"time": t, "activity": a} for t, a in tasks]},
+        "commitments": [{"time_range": tr, "title": "晨会"} for tr in commitments],
+    }
+
+
+def test_summary_over_date_range(store):
+    store.save_plans([
+        {"user_id": "u1", "day": "周一", "date": "2025-11-03",
+         "plan_json": _plan(("08:00-10:00", "政治"), ("10:00-11:00", "英语"), commitments=["09:00-09:30"])},
+        {"user_id": "u1", "day": "周二", "date": "2025-11-04", "plan_json": _plan(("08:00-09:00", "政治"))},
+        # 同一天重新规划：只统计最新一份
+        {"user_id": "u1", "day": "周二", "date": "2025-11-04",
+         "plan_json": _plan(("08:00-09:30", "英语"), ("23:00-00:30", "政治"))},
+        {"user_id": "u1", "day": "周五", "date": "2025-11-07", "plan_json": _plan(("08:00-12:00", "政治"))},
+        {"user_id": "u2", "day": "周一", "date": "2025-11-03", "plan_json": _plan(("08:00-12:00", "政治"))},
+    ])
+
+    out = store.summary("u1", "2025-11-03", "2025-11-04")
+    assert (out["days"], out["tasks"], out["minutes"]) == (2, 4, 360)
+    assert out["by_day"] == {
+        "2025-11-03": {"tasks": 2, "minutes": 180},
+        "2025-11-04": {"tasks": 2, "minutes": 180},
+    }
+    assert out["by_activity"] == {"政治": {"count": 2, "minutes": 210}, "英语": {"count": 2, "minutes": 150}}
+    assert list(out["by_activity"]) == ["政治", "英语"]
+
+    assert store.summary("u1")["days"] == 3
+    assert store.summary("u1", "2025-11-05", "2025-11-06")["tasks"] == 0
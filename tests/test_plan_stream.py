@@ -0,0 +1,125 @@
+import json
+
+import pytest
+
+from plan_stream import BEGIN, END, PlanUpdateStreamParser, parse_plan_update
+
+PLAN = {
+    "date": "2025-11-07",
+    "today": {
+        "summary": "含花括号 {和} 以及 [方括号] 的说明，还有转义引号 \"重点\" 与反斜杠 \\",
+        "tasks": [
+            {"time": "08:00-09:00", "activity": "学习政治", "priority": "高", "note": "读 \"{第一章}\""},
+            {"time": "09:30-10:00", "activity": "晨会", "priority": "高", "tags": ["固定", {"x": 1}]},
+        ],
+    },
+    "commitments": [{"title": "晨会", "time_range": "2025-11-07T09:30-10:00"}],
+}
+ANALYSIS = "先复习政治，晨会前后不安排高强度任务。\n"
+REPLY = f"{ANALYSIS}{BEGIN}\n```json\n{json.dumps(PLAN, ensure_ascii=False, indent=2)}\n```\n{END}\n"
+
+
+def _stream(text: str, cuts) -> tuple[PlanUpdateStreamParser, list]:
+    parser, events, last = PlanUpdateStreamParser(), [], 0
+    for cut in list(cuts) + [len(text)]:
+        events += parser.feed(text[last:cut])
+        last = cut
+    parser.close()
+    return parser, events
+
+
+def _summary(parser: PlanUpdateStreamParser):
+    return parser.plan, parser.analysis, parser.tasks, parser.commitments, parser.error
+
+
+def _assert_matches_one_shot(text: str, parser: PlanUpdateStreamParser):
+    plan, analysis, one_shot = parse_plan_update(text)
+    assert _summary(parser) == _summary(one_shot)
+    assert (plan, analysis) == (parser.plan, parser.analysis or "")
+
+
+def test_full_reply_parses():
+    plan, analysis, parser = parse_plan_update(REPLY)
+    assert plan == PLAN
+    assert analysis == ANALYSIS
+    assert parser.tasks == PLAN["today"]["tasks"]
+    assert parser.commitments == PLAN["commitments"]
+    assert parser.error is None
+
+
+@pytest.mark.parametrize("cut", range(len(ANALYSIS) - 2, len(ANALYSIS) + len(BEGIN) + 2))
+def test_split_inside_begin_marker(cut):
+    parser, events = _stream(REPLY, [cut])
+    assert events[0] == ("analysis", ANALYSIS)
+    _assert_matches_one_shot(REPLY, parser)
+
+
+def test_every_two_chunk_split_matches_one_shot():
+    for cut in range(1, len(REPLY)):
+        parser, _ = _stream(REPLY, [cut])
+        assert parser.plan == PLAN, cut
+        _assert_matches_one_shot(REPLY, parser)
+
+
+def test_char_by_char_emits_items_in_order():
+    parser, events = _stream(REPLY, range(1, len(REPLY)))
+    kinds = [kind for kind, _ in events]
+    assert kinds == ["analysis", "task", "task", "commitment"]
+    assert [item for kind, item in events if kind == "task"] == PLAN["today"]["tasks"]
+    _assert_matches_one_shot(REPLY, parser)
+
+
+def test_items_are_emitted_before_the_block_ends():
+    head = REPLY[:REPLY.index('"09:30-10:00"')]
+    parser = PlanUpdateStreamParser()
+    events = parser.feed(head)
+    assert [kind for kind, _ in events] == ["analysis", "task"]
+
+
+def test_missing_end_marker_still_parses_complete_json():
+    text = REPLY[:REPLY.index(END)]
+    parser, _ = _stream(text, range(7, len(text), 7))
+    assert parser.plan == PLAN and parser.error is None
+    _assert_matches_one_shot(text, parser)
+
+
+def test_truncated_json_reports_error():
+    text = REPLY[:REPLY.index('"commitments"')]
+    parser, events = _stream(text, range(5, len(text), 5))
+    assert parser.plan is None
+    assert "不完整" in parser.error
+    assert [kind for kind, _ in events] == ["analysis", "task", "task"]
+    _assert_matches_one_shot(text, parser)
+
+
+def test_malformed_json_reports_error():
+    text = f"{ANALYSIS}{BEGIN}\n{{\"today\": {{\"tasks\": [{{\"time\": \"08:00-09:00\",}}]}}, }}\n{END}"
+    parser, events = _stream(text, range(3, len(text), 3))
+    assert parser.plan is None
+    assert parser.error.startswith("计划 JSON 解析失败")
+    # 单条元素本身不合法时不产出事件
+    assert [kind for kind, _ in events] == ["analysis"]
+    _assert_matches_one_shot(text, parser)
+
+
+def test_reply_without_markers_falls_back_to_last_braces():
+    text = '分析文本\n{"tasks": [{"time": "08:00-09:00", "activity": "学习英语"}]}'
+    parser, events = _stream(text, [10])
+    assert events == []
+    assert parser.plan == {"tasks": [{"time": "08:00-09:00", "activity": "学习英语"}]}
+    _assert_matches_one_shot(text, parser)
+
+
+def test_reply_without_markers_or_json():
+    parser, _ = _stream("只有分析文本", [2])
+    assert parser.plan is None
+    assert parser.error == "未找到 BEGIN_PLAN_UPDATE 标记"
+    _assert_matches_one_shot("只有分析文本", parser)
+
+
+def test_reply_without_markers_and_broken_json():
+    text = '分析文本 {"tasks": [ }'
+    parser, _ = _stream(text, [4])
+    assert parser.plan is None
+    assert parser.error.startswith("无标记且 JSON 解析失败")
+    _assert_matches_one_shot(text, parser)
@@ -0,0 +1,171 @@
+import asyncio
+import time
+
+import pytest
+
+from resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, Hedger, LatencyTracker
+
+
+class _Response:
+    status_code = 200
+    text = ""
+
+    def json(self):
+        return {"code": 0, "data": {"memory_detail_list": [], "preference_detail_list": [], "fact_detail_list": []}}
+
+
+@pytest.fixture
+def tenant(monkeypatch):
+    monkeypatch.setenv("MEMOS_BASE_URL", "http://127.0.0.1:9")
+    monkeypatch.setenv("MEMOS_BREAKER_FAILURES", "1")
+    monkeypatch.setenv("MEMOS_BREAKER_RESET", "0.05")
+    monkeypatch.setenv("MEMOS_SEARCH_CACHE", "false")
+    monkeypatch.delenv("MEMOS_HEDGE", raising=False)
+    from memos_client import AsyncMemOSTenantClient
+
+    return AsyncMemOSTenantClient(coalesce=False)
+
+
+def test_stale_half_open_probe_expires():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    time.sleep(0.06)
+    assert breaker.allow()          # 探测放行后一直没有结果
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow()          # 过期后重新放行探测
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_cancelled_probe_releases_half_open_slot(tenant):
+    calls = []
+
+    async def fake_post(endpoint, path, data):
+        calls.append(path)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        if len(calls) == 2:
+            await asyncio.sleep(3600)   # 半开探测：挂起直到被取消
+        return _Response()
+
+    tenant._post_with_retry = fake_post
+
+    async def scenario():
+        with pytest.raises(Exception):
+            await tenant.search_memory("u1", "q1")
+        breaker = tenant.breakers["search"]
+        assert breaker.state == OPEN
+        await asyncio.sleep(0.06)
+        probe = asyncio.ensure_future(tenant.search_memory("u1", "q2"))
+        await asyncio.sleep(0.01)
+        assert breaker.state == HALF_OPEN
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        # 名额已归还：下一次检索立即作为新的探测发出，而不是降级
+        result = await tenant.search_memory("u1", "q3")
+        assert not result.get("degraded")
+        assert breaker.state == CLOSED
+        await tenant.aclose()
+
+    asyncio.run(scenario())
+
+
+class _Status:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def _hedger():
+    tracker = LatencyTracker(min_samples=1)
+    tracker.record(0.02)
+    return Hedger(tracker, min_delay=0.02)
+
+
+def _failed(res):
+    return res.status_code >= 500
+
+
+def _slow_ok_fast_error():
+    """第一次调用慢但成功，补发的那次立刻返回 503。"""
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(0.1)
+            return _Status(200)
+        return _Status(503)
+    return fn
+
+
+def test_hedger_prefers_slow_success_over_fast_5xx():
+    hedger = _hedger()
+    try:
+        assert hedger.call(_slow_ok_fast_error(), is_failure=_failed).status_code == 200
+        # 两次都失败时才返回失败的响应
+        assert hedger.call(lambda: (time.sleep(0.05), _Status(502))[1], is_failure=_failed).status_code == 502
+    finally:
+        hedger.close()
+
+
+def test_async_hedger_prefers_slow_success_over_fast_5xx():
+    calls = []
+
+    async def fn():
+        calls.append(1)
+        if len(calls) == 1:
+            await asyncio.sleep(0.1)
+            return _Status(200)
+        return _Status(503)
+
+    res = asyncio.run(_hedger().acall(fn, is_failure=_failed))
+    assert res.status_code == 200
+
+
+def test_losing_sync_hedge_does_not_count_toward_the_breaker(monkeypatch):
+    import threading
+
+    monkeypatch.setenv("MEMOS_BASE_URL", "http://127.0.0.1:9")
+    monkeypatch.setenv("MEMOS_BREAKER_FAILURES", "1")
+    monkeypatch.setenv("MEMOS_HEDGE", "1")
+    monkeypatch.setenv("MEMOS_COALESCE", "false")
+    from memos_client import MemOSTenantClient
+
+    client = MemOSTenantClient()
+    for _ in range(20):
+        client.latency["search"].record(0.01)
+    calls, loser_done = [], threading.Event()
+
+    def post(url, **kwargs):
+        calls.append(url)
+        if len(calls) == 1:
+            # 首个请求很慢，最终返回 503；对冲请求很快成功
+            time.sleep(0.2)
+            loser_done.set()
+            res = _Response()
+            res.status_code = 503
+            return res
+        return _Response()
+
+    monkeypatch.setattr(client._session, "post", post)
+    try:
+        assert client.search_memory("u1", "团队例会")["code"] == 0
+        assert loser_done.wait(2)
+        time.sleep(0.05)
+        assert client.breakers["search"].state == CLOSED
+        assert client.breakers["search"].stats()["failures"] == 0
+    finally:
+        client.close()
+
+
+@pytest.mark.parametrize("name", ["MEMOS_BREAKER_FAILURES", "MEMOS_BREAKER_RESET", "MEMOS_HEDGE_MIN_DELAY_MS"])
+def test_bad_numeric_env_falls_back_to_defaults(monkeypatch, name):
+    monkeypatch.setenv(name, "abc")
+    monkeypatch.setenv("MEMOS_HEDGE", "1")
+    breaker = CircuitBreaker.from_env("test")
+    assert (breaker.failure_threshold, breaker.reset_timeout) == (5, 30.0)
+    assert Hedger.from_env(LatencyTracker()).min_delay == 0.02
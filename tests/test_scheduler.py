@@ -0,0 +1,92 @@
+import pytest
+
+from scheduler import Commitment, ScheduleRepairer, extract_commitments, parse_commitment
+
+
+@pytest.mark.parametrize("text, span, weekdays", [
+    ("每个工作日早上9:30到10:00有晨会。", (570, 600), frozenset(range(5))),
+    ("每周三10:00到11:00有团队例会", (600, 660), frozenset({2})),
+    ("周末 9:00-11:00 去图书馆", (540, 660), frozenset({5, 6})),
+    ("每天12:00到12:30有客户电话沟通。", (720, 750), None),
+])
+def test_parse_commitment(text, span, weekdays):
+    c = parse_commitment(text)
+    assert (c.start, c.end) == span
+    assert c.weekdays == weekdays
+
+
+@pytest.mark.parametrize("text", ["今天要学习政治", "10:00到09:00", ""])
+def test_parse_commitment_without_valid_range(text):
+    assert parse_commitment(text) is None
+
+
+def test_parse_commitment_title():
+    assert parse_commitment("每周五14:00到16:00要参加季度汇报。").title == "季度汇报"
+
+
+def test_extract_commitments_only_trusts_fixed_sources():
+    memories = [
+        {"memory_value": "每个工作日早上9:30到10:00有晨会。", "memory_type": "UserMemory"},
+        {"title": "周四 15:00-16:00 看牙医", "tags": ["固定安排"]},
+        # 助理回复与召回的旧计划：模型自己提议过的时段不是固定安排
+        {"memory_value": "08:00-09:00 学习政治；14:00-15:00 学习英语", "memory_type": "LongTermMemory"},
+        {"memory_value": "建议 19:00-20:00 复盘", "role": "assistant"},
+        # 来源不明但措辞是周期性的
+        {"memory_value": "用户每天12:00到12:30有客户电话沟通", "memory_type": "LongTermMemory"},
+    ]
+    got = {(c.start, c.end) for c in extract_commitments(memories)}
+    assert got == {(570, 600), (900, 960), (720, 750)}
+
+
+def test_extract_commitments_dedupes_by_time():
+    texts = ["每天12:00到12:30有客户电话沟通", "每天12:00-12:30 客户电话"]
+    assert len(extract_commitments(texts)) == 1
+
+
+def _task(time, activity="项目代码评审", priority="中"):
+    return {"time": time, "activity": activity, "priority": priority}
+
+
+MEETING = Commitment("晨会", 570, 600)
+
+
+def test_repair_moves_overlapping_task_to_nearest_free_window():
+    result = ScheduleRepairer().repair([_task("09:45-10:30")], [MEETING])
+    assert result.moves == [{
+        "activity": "项目代码评审", "from": "09:45-10:30", "to": "10:00-10:45", "reason": "与固定安排『晨会』冲突",
+    }]
+    assert result.tasks[0]["time"] == "10:00-10:45"
+    assert result.tasks[0]["adjusted_from"] == "09:45-10:30"
+
+
+def test_repair_prefers_the_closer_side():
+    # 09:20 开始离 09:00 更近（往前挪 10 分钟，往后要 20 分钟）
+    result = ScheduleRepairer().repair([_task("09:10-09:40")], [MEETING])
+    assert result.tasks[0]["time"] == "09:00-09:30"
+
+
+def test_repair_keeps_non_overlapping_tasks_and_touching_boundaries():
+    tasks = [_task("09:00-09:30"), _task("10:00-11:00", "阅读")]
+    result = ScheduleRepairer().repair(tasks, [MEETING])
+    assert not result.changed
+    assert [t["time"] for t in result.tasks] == ["09:00-09:30", "10:00-11:00"]
+
+
+def test_repair_reports_tasks_without_a_free_window():
+    repairer = ScheduleRepairer(day_start="09:00", day_end="11:00")
+    busy = Commitment("全天会议", 540, 660)
+    result = repairer.repair([_task("09:30-10:30")], [busy])
+    assert result.tasks == []
+    assert result.unplaced == [{"activity": "项目代码评审", "time": "09:30-10:30", "reason": "与固定安排『全天会议』冲突"}]
+
+
+def test_repair_ignores_commitments_for_other_weekdays():
+    weekly = Commitment("团队例会", 600, 660, frozenset({2}))
+    assert not ScheduleRepairer().repair([_task("10:00-11:00")], [weekly], weekday=0).changed
+    assert ScheduleRepairer().repair([_task("10:00-11:00")], [weekly], weekday=2).changed
+
+
+def test_repair_moves_heavy_evening_task_before_evening():
+    result = ScheduleRepairer().repair([_task("19:00-20:00", "学习英语")])
+    assert result.moves[0]["reason"] == "晚上不安排高强度任务"
+    assert result.tasks[0]["time"] == "17:00-18:00"
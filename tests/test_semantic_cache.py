@@ -0,0 +1,41 @@
+import pytest
+
+from semantic_cache import SemanticSearchCache
+
+RESULT = {"code": 0, "data": {"memory_detail_list": [{"memory": "周一：晨会"}]}}
+
+
+@pytest.mark.parametrize("cached, query", [
+    ("周一的计划摘要", "周五的计划摘要"),
+    ("下午3-5点会议", "上午9-11点会议"),
+    ("今天的计划摘要", "明天的计划摘要"),
+    ("周三 10:00 的安排", "周三 14:00 的安排"),
+])
+def test_queries_differing_by_day_or_time_do_not_hit(cached, query):
+    cache = SemanticSearchCache()
+    cache.put("u1", cached, RESULT)
+    assert cache.get("u1", query) is None
+
+
+def test_near_verbatim_repeat_hits():
+    cache = SemanticSearchCache()
+    cache.put("u1", "本周摘要", RESULT)
+    assert cache.get("u1", "本周摘要？") == RESULT
+    assert cache.get("u1", "本周的计划") is None
+
+
+def test_opt_in_from_env(monkeypatch):
+    monkeypatch.delenv("MEMOS_SEMANTIC_CACHE", raising=False)
+    assert SemanticSearchCache.from_env() is None
+    monkeypatch.setenv("MEMOS_SEMANTIC_CACHE", "1")
+    monkeypatch.setenv("MEMOS_SEMANTIC_THRESHOLD", "0.95")
+    assert SemanticSearchCache.from_env().threshold == 0.95
+
+
+def test_user_indexes_are_bounded():
+    cache = SemanticSearchCache(max_users=2)
+    for user in ("u1", "u2", "u3"):
+        cache.put(user, "本周计划摘要", {"memories": [user]})
+    assert cache.stats()["users"] == 2
+    assert cache.get("u1", "本周计划摘要") is None
+    assert cache.get("u3", "本周计划摘要") == {"memories": ["u3"]}
@@ -0,0 +1,112 @@
+import asyncio
+import copy
+import threading
+import time
+
+import pytest
+
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+def test_thread_leader_error_reaches_every_waiter():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls, errors = [], []
+
+    def fail():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        raise ValueError("memos down")
+
+    def run():
+        try:
+            flight.do("k", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=run)
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=run) for _ in range(3)]
+    for t in followers:
+        t.start()
+    while flight.stats()["shared"] < 3:
+        time.sleep(0.001)
+    release.set()
+    for t in [leader, *followers]:
+        t.join(5)
+
+    assert len(calls) == 1
+    assert len(errors) == 4 and len({id(e) for e in errors}) == 1
+    assert flight.stats()["inflight"] == 0
+    # 键已释放，之后的调用重新发起
+    assert flight.do("k", lambda: "ok") == ("ok", False)
+
+
+def test_async_leader_error_reaches_every_waiter():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        calls = []
+
+        async def fail():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            raise ValueError("memos down")
+
+        results = await asyncio.gather(*(flight.do("k", fail) for _ in range(4)), return_exceptions=True)
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert all(isinstance(r, ValueError) for r in results)
+    assert flight.stats() == {"calls": 1, "shared": 3, "cancelled": 0, "inflight": 0}
+
+
+def test_async_cancelled_waiter_does_not_cancel_shared_call():
+    async def scenario():
+        flight = AsyncSingleFlight(clone=copy.deepcopy)
+        release = asyncio.Event()
+
+        async def fetch():
+            await release.wait()
+            return {"memories": ["a"]}
+
+        leader = asyncio.create_task(flight.do("k", fetch))
+        follower = asyncio.create_task(flight.do("k", fetch))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        release.set()
+        result, shared = await follower
+        return flight, result, shared
+
+    flight, result, shared = asyncio.run(scenario())
+    assert (result, shared) == ({"memories": ["a"]}, True)
+    assert flight.stats()["cancelled"] == 0
+
+
+def test_async_shared_call_is_cancelled_when_every_waiter_leaves():
+    async def scenario():
+        flight = AsyncSingleFlight()
+        cancelled = asyncio.Event()
+
+        async def fetch():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiters = [asyncio.create_task(flight.do("k", fetch)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for w in waiters:
+            w.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        await asyncio.sleep(0)
+        return flight
+
+    stats = asyncio.run(scenario()).stats()
+    assert stats["cancelled"] == 1 and stats["inflight"] == 0
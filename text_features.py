@@ -0,0 +1,45 @@
+"""
+text_features.py
+
+通俗说明：
+- 面向中英混合文本的轻量分词：中文连续片段取单字与相邻二字，英文/数字按单词切分。
+- 不依赖任何分词库，结果确定，供语义缓存的哈希向量化与本地词法检索共用。
+- `temporal_terms` 抽取查询里的时间限定词（星期、相对日期、上下午、数字），
+  字面相近但指向不同日期 / 时段的查询（"周一的计划" 与 "周五的计划"）据此区分。
+"""
+
+import re
+
+from memory_cache import normalize_query
+
+
+_CJK_RE = re.compile(r"[㐀-鿿豈-﫿]")
+_TOKEN_RE = re.compile(r"[㐀-鿿豈-﫿]+|[a-z0-9]+")
+_TEMPORAL_RE = re.compile(
+    r"(?:周|星期|礼拜)[一二三四五六日天末]|[今明昨前后]天|[今明昨]晚|[本上下这]周|[本上下这]个?月"
+    r"|上午|下午|中午|晚上|早上|凌晨|傍晚|\d+"
+    r"|\b(?:mon|tue|wed|thu|fri|sat|sun)[a-z]*|\b(?:today|tomorrow|yesterday|tonight|am|pm)\b"
+)
+
+
+def lexical_features(text: str) -> list[str]:
+    """把文本切成检索特征（保留重复，便于统计词频）。"""
+    feats = []
+    for token in _TOKEN_RE.findall(normalize_query(text)):
+        if _CJK_RE.match(token):
+            feats.extend(token)
+            feats.extend(token[i:i + 2] for i in range(len(token) - 1))
+        else:
+            feats.append(token)
+    return feats
+
+
+def _canonical_temporal(term: str) -> str:
+    # 同义写法归一：星期一 / 礼拜一 → 周一，周天 → 周日，这周 → 本周，这个月 → 本月
+    term = re.sub(r"^(?:星期|礼拜)", "周", term).replace("周天", "周日").replace("个月", "月")
+    return "本" + term[1:] if term[0] == "这" else term
+
+
+def temporal_terms(text: str) -> tuple[str, ...]:
+    """查询中的时间限定词（归一、排序去重）；两条查询的结果不同说明指向的日期或时段不同。"""
+    return tuple(sorted({_canonical_temporal(t) for t in _TEMPORAL_RE.findall(normalize_query(text))}))